@@ -1,18 +1,21 @@
 # --- START OF FILE Bestdori_txt2json.py (FULL FINAL VERSION) ---
 
-import json
-import re
 import logging
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass, asdict
-from abc import ABC, abstractmethod
+from typing import Optional
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import yaml
 import threading
+import queue
 import sys
 
+from cache import ConversionCache, cache_from_config
+from converter import ConfigManager, QuoteRules, TextConverter, convert_file
+from incremental import IncrementalConverter
+from script_reader import read_prefix
+from sinks import BUNDLE_KINDS, OutputSink, create_sink
+
 # 安全地导入 tkinterdnd2，如果失败则禁用拖拽功能
 try:
     from tkinterdnd2 import DND_FILES, TkinterDnD
@@ -24,224 +27,30 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 工作线程不直接操作 Tk 控件，而是把事件放入队列，由主线程定时批量处理
+EVENT_POLL_MS = 50
+MAX_EVENTS_PER_TICK = 5000
+MAX_LOG_LINES = 5000
+# 预览转换的字符数
+PREVIEW_CHARS = 500
+# 批量转换的输出方式（见 sinks.py）
+SINK_LABELS = {
+    "plain": "逐个写入文件",
+    "atomic": "逐个写入文件（原子替换）",
+    "buffered": "逐个写入文件（原子替换，分组刷盘）",
+    "jsonl": "打包为 JSON Lines 文件",
+    "zip": "打包为 zip 压缩包",
+}
 
-@dataclass
-class ActionItem:
-    """对话动作数据类"""
-    type: str = "talk"
-    delay: int = 0
-    wait: bool = True
-    characters: List[int] = None
-    name: str = ""
-    body: str = ""
-    motions: List[str] = None
-    voices: List[str] = None
-    close: bool = False
-    
-    def __post_init__(self):
-        if self.characters is None:
-            self.characters = []
-        if self.motions is None:
-            self.motions = []
-        if self.voices is None:
-            self.voices = []
-
-
-@dataclass
-class ConversionResult:
-    """转换结果数据类"""
-    server: int = 0
-    voice: str = ""
-    background: Optional[str] = None
-    bgm: Optional[str] = None
-    actions: List[ActionItem] = None
-    
-    def __post_init__(self):
-        if self.actions is None:
-            self.actions = []
-
-
-class ConfigManager:
-    """配置管理器"""
-    
-    def __init__(self, config_path: str = "config.yaml"):
-        self.config_path = Path(config_path)
-        self.config = self._load_config()
-    
-    def _load_config(self) -> Dict[str, Any]:
-        """加载配置文件"""
-        default_config = {
-            "character_mapping": {
-                # Poppin'Party
-                "户山香澄": [1], "花园多惠": [2], "牛込里美": [3], "山吹沙绫": [4], "市谷有咲": [5],
-                # Afterglow
-                "美竹兰": [6], "青叶摩卡": [7], "上原绯玛丽": [8], "宇田川巴": [9], "羽泽鸫": [10],
-                # Hello, Happy World!
-                "弦卷心": [11], "濑田薰": [12], "北泽育美": [13], "松原花音": [14], "奥泽美咲": [15],
-                # Pastel*Palettes
-                "丸山彩": [16], "冰川日菜": [17], "白鹭千圣": [18], "大和麻弥": [19], "若宫伊芙": [20],
-                # Roselia
-                "凑友希那": [21], "冰川纱夜": [22], "今井莉莎": [23], "宇田川亚子": [24], "白金燐子": [25],
-                # Morfonica
-                "仓田真白": [26], "桐谷透子": [27], "广町七深": [28], "二叶筑紫": [29], "八潮瑠唯": [30],
-                # RAISE A SUILEN
-                "LAYER": [31], "LOCK": [32], "MASKING": [33], "PAREO": [34], "CHU²": [35],
-                # mujica
-                "丰川祥子": [1], "若叶睦": [2], "三角初华": [3], "八幡海铃": [4], "祐天寺若麦": [5],
-                # MyGo
-                "高松灯": [36], "千早爱音": [37], "要乐奈": [38], "长崎素世": [39], "椎名立希": [40]
-            },
-            "parsing": {
-                "max_speaker_name_length": 50,
-                "default_narrator_name": " "
-            },
-            "patterns": {
-                "speaker_pattern": r'^([\w\s]+)\s*[：:]\s*(.*)$'
-            },
-            "quotes": {
-                "quote_pairs": {
-                    '"': '"', '“': '”', "'": "'", '‘': '’', "「": "」", "『": "』"
-                },
-                "quote_categories": {
-                    "中文引号 “...”": ["“", "”"],
-                    "中文单引号 ‘...’": ["‘", "’"],
-                    "日文引号 「...」": ["「", "」"],
-                    "日文书名号 『...』": ["『", "』"],
-                    "英文双引号 \"...\"": ['"', '"'],
-                    "英文单引号 '...'": ["'", "'"]
-                }
-            }
-        }
-        
-        if not self.config_path.exists():
-            self._save_config(default_config)
-            return default_config
-        
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                loaded_config = yaml.safe_load(f) or default_config
-                if "quote_categories" not in loaded_config.get("quotes", {}):
-                    logger.warning("旧的配置文件缺少'quote_categories'，将从默认配置中添加。")
-                    loaded_config["quotes"]["quote_categories"] = default_config["quotes"]["quote_categories"]
-                    self._save_config(loaded_config)
-                return loaded_config
-        except Exception as e:
-            logger.warning(f"配置文件加载失败，使用默认配置: {e}")
-            return default_config
-    
-    def _save_config(self, config: Dict[str, Any]):
-        try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
-        except Exception as e:
-            logger.error(f"配置文件保存失败: {e}")
-    
-    def get_character_mapping(self) -> Dict[str, List[int]]:
-        return self.config.get("character_mapping", {})
-    
-    def get_parsing_config(self) -> Dict[str, Any]:
-        return self.config.get("parsing", {})
-    
-    def get_patterns(self) -> Dict[str, str]:
-        return self.config.get("patterns", {})
-    
-    def get_quotes_config(self) -> Dict[str, Any]:
-        return self.config.get("quotes", {})
-
-
-class DialogueParser(ABC):
-    @abstractmethod
-    def parse(self, line: str) -> Optional[Tuple[str, str]]: pass
-
-
-class SpeakerParser(DialogueParser):
-    def __init__(self, pattern: str, max_name_length: int):
-        self.pattern = re.compile(pattern, re.UNICODE)
-        self.max_name_length = max_name_length
-    def parse(self, line: str) -> Optional[Tuple[str, str]]:
-        match = self.pattern.match(line.strip())
-        if match:
-            try:
-                speaker_name = match.group(1).strip()
-                if len(speaker_name) < self.max_name_length:
-                    return speaker_name, match.group(2).strip()
-            except IndexError:
-                logger.error(f"正则表达式 '{self.pattern.pattern}' 中缺少捕获组。")
-                return None
-        return None
-    
-    
-class QuoteHandler:
-    def remove_quotes(self, text: str, active_quote_pairs: Dict[str, str]) -> str:
-        stripped = text.strip()
-        if len(stripped) < 2: return text
-        first_char = stripped[0]
-        expected_closing = active_quote_pairs.get(first_char)
-        if expected_closing and stripped[-1] == expected_closing:
-            return stripped[1:-1].strip()
-        return text    
-
-
-class TextConverter:
-    def __init__(self, config_manager: ConfigManager):
-        self.config_manager = config_manager
-        self.character_mapping = config_manager.get_character_mapping()
-        self.parsing_config = config_manager.get_parsing_config()
-        self.patterns = config_manager.get_patterns()
-        self._init_parsers()
-    
-    def _init_parsers(self):
-        speaker_pattern = self.patterns.get("speaker_pattern", r'^([\w\s]+)\s*[：:]\s*(.*)$')
-        self.parser = SpeakerParser(speaker_pattern, self.parsing_config.get("max_speaker_name_length", 50))
-        self.quote_handler = QuoteHandler()
-
-    def convert_text_to_json_format(self, input_text: str, narrator_name: str = None, selected_quote_pairs: Optional[Dict[str, str]] = None) -> str:
-        if narrator_name is None: narrator_name = self.parsing_config.get("default_narrator_name", " ")
-        if selected_quote_pairs is None: selected_quote_pairs = {} 
-        
-        actions = []
-        current_action_name = narrator_name
-        current_action_body_lines = []
-        
-        def finalize_current_action():
-            if current_action_body_lines:
-                body = "\n".join(current_action_body_lines).strip()
-                finalized_body = self.quote_handler.remove_quotes(body, selected_quote_pairs)
-                if finalized_body:
-                    actions.append(ActionItem(
-                        characters=self.character_mapping.get(current_action_name, []),
-                        name=current_action_name,
-                        body=finalized_body
-                    ))
-        
-        for line in input_text.split('\n'):
-            stripped_line = line.strip()
-            if not stripped_line:
-                finalize_current_action()
-                current_action_name = narrator_name
-                current_action_body_lines = []
-                continue
-            
-            parse_result = self.parser.parse(stripped_line)
-            if parse_result:
-                speaker, content = parse_result
-                if speaker != current_action_name and current_action_body_lines:
-                    finalize_current_action()
-                    current_action_body_lines = []
-                current_action_name = speaker
-                current_action_body_lines.append(content)
-            else:
-                current_action_body_lines.append(stripped_line)
-        
-        finalize_current_action()
-        result = ConversionResult(actions=actions)
-        return json.dumps(asdict(result), ensure_ascii=False, indent=2)
 
 class ModernConverterGUI:
     def __init__(self):
         self.config_manager = ConfigManager()
         self.converter = TextConverter(self.config_manager)
         self.custom_quote_vars = []
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker_thread = None
         self.setup_gui()
     
     def setup_gui(self):
@@ -353,13 +162,85 @@ class ModernConverterGUI:
         self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         
+        # 为不同级别的日志添加颜色标签
+        self.log_text.tag_config("SUCCESS", foreground="green")
+        self.log_text.tag_config("ERROR", foreground="red")
+        self.log_text.tag_config("WARNING", foreground="orange")
+        self.log_text.tag_config("HEADER", font=("TkDefaultFont", 10, "bold"))
+        
         self.setup_shortcuts()
         self.enable_drag_drop()
+        self.root.after(EVENT_POLL_MS, self._drain_events)
+
+    def _post_var(self, var, value):
+        """线程安全地设置 Tk 变量，同一变量在一次处理中只应用最后的值"""
+        self.events.put(("var", var, value))
+
+    def _post_call(self, func, *args):
+        """线程安全地在主线程中调用函数（如弹出消息框）"""
+        self.events.put(("call", func, args))
+
+    def _drain_events(self):
+        log_chunks = []
+        pending_vars = {}
+
+        def flush_logs():
+            if not log_chunks:
+                return
+            for tag, texts in log_chunks:
+                self.log_text.insert(tk.END, "".join(texts), tag)
+            log_chunks.clear()
+            # 只保留最近的日志行，避免上万个文件的批处理拖慢文本控件
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES}.0")
+            self.log_text.see(tk.END)
+
+        def apply_vars():
+            for var, value in pending_vars.values():
+                try:
+                    var.set(value)
+                except tk.TclError:
+                    # 变量所属的窗口已关闭
+                    pass
+            pending_vars.clear()
+
+        try:
+            for _ in range(MAX_EVENTS_PER_TICK):
+                try:
+                    event = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                kind = event[0]
+                if kind == "log":
+                    _, message, level = event
+                    tag = level.upper()
+                    text = f"[{level}] {message}\n"
+                    # 相邻的同级别日志合并为一次插入
+                    if log_chunks and log_chunks[-1][0] == tag:
+                        log_chunks[-1][1].append(text)
+                    else:
+                        log_chunks.append((tag, [text]))
+                elif kind == "var":
+                    _, var, value = event
+                    pending_vars[id(var)] = (var, value)
+                elif kind == "call":
+                    _, func, args = event
+                    flush_logs()
+                    apply_vars()
+                    try:
+                        func(*args)
+                    except tk.TclError:
+                        pass
+            flush_logs()
+            apply_vars()
+        finally:
+            self.root.after(EVENT_POLL_MS, self._drain_events)
 
     def open_batch_converter(self):
         batch_window = tk.Toplevel(self.root)
         batch_window.title("批量转换")
-        batch_window.geometry("500x250")
+        batch_window.geometry("500x320")
         batch_window.transient(self.root)
         batch_window.grab_set()
 
@@ -381,68 +262,79 @@ class ModernConverterGUI:
         self.batch_progress_bar = ttk.Progressbar(frame, variable=self.batch_progress_var, maximum=100)
         self.batch_progress_bar.grid(row=2, column=0, columnspan=3, sticky="ew", pady=10)
 
+        self.batch_use_cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(frame, text="跳过未修改的文件（使用转换缓存）", variable=self.batch_use_cache_var).grid(
+            row=3, column=0, columnspan=3, sticky="w", pady=5
+        )
+
+        ttk.Label(frame, text="输出方式:").grid(row=4, column=0, sticky="w", pady=5, padx=5)
+        self.batch_sink_var = tk.StringVar(value=SINK_LABELS["plain"])
+        ttk.Combobox(frame, textvariable=self.batch_sink_var, values=list(SINK_LABELS.values()),
+                     state="readonly").grid(row=4, column=1, columnspan=2, sticky="ew", pady=5)
+
         self.batch_status_var = tk.StringVar(value="请选择输入和输出文件夹")
-        ttk.Label(frame, textvariable=self.batch_status_var).grid(row=3, column=0, columnspan=3, sticky="w", pady=5)
+        ttk.Label(frame, textvariable=self.batch_status_var).grid(row=5, column=0, columnspan=3, sticky="w", pady=5)
         
+        def close_batch_window():
+            self.cancel_event.set()
+            batch_window.destroy()
+
         btn_frame = ttk.Frame(frame)
-        btn_frame.grid(row=4, column=0, columnspan=3, pady=10)
+        btn_frame.grid(row=6, column=0, columnspan=3, pady=10)
         ttk.Button(btn_frame, text="开始批量转换", command=self.start_batch_conversion_threaded).pack(side=tk.LEFT, padx=10)
-        ttk.Button(btn_frame, text="关闭", command=batch_window.destroy).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="取消", command=self.cancel_event.set).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="关闭", command=close_batch_window).pack(side=tk.LEFT, padx=10)
+        batch_window.protocol("WM_DELETE_WINDOW", close_batch_window)
 
     def browse_directory(self, var_to_set):
         directory = filedialog.askdirectory(title="请选择一个文件夹")
         if directory:
             var_to_set.set(directory)
 
-    def convert_file(self, input_path: str, output_path: str):
+    def convert_file(self, input_path: str, output_path: str, narrator_name: str, quote_rules: QuoteRules,
+                     cache: Optional[ConversionCache] = None, sink: Optional[OutputSink] = None):
+        """在工作线程中转换单个文件。旁白名称和引号对需由主线程事先读取"""
+        pretty = sink is None or not sink.requires_compact
         try:
-            narrator_name = self.narrator_name_var.get() or " "
-            selected_pairs = self._get_selected_quote_pairs()
             self.log_message(f"开始处理: {Path(input_path).name}")
-            with open(input_path, 'r', encoding='utf-8') as f:
-                input_text = f.read()
-            json_output = self.converter.convert_text_to_json_format(
-                input_text, narrator_name, selected_quote_pairs=selected_pairs
-            )
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(json_output)
-            self.log_message(f"成功保存到: {Path(output_path).name}", "SUCCESS")
+            if cache is not None:
+                hit = cache.convert_file(self.converter, input_path, output_path, narrator_name, quote_rules,
+                                         pretty=pretty, sink=sink)
+            else:
+                convert_file(self.converter, input_path, output_path, narrator_name, quote_rules, pretty, sink=sink)
+                hit = False
+            if hit:
+                self.log_message(f"文件未修改，已使用缓存: {Path(output_path).name}", "SUCCESS")
+            else:
+                self.log_message(f"成功保存到: {Path(output_path).name}", "SUCCESS")
             return True, "Success"
         except Exception as e:
             error_msg = f"处理文件 {Path(input_path).name} 失败: {e}"
             self.log_message(error_msg, "ERROR")
             return False, error_msg
             
-    def start_conversion(self):
-        input_file = self.input_filepath_var.get()
-        output_file = self.output_filepath_var.get()
+    def start_conversion(self, input_file: str, output_file: str, narrator_name: str, quote_rules: QuoteRules):
+        success, message = self.convert_file(input_file, output_file, narrator_name, quote_rules)
         
-        if not input_file: return messagebox.showerror("错误", "请选择输入文件！")
-        if not output_file: return messagebox.showerror("错误", "请选择输出文件！")
-        
-        self.status_var.set("正在转换...")
-        self.progress_bar.grid()
-        self.progress_var.set(50)
-        
-        success, message = self.convert_file(input_file, output_file)
-        
-        self.progress_var.set(100)
+        self._post_var(self.progress_var, 100)
         if success:
-            self.status_var.set("转换完成！")
-            messagebox.showinfo("成功", "文件转换并保存成功！")
+            self._post_var(self.status_var, "转换完成！")
+            self._post_call(messagebox.showinfo, "成功", "文件转换并保存成功！")
         else:
-            self.status_var.set("转换失败！")
-            messagebox.showerror("错误", message)
+            self._post_var(self.status_var, "转换失败！")
+            self._post_call(messagebox.showerror, "错误", message)
         
-        self.progress_var.set(0)
-        self.progress_bar.grid_remove()
+        self._post_var(self.progress_var, 0)
+        self._post_call(self.progress_bar.grid_remove)
 
-    def start_batch_conversion_threaded(self):
-        thread = threading.Thread(target=self.batch_convert)
-        thread.daemon = True
-        thread.start()
+    def _worker_busy(self) -> bool:
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            messagebox.showwarning("请稍候", "已有转换任务正在进行。")
+            return True
+        return False
 
-    def batch_convert(self):
+    def start_batch_conversion_threaded(self):
+        if self._worker_busy(): return
         input_dir = self.batch_input_dir_var.get()
         output_dir = self.batch_output_dir_var.get()
 
@@ -450,42 +342,73 @@ class ModernConverterGUI:
             self.batch_status_var.set("错误: 输入和输出文件夹都必须选择！")
             return
 
+        # Tk 变量只在主线程中读取，工作线程拿到的是快照
+        narrator_name = self.narrator_name_var.get() or " "
+        quote_rules = self._get_quote_rules()
+        use_cache = self.batch_use_cache_var.get()
+        sink_kind = next(kind for kind, label in SINK_LABELS.items() if label == self.batch_sink_var.get())
+        self.cancel_event.clear()
+        self.worker_thread = threading.Thread(
+            target=self.batch_convert,
+            args=(input_dir, output_dir, narrator_name, quote_rules, use_cache, sink_kind)
+        )
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+
+    def batch_convert(self, input_dir: str, output_dir: str, narrator_name: str, quote_rules: QuoteRules,
+                      use_cache: bool = True, sink_kind: str = "plain"):
         self.log_message("===== 开始批量处理 =====", "INFO")
         self.log_message(f"输入目录: {input_dir}")
         self.log_message(f"输出目录: {output_dir}")
 
         try:
-            txt_files = list(Path(input_dir).glob("*.txt"))
+            txt_files = sorted(Path(input_dir).glob("*.txt"))
             if not txt_files:
-                self.batch_status_var.set("未在输入目录中找到任何.txt文件。")
+                self._post_var(self.batch_status_var, "未在输入目录中找到任何.txt文件。")
                 self.log_message("警告: 未找到.txt文件。", "WARNING")
                 return
 
             total_files = len(txt_files)
-            self.batch_progress_bar['maximum'] = total_files
-            self.batch_progress_var.set(0)
+            self._post_call(self.batch_progress_bar.configure, {"maximum": total_files})
+            self._post_var(self.batch_progress_var, 0)
             
             success_count = 0
             fail_count = 0
-
-            for i, txt_file in enumerate(txt_files):
-                self.batch_status_var.set(f"正在处理 ({i+1}/{total_files}): {txt_file.name}")
-                output_file = Path(output_dir) / f"{txt_file.stem}.json"
-                success, _ = self.convert_file(str(txt_file), str(output_file))
-                if success: success_count += 1
-                else: fail_count += 1
-                self.batch_progress_var.set(i + 1)
-
-            final_message = f"批量处理完成！成功: {success_count}, 失败: {fail_count}."
-            self.batch_status_var.set(final_message)
+            cache = cache_from_config(self.config_manager.get_cache_config()) if use_cache else None
+            Path(output_dir).mkdir(parents=True, exist_ok=True)
+            bundle_path = Path(output_dir) / f"{Path(input_dir).name or 'output'}.{sink_kind}"
+            sink = None if sink_kind == "plain" else create_sink(sink_kind, str(bundle_path), root=output_dir)
+
+            with sink if sink is not None else nullcontext():
+                for i, txt_file in enumerate(txt_files):
+                    if self.cancel_event.is_set():
+                        break
+                    self._post_var(self.batch_status_var, f"正在处理 ({i+1}/{total_files}): {txt_file.name}")
+                    output_file = Path(output_dir) / f"{txt_file.stem}.json"
+                    success, _ = self.convert_file(str(txt_file), str(output_file), narrator_name, quote_rules,
+                                                   cache, sink)
+                    if success: success_count += 1
+                    else: fail_count += 1
+                    self._post_var(self.batch_progress_var, i + 1)
+            if sink_kind in BUNDLE_KINDS:
+                self.log_message(f"结果已打包到: {bundle_path}", "SUCCESS")
+
+            if self.cancel_event.is_set():
+                final_message = f"批量处理已取消。成功: {success_count}, 失败: {fail_count}, 未处理: {total_files - success_count - fail_count}."
+            else:
+                final_message = f"批量处理完成！成功: {success_count}, 失败: {fail_count}."
+            if cache is not None:
+                cache.evict()
+                final_message += f" 缓存命中: {cache.hits}, 未命中: {cache.misses}."
+            self._post_var(self.batch_status_var, final_message)
             self.log_message(f"===== {final_message} =====", "INFO")
-            messagebox.showinfo("批量处理完成", final_message)
+            self._post_call(messagebox.showinfo, "批量处理完成", final_message)
 
         except Exception as e:
             error_msg = f"批量处理过程中发生严重错误: {e}"
             self.log_message(error_msg, "ERROR")
-            self.batch_status_var.set(error_msg)
-            messagebox.showerror("严重错误", error_msg)
+            self._post_var(self.batch_status_var, error_msg)
+            self._post_call(messagebox.showerror, "严重错误", error_msg)
 
     def enable_drag_drop(self):
         if DND_ENABLED:
@@ -537,7 +460,8 @@ class ModernConverterGUI:
         chk.pack(side=tk.LEFT, padx=5, pady=5)
         self.custom_open_quote_var.set(""); self.custom_close_quote_var.set("")
 
-    def _get_selected_quote_pairs(self) -> Dict[str, str]:
+    def _get_quote_rules(self) -> QuoteRules:
+        """在主线程中读取勾选的引号并编译为引号规则，嵌套和逐行去除引号的设置取自配置文件"""
         selected_pairs = {}
         quotes_config = self.config_manager.get_quotes_config()
         quote_categories = quotes_config.get("quote_categories", {})
@@ -548,7 +472,8 @@ class ModernConverterGUI:
                     selected_pairs[quote_chars[0]] = quote_chars[1]
         for var, open_char, close_char in self.custom_quote_vars:
             if var.get(): selected_pairs[open_char] = close_char
-        return selected_pairs
+        return QuoteRules(tuple(selected_pairs.items()), bool(quotes_config.get("nested_quotes", False)),
+                          bool(quotes_config.get("strip_quotes_per_line", False)))
     
     def browse_input_file(self):
         filename = filedialog.askopenfilename(title="选择输入文本文件", filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")])
@@ -563,20 +488,8 @@ class ModernConverterGUI:
         if filename: self.output_filepath_var.set(filename)
     
     def log_message(self, message: str, level: str = "INFO"):
-        tag = level.upper()
-        # 为不同级别的日志添加颜色标签
-        if tag == "SUCCESS":
-            self.log_text.tag_config("SUCCESS", foreground="green")
-        elif tag == "ERROR":
-            self.log_text.tag_config("ERROR", foreground="red")
-        elif tag == "WARNING":
-            self.log_text.tag_config("WARNING", foreground="orange")
-        elif tag == "HEADER":
-            self.log_text.tag_config("HEADER", font=("TkDefaultFont", 10, "bold"))
-        
-        self.log_text.insert(tk.END, f"[{level}] {message}\n", tag)
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        """写入转换日志。可在任意线程调用，实际插入由主线程批量完成"""
+        self.events.put(("log", message, level))
     
     def test_quote_processing(self):
         test_window = tk.Toplevel(self.root); test_window.title("引号处理测试"); test_window.geometry("500x400")
@@ -584,10 +497,12 @@ class ModernConverterGUI:
         input_text = tk.Text(test_window, height=5, wrap=tk.WORD); input_text.pack(fill=tk.X, padx=10, pady=5)
         test_samples = ['「这是日文引号」', '『这是日文书名号』', '“这是中文双引号”', '‘这是中文单引号’', '角色名:「带名字的引号」', '兰: “分かった。\nじゃあ、始めよっか”']
         input_text.insert(tk.END, "\n\n".join(test_samples))
+        # 反复修改、测试时只重新解析改动过的段落
+        incremental = IncrementalConverter(self.converter)
         def process_test():
             content = input_text.get(1.0, tk.END)
-            selected_pairs = self._get_selected_quote_pairs()
-            json_output = self.converter.convert_text_to_json_format(content, self.narrator_name_var.get(), selected_quote_pairs=selected_pairs)
+            quote_rules = self._get_quote_rules()
+            json_output = incremental.convert_to_json(content, self.narrator_name_var.get(), selected_quote_pairs=quote_rules)
             result_text.config(state=tk.NORMAL); result_text.delete(1.0, tk.END)
             result_text.insert(tk.END, "--- 转换结果 (JSON) ---\n" + json_output); result_text.config(state=tk.DISABLED)
         ttk.Button(test_window, text="处理测试", command=process_test).pack(pady=5)
@@ -595,16 +510,33 @@ class ModernConverterGUI:
         result_text = tk.Text(test_window, height=10, wrap=tk.WORD); result_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5); result_text.config(state=tk.DISABLED)
     
     def start_conversion_threaded(self):
-        thread = threading.Thread(target=self.start_conversion); thread.daemon = True; thread.start()
+        if self._worker_busy(): return
+        input_file = self.input_filepath_var.get()
+        output_file = self.output_filepath_var.get()
+        
+        if not input_file: return messagebox.showerror("错误", "请选择输入文件！")
+        if not output_file: return messagebox.showerror("错误", "请选择输出文件！")
+        
+        self.status_var.set("正在转换...")
+        self.progress_bar.grid()
+        self.progress_var.set(50)
+        
+        narrator_name = self.narrator_name_var.get() or " "
+        quote_rules = self._get_quote_rules()
+        self.worker_thread = threading.Thread(
+            target=self.start_conversion, args=(input_file, output_file, narrator_name, quote_rules)
+        )
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
     
     def preview_result(self):
         input_file = self.input_filepath_var.get(); narrator_name = self.narrator_name_var.get() or " "
         if not input_file: return messagebox.showerror("错误", "请先选择输入文件！")
         try:
-            selected_pairs = self._get_selected_quote_pairs()
-            with open(input_file, 'r', encoding='utf-8') as f: input_text = f.read()
-            preview_text = input_text[:500]
-            json_output = self.converter.convert_text_to_json_format(preview_text, narrator_name, selected_quote_pairs=selected_pairs)
+            quote_rules = self._get_quote_rules()
+            # 只读取预览需要的开头部分，大文件也能立即预览
+            preview_text = read_prefix(input_file, PREVIEW_CHARS)
+            json_output = self.converter.convert_text_to_json_format(preview_text, narrator_name, selected_quote_pairs=quote_rules)
             preview_window = tk.Toplevel(self.root); preview_window.title("转换预览"); preview_window.geometry("600x400")
             text_widget = tk.Text(preview_window, wrap=tk.WORD)
             scrollbar = ttk.Scrollbar(preview_window, orient=tk.VERTICAL, command=text_widget.yview); text_widget.configure(yscrollcommand=scrollbar.set)
@@ -628,8 +560,8 @@ class ModernConverterGUI:
                         name, ids_str = line.split('=', 1); ids = [int(x.strip()) for x in ids_str.split(',') if x.strip().isdigit()]
                         new_mapping[name.strip()] = ids
                 self.config_manager.config['character_mapping'] = new_mapping
+                # 保存后转换器会根据配置的 generation 自动重建说话人索引
                 self.config_manager._save_config(self.config_manager.config)
-                self.converter.character_mapping = new_mapping
                 messagebox.showinfo("成功", "配置保存成功！"); config_window.destroy()
             except Exception as e:
                 messagebox.showerror("错误", f"配置保存失败: {str(e)}")
@@ -0,0 +1,89 @@
+# 输入层：直接从 zip 和 tar（含 .tar.gz/.tar.bz2/.tar.xz）压缩包中读取剧本，无需先解压到磁盘。
+#
+# 成员按在压缩包中的顺序逐个读入内存，以 MemoryScript 的形式交给转换函数，由 ScriptReader 按块增量解码。
+# tar 以流的方式顺序读取，压缩的 tar 也只解压一遍；调用方按需逐个取出成员，内存中只保留正在处理的成员。
+
+import fnmatch
+import logging
+import tarfile
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional, Tuple
+
+from script_reader import MemoryScript
+
+logger = logging.getLogger(__name__)
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# 读取失败、压缩包损坏、截断或加密时底层模块抛出的异常
+_READ_ERRORS = (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error, RuntimeError, NotImplementedError)
+
+
+class ArchiveError(Exception):
+    """压缩包无法读取"""
+
+
+def _matching_suffix(path: Path) -> Optional[str]:
+    name = path.name.lower()
+    for suffix in ZIP_SUFFIXES + TAR_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def is_archive(path: Path) -> bool:
+    """是否为可以直接读取的压缩包（按扩展名判断）"""
+    return path.is_file() and _matching_suffix(path) is not None
+
+
+def archive_stem(path: Path) -> str:
+    """去掉压缩包扩展名后的文件名，如 drop.tar.gz → drop"""
+    suffix = _matching_suffix(path)
+    return path.name[:-len(suffix)] if suffix else path.stem
+
+
+def member_path(name: str) -> Optional[PurePosixPath]:
+    """成员在压缩包中的相对路径。绝对路径或含 .. 的成员会写到输出目录之外，返回 None"""
+    path = PurePosixPath(name.replace("\\", "/"))
+    if path.is_absolute() or ".." in path.parts or not path.parts:
+        return None
+    return path
+
+
+def _matching_member(name: str, pattern: str) -> Optional[PurePosixPath]:
+    relative = member_path(name)
+    if relative is None:
+        logger.warning(f"跳过路径不安全的压缩包成员: {name}")
+        return None
+    return relative if fnmatch.fnmatch(relative.name, pattern) else None
+
+
+def _iter_zip(path: Path, pattern: str) -> Iterator[Tuple[PurePosixPath, MemoryScript]]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            relative = None if info.is_dir() else _matching_member(info.filename, pattern)
+            if relative is not None:
+                yield relative, MemoryScript(f"{path}:{relative}", archive.read(info))
+
+
+def _iter_tar(path: Path, pattern: str) -> Iterator[Tuple[PurePosixPath, MemoryScript]]:
+    # r|* 以流方式读取并自动识别压缩格式，不需要随机访问
+    with tarfile.open(path, mode="r|*") as archive:
+        for info in archive:
+            relative = _matching_member(info.name, pattern) if info.isfile() else None
+            if relative is not None:
+                yield relative, MemoryScript(f"{path}:{relative}", archive.extractfile(info).read())
+
+
+def iter_archive_members(path: Path, pattern: str = "*.txt") -> Iterator[Tuple[PurePosixPath, MemoryScript]]:
+    """按顺序产出文件名匹配 pattern 的成员 (相对路径, 内容)。每次取出下一个成员时才读取它。
+
+    压缩包损坏或无法读取时抛出 ArchiveError，此前已产出的成员不受影响。
+    """
+    members = _iter_zip(path, pattern) if _matching_suffix(path) in ZIP_SUFFIXES else _iter_tar(path, pattern)
+    try:
+        yield from members
+    except _READ_ERRORS as e:
+        raise ArchiveError(f"无法读取压缩包 {path}: {e}") from e
@@ -0,0 +1,78 @@
+# 增量转换耗时：在一份长剧本中反复随机修改一行，对比完整重新转换和 IncrementalConverter 的耗时，
+# 同时校验两者输出一致。
+#
+# 用法: python benchmarks/bench_incremental.py --lines 20000 --edits 50
+
+import argparse
+import itertools
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from converter import ConfigManager, TextConverter  # noqa: E402
+from corpus import PROFILES, iter_script_lines  # noqa: E402
+from incremental import IncrementalConverter  # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="单行修改后的增量转换耗时")
+    parser.add_argument("--lines", type=int, default=20000, help="剧本行数")
+    parser.add_argument("--edits", type=int, default=50, help="随机修改次数")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed", help="合成文本形态")
+    parser.add_argument("--config", default=str(REPO_ROOT / "config.yaml"), help="配置文件路径")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config_manager = ConfigManager(args.config)
+    converter = TextConverter(config_manager)
+    names = list(config_manager.get_character_mapping()) or ["角色"]
+    # 多行台词在生成器中是一项，拼接后再按行切分，保证行数准确
+    generated = iter_script_lines(names, float("inf"), PROFILES[args.profile], args.seed)
+    lines = "\n".join(itertools.islice(generated, args.lines)).split("\n")[:args.lines]
+
+    incremental = IncrementalConverter(converter)
+    start = time.perf_counter()
+    incremental.convert_to_json("\n".join(lines))
+    print(f"{len(lines)} 行，{incremental.total_blocks} 个块，首次转换 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    rng = random.Random(args.seed)
+    full_times: List[float] = []
+    incremental_times: List[float] = []
+    reparsed: List[int] = []
+    for _ in range(args.edits):
+        index = rng.randrange(len(lines))
+        lines[index] = lines[index] + "改" if lines[index] else "新增的旁白"
+        text = "\n".join(lines)
+
+        start = time.perf_counter()
+        expected = converter.convert_text_to_json_format(text)
+        full_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = incremental.convert_to_json(text)
+        incremental_times.append(time.perf_counter() - start)
+        reparsed.append(incremental.reparsed_blocks)
+
+        if result != expected:
+            print("增量转换的输出与完整转换不一致", file=sys.stderr)
+            return 1
+
+    full = statistics.median(full_times) * 1000
+    partial = statistics.median(incremental_times) * 1000
+    print(f"{'方式':<10}{'中位数(ms)':>12}{'最快(ms)':>12}")
+    print(f"{'完整转换':<10}{full:>12.2f}{min(full_times) * 1000:>12.2f}")
+    print(f"{'增量转换':<10}{partial:>12.2f}{min(incremental_times) * 1000:>12.2f}")
+    print(f"加速比: {full / partial:.1f}x，平均每次重新解析 {statistics.mean(reparsed):.2f} 个块")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# ActionItem 内存基准：比较带 __dict__ 和空列表的旧版数据类与当前 __slots__ 实现。
+#
+# 用法: python benchmarks/bench_memory.py [--lines 100000]
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from converter import ActionItem, ConfigManager, TextConverter  # noqa: E402
+from corpus import PROFILES, iter_script_lines  # noqa: E402
+
+
+@dataclass
+class LegacyActionItem:
+    """转换前的 ActionItem 布局，仅用于对比"""
+    type: str = "talk"
+    delay: int = 0
+    wait: bool = True
+    characters: List[int] = None
+    name: str = ""
+    body: str = ""
+    motions: List[str] = None
+    voices: List[str] = None
+    close: bool = False
+
+    def __post_init__(self):
+        if self.characters is None:
+            self.characters = []
+        if self.motions is None:
+            self.motions = []
+        if self.voices is None:
+            self.voices = []
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ActionItem 内存基准")
+    parser.add_argument("--lines", type=int, default=100_000, help="合成剧本的行数")
+    parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    args = parser.parse_args()
+
+    converter = TextConverter(ConfigManager(args.config))
+    lines = iter_script_lines(list(converter.character_mapping), float("inf"), PROFILES["dialogue"])
+    script = "\n".join(next(lines) for _ in range(args.lines))
+    # 先生成动作并保留其中的字符串，两种布局共享同一批 name/body，只比较对象本身的开销
+    actions = list(converter.iter_actions(script.split("\n")))
+    fields = [(a.name, a.body) for a in actions]
+    mapping = converter.character_mapping
+    del actions
+
+    legacy, legacy_bytes, legacy_peak = measure(lambda: [
+        LegacyActionItem(characters=mapping.get(name, []), name=name, body=body) for name, body in fields
+    ])
+    lookup = converter.speaker_index.lookup
+    slotted, slotted_bytes, slotted_peak = measure(lambda: [
+        ActionItem(characters=lookup(name), name=name, body=body) for name, body in fields
+    ])
+
+    count = len(fields)
+    print(f"{args.lines} 行剧本, {count} 个动作")
+    print(f"{'布局':<12}{'总内存(MB)':>12}{'峰值(MB)':>12}{'每个动作(B)':>14}")
+    for label, total, peak in (("dataclass", legacy_bytes, legacy_peak), ("__slots__", slotted_bytes, slotted_peak)):
+        print(f"{label:<12}{total / 2**20:>12.2f}{peak / 2**20:>12.2f}{total / max(count, 1):>14.1f}")
+    print(f"节省: {(1 - slotted_bytes / max(legacy_bytes, 1)) * 100:.1f}%")
+    del legacy, slotted
+
+
+if __name__ == "__main__":
+    main()
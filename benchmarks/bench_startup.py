@@ -0,0 +1,71 @@
+# 冷启动耗时：分别测量命令行转换一个小文件、GUI 初始化（不创建窗口）和单独加载配置的总耗时，
+# 对比有无配置快照两种情况。每次运行都是新的 Python 进程。
+#
+# 用法: python benchmarks/bench_startup.py --runs 10
+
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE_TEXT = "户山香澄：「今天也一起练习吧！」\n市谷有咲：「真拿你没办法」\n\n旁白文字\n"
+
+
+def _commands(config_path: Path, input_path: Path, output_dir: Path) -> Dict[str, List[str]]:
+    return {
+        "cli": [sys.executable, str(REPO_ROOT / "cli.py"), "convert", str(input_path), "-o", str(output_dir),
+                "--jobs", "1", "--no-cache", "--config", str(config_path)],
+        # 无显示器时无法创建 Tk 窗口，测量导入 GUI 模块并初始化配置和转换器的耗时
+        "gui": [sys.executable, "-c",
+                f"import app; app.TextConverter(app.ConfigManager({str(config_path)!r}))"],
+        "config": [sys.executable, "-c",
+                   f"from converter import ConfigManager; ConfigManager({str(config_path)!r})"],
+    }
+
+
+def _time_command(command: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="冷启动耗时（有无配置快照）")
+    parser.add_argument("--runs", type=int, default=10, help="每种情况运行次数")
+    parser.add_argument("--config", default=str(REPO_ROOT / "config.yaml"), help="配置文件路径")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        # 使用配置文件副本，快照写在临时目录中，不影响仓库
+        config_path = tmp / "config.yaml"
+        shutil.copyfile(args.config, config_path)
+        snapshot_path = config_path.with_name(f".{config_path.name}.snapshot.json")
+        input_path = tmp / "sample.txt"
+        input_path.write_text(SAMPLE_TEXT, encoding="utf-8")
+        commands = _commands(config_path, input_path, tmp / "out")
+
+        print(f"{'场景':<10}{'快照':<8}{'中位数(ms)':>12}{'最快(ms)':>12}")
+        for name, command in commands.items():
+            for use_snapshot in (False, True):
+                timings = []
+                # 先运行一次预热文件系统缓存，同时生成快照
+                _time_command(command)
+                for _ in range(args.runs):
+                    if not use_snapshot:
+                        snapshot_path.unlink(missing_ok=True)
+                    timings.append(_time_command(command))
+                print(f"{name:<10}{'有' if use_snapshot else '无':<8}"
+                      f"{statistics.median(timings) * 1000:>12.1f}{min(timings) * 1000:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# 合成语料生成器：根据 config.yaml 中的角色映射生成 Bestdori 风格的剧情文本。
+#
+# 用法: python benchmarks/corpus.py 输出文件夹 --sizes 1K,1M,10M --profile mixed
+
+import argparse
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from converter import ConfigManager  # noqa: E402
+
+# 不同语料形态：说话人行比例、多行台词比例、引号样式
+PROFILES: Dict[str, Dict] = {
+    "dialogue": {"speaker_density": 0.9, "multiline_ratio": 0.05, "blank_ratio": 0.1,
+                 "quotes": [("「", "」"), ("“", "”")]},
+    "narration": {"speaker_density": 0.15, "multiline_ratio": 0.2, "blank_ratio": 0.15,
+                  "quotes": [("", "")]},
+    "multiline": {"speaker_density": 0.5, "multiline_ratio": 0.6, "blank_ratio": 0.1,
+                  "quotes": [("「", "」"), ("『", "』"), ('"', '"')]},
+    "mixed": {"speaker_density": 0.6, "multiline_ratio": 0.2, "blank_ratio": 0.12,
+              "quotes": [("「", "」"), ("“", "”"), ("‘", "’"), ("『", "』"), ('"', '"'), ("'", "'"), ("", "")]},
+}
+
+_SEPARATORS = ("：", ":", " : ", "： ")
+_WORDS = ("今天", "的", "练习", "真的", "很", "开心", "大家", "一起", "演奏", "吧", "Live", "加油", "嗯", "……",
+          "我们", "舞台", "观众", "新曲", "歌词", "吉他", "贝斯", "鼓", "键盘", "终于", "完成", "了", "，", "！")
+
+_SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """解析 1K、10M 这样的大小"""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in _SIZE_UNITS:
+        return int(float(text[:-1]) * _SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= _SIZE_UNITS[unit] and size % _SIZE_UNITS[unit] == 0:
+            return f"{size // _SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def _sentence(rng: random.Random) -> str:
+    return "".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 14)))
+
+
+def iter_script_lines(names: Sequence[str], target_bytes: int, profile: Dict, seed: int = 0):
+    """逐行生成剧情文本，直到达到目标字节数（UTF-8）"""
+    rng = random.Random(seed)
+    quotes: List[Tuple[str, str]] = profile["quotes"]
+    written = 0
+    while written < target_bytes:
+        roll = rng.random()
+        if roll < profile["blank_ratio"]:
+            line = ""
+        elif roll < profile["blank_ratio"] + (1 - profile["blank_ratio"]) * profile["speaker_density"]:
+            open_quote, close_quote = rng.choice(quotes)
+            body = _sentence(rng)
+            if rng.random() < profile["multiline_ratio"]:
+                # 多行台词：引号跨越多行，后续行没有说话人
+                extra = [_sentence(rng) for _ in range(rng.randint(1, 3))]
+                line = f"{rng.choice(names)}{rng.choice(_SEPARATORS)}{open_quote}{body}\n" + "\n".join(extra) + close_quote
+            else:
+                line = f"{rng.choice(names)}{rng.choice(_SEPARATORS)}{open_quote}{body}{close_quote}"
+        else:
+            line = _sentence(rng)
+        written += len(line.encode("utf-8")) + 1
+        yield line
+
+
+def generate_script(character_mapping: Dict, target_bytes: int, profile: str = "mixed", seed: int = 0) -> str:
+    names = list(character_mapping) or ["角色"]
+    return "\n".join(iter_script_lines(names, target_bytes, PROFILES[profile], seed))
+
+
+def write_script(path: Path, character_mapping: Dict, target_bytes: int, profile: str = "mixed", seed: int = 0) -> Path:
+    """把合成剧情流式写入文件，不在内存中拼接整个文本"""
+    names = list(character_mapping) or ["角色"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for line in iter_script_lines(names, target_bytes, PROFILES[profile], seed):
+            f.write(line)
+            f.write("\n")
+    return path
+
+
+def ensure_corpus_file(corpus_dir: Path, character_mapping: Dict, target_bytes: int, profile: str, seed: int = 0) -> Path:
+    """返回缓存的语料文件，不存在时生成"""
+    path = corpus_dir / f"{profile}-{format_size(target_bytes)}-{seed}.txt"
+    if not path.exists():
+        write_script(path, character_mapping, target_bytes, profile, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成剧情语料")
+    parser.add_argument("output", help="输出文件夹")
+    parser.add_argument("--sizes", default="1K,100K,1M", help="逗号分隔的文件大小，如 1K,1M,100M")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="语料形态，可重复指定（默认全部）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    args = parser.parse_args()
+
+    character_mapping = ConfigManager(args.config).get_character_mapping()
+    for profile in args.profile or sorted(PROFILES):
+        for size in args.sizes.split(","):
+            path = ensure_corpus_file(Path(args.output), character_mapping, parse_size(size), profile, args.seed)
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# HTTP 转换服务压测：多个保持连接的并发客户端持续发送请求，统计吞吐量和延迟分位数。
+#
+# 用法:
+#   python benchmarks/load_test.py --spawn --workers 4 --concurrency 32 --duration 10 --size 4K
+#   python benchmarks/load_test.py --port 8765 --endpoint batch --batch-size 16
+#
+# --spawn 时自动在空闲端口启动 cli.py serve，测完后关闭；否则压测已在运行的服务。
+
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from converter import ConfigManager  # noqa: E402
+from corpus import PROFILES, generate_script, parse_size  # noqa: E402
+from instrumentation import latency_summary  # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, method: str, path: str,
+                   body: bytes = b"") -> Tuple[int, bytes]:
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def _client(host: str, port: int, path: str, body: bytes, deadline: float, remaining: List[int],
+                  latencies: List[float], statuses: Dict[int, int]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline and remaining[0] != 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                status, _ = await _request(reader, writer, host, "POST", path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                statuses[-1] = statuses.get(-1, 0) + 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, path: str, body: bytes, concurrency: int, duration: float,
+                   requests: Optional[int]) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    # 客户端共享的剩余请求数，-1 表示只按时长限制
+    remaining = [requests if requests else -1]
+    start = time.perf_counter()
+    deadline = start + duration if not requests else float("inf")
+    await asyncio.gather(*(_client(host, port, path, body, deadline, remaining, latencies, statuses)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else None,
+        "mb_per_sec": len(latencies) * len(body) / 1024 / 1024 / elapsed if elapsed else None,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_healthy(host: str, port: int, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                status, _ = await _request(reader, writer, host, "GET", "/health")
+            finally:
+                writer.close()
+            if status == 200:
+                return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        if time.perf_counter() > deadline:
+            raise TimeoutError("等待服务启动超时")
+        await asyncio.sleep(0.1)
+
+
+def build_body(text: str, endpoint: str, batch_size: int) -> Tuple[str, bytes]:
+    if endpoint == "batch":
+        payload = {"items": [{"text": text} for _ in range(batch_size)]}
+        return "/convert/batch", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return "/convert", json.dumps({"text": text}, ensure_ascii=False).encode("utf-8")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP 转换服务压测")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--spawn", action="store_true", help="自动启动一个服务进程用于压测")
+    parser.add_argument("--workers", type=int, default=0, help="--spawn 时服务的转换进程数")
+    parser.add_argument("--config", default=str(REPO_ROOT / "config.yaml"), help="配置文件路径")
+    parser.add_argument("--endpoint", choices=("convert", "batch"), default="convert")
+    parser.add_argument("--batch-size", type=int, default=16, help="批量请求中的项数")
+    parser.add_argument("--size", default="4K", help="每项文本的大小，如 1K、64K")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed", help="合成文本形态")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, default=0, help="总请求数，指定时忽略 --duration")
+    parser.add_argument("--save", metavar="PATH", help="把结果保存为 JSON")
+    args = parser.parse_args(argv)
+
+    text = generate_script(ConfigManager(args.config).get_character_mapping(), parse_size(args.size), args.profile)
+    path, body = build_body(text, args.endpoint, args.batch_size)
+
+    process = None
+    port = args.port
+    if args.spawn:
+        port = _free_port()
+        command = [sys.executable, str(REPO_ROOT / "cli.py"), "serve", "--host", args.host, "--port", str(port),
+                   "--config", args.config]
+        if args.workers:
+            command += ["--workers", str(args.workers)]
+        process = subprocess.Popen(command, cwd=REPO_ROOT)
+    try:
+        if process is not None:
+            asyncio.run(_wait_healthy(args.host, port))
+        result = asyncio.run(run_load(args.host, port, path, body, args.concurrency, args.duration,
+                                      args.requests or None))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    latency = result["latency_ms"]
+    print(f"请求: {result['requests']}, 用时: {result['seconds']:.2f}s, "
+          f"{result['requests_per_sec']:.1f} 请求/秒, {result['mb_per_sec']:.2f} MB/s")
+    print(f"延迟(ms): p50 {latency['p50']:.2f}, p90 {latency['p90']:.2f}, "
+          f"p99 {latency['p99']:.2f}, max {latency['max']:.2f}")
+    print(f"状态码: {result['statuses']}")
+    if args.save:
+        result["meta"] = {"endpoint": args.endpoint, "size": args.size, "profile": args.profile,
+                          "concurrency": args.concurrency, "batch_size": args.batch_size}
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+    return 0 if set(result["statuses"]) <= {"200"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
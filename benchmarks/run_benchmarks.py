@@ -0,0 +1,377 @@
+# 转换流程基准：分别测量读取、说话人解析、引号去除、序列化和写出等阶段的吞吐量与峰值内存。
+#
+# 用法:
+#   python benchmarks/run_benchmarks.py --sizes 1K,1M,10M --save baseline.json
+#   python benchmarks/run_benchmarks.py --sizes 1K,1M,10M --compare baseline.json
+#
+# 每个 (语料, 阶段) 在单独的子进程中运行，峰值 RSS 互不影响。
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from converter import (  # noqa: E402
+    DEFAULT_SPEAKER_PATTERN, ConfigManager, FastSpeakerParser, QuoteRules, SpeakerParser, TextConverter, convert_file,
+)
+from directives import DirectiveIndex  # noqa: E402
+from corpus import PROFILES, ensure_corpus_file, format_size, parse_size  # noqa: E402
+from encoder import write_json_stream  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CORPUS_DIR = Path(__file__).resolve().parent / ".corpus"
+# 默认启用全部预设引号，与 GUI 一致
+QUOTE_RULES = QuoteRules((('"', '"'), ('“', '”'), ("'", "'"), ('‘', '’'), ("「", "」"), ("『", "』")))
+# convert_auto_* / convert_all_* 阶段在默认格式之后依次追加的说话人格式，与 README 中的示例一致
+EXTRA_SPEAKER_FORMATS = (("bracket", r'^【([^】]+)】\s*(.*)$'), ("quote", r'^([\w\s]+)([「『“].*)$'))
+# convert_directives* 阶段使用的查找表大小，模拟数千个动作和语音资源
+DIRECTIVE_TABLE_SIZE = 5000
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _read_lines(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().split("\n")
+
+
+# 每个阶段函数先完成准备工作，再返回计时函数；准备耗时不计入结果
+def _stage_read(converter: TextConverter, path: str) -> Callable[[], int]:
+    def run():
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for _ in f)
+    return run
+
+
+def _make_parse_stage(parser_factory):
+    def stage(converter: TextConverter, path: str) -> Callable[[], int]:
+        parser = parser_factory(converter)
+        stripped = [line.strip() for line in _read_lines(path)]
+        stripped = [line for line in stripped if line]
+
+        def run():
+            parse = parser.parse
+            for line in stripped:
+                parse(line)
+            return len(stripped)
+        return run
+    return stage
+
+
+def _stage_quotes(converter: TextConverter, path: str) -> Callable[[], int]:
+    bodies = [action.body for action in converter.iter_actions(_read_lines(path))]
+
+    def run():
+        strip_body = converter.quote_handler.strip_body
+        for body in bodies:
+            strip_body(body, QUOTE_RULES)
+        return len(bodies)
+    return run
+
+
+def _stage_convert(converter: TextConverter, path: str) -> Callable[[], int]:
+    lines = _read_lines(path)
+
+    def run():
+        for _ in converter.iter_actions(lines, None, QUOTE_RULES):
+            pass
+        return len(lines)
+    return run
+
+
+def _stage_convert_bulk(converter: TextConverter, path: str) -> Callable[[], int]:
+    # 批量引擎直接处理整段文本，切分行的开销计入结果
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    def run():
+        for _ in converter.iter_actions_bulk((text,), None, QUOTE_RULES):
+            pass
+        return text.count("\n") + 1
+    return run
+
+
+def _make_formats_stage(count: int, mode: str):
+    """配置 count 种说话人格式后转换（含按文件检测格式），对比 convert 阶段可以看出格式数量对吞吐量的影响"""
+    def stage(converter: TextConverter, path: str) -> Callable[[], int]:
+        converter.patterns = dict(converter.patterns, speaker_formats=dict(EXTRA_SPEAKER_FORMATS[:count - 1]))
+        converter.parsing_config = dict(converter.parsing_config, speaker_format=mode)
+        converter._init_parsers()
+        lines = _read_lines(path)
+
+        def run():
+            speaker_format = converter.detect_speaker_format(lines)
+            for _ in converter.iter_actions(lines, None, QUOTE_RULES, speaker_format=speaker_format):
+                pass
+            return len(lines)
+        return run
+    return stage
+
+
+def _make_directives_stage(dense: bool):
+    """启用行内指令后转换。dense 为 False 时语料中没有指令，测量逐行检查的开销；
+    为 True 时每个说话人行的冒号后插入一个动作指令，测量识别和查表的开销"""
+    def stage(converter: TextConverter, path: str) -> Callable[[], int]:
+        tables = {table: {f"{kind}{number}": f"{kind}_{number:05d}" for number in range(DIRECTIVE_TABLE_SIZE)}
+                  for kind, table in (("m", "motions"), ("v", "voices"))}
+        converter.directives = DirectiveIndex(tables, REPO_ROOT)
+        # 查找表在第一次用到时才构建，准备阶段先构建好
+        converter.directives.lookup("motion", "m0")
+        lines = _read_lines(path)
+        if dense:
+            lines = [line.replace("：", f"：[motion:m{number % DIRECTIVE_TABLE_SIZE}]", 1)
+                     for number, line in enumerate(lines)]
+
+        def run():
+            for _ in converter.iter_actions(lines, None, QUOTE_RULES):
+                pass
+            return len(lines)
+        return run
+    return stage
+
+
+def _make_serialize_stage(pretty: bool):
+    def stage(converter: TextConverter, path: str) -> Callable[[], int]:
+        actions = list(converter.iter_actions(_read_lines(path), None, QUOTE_RULES))
+
+        def run():
+            write_json_stream(actions, io.StringIO(), pretty=pretty)
+            return len(actions)
+        return run
+    return stage
+
+
+def _stage_write(converter: TextConverter, path: str) -> Callable[[], int]:
+    buffer = io.StringIO()
+    write_json_stream(converter.iter_actions(_read_lines(path), None, QUOTE_RULES), buffer)
+    output = buffer.getvalue()
+    del buffer
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(Path(tmp_dir) / "out.json", "w", encoding="utf-8") as f:
+                f.write(output)
+        return output.count("\n") + 1
+    return run
+
+
+def _make_end_to_end_stage(bulk: bool):
+    def stage(converter: TextConverter, path: str) -> Callable[[], int]:
+        converter.use_bulk_engine = bulk
+        return _stage_end_to_end(converter, path)
+    return stage
+
+
+def _stage_end_to_end(converter: TextConverter, path: str) -> Callable[[], int]:
+    def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            convert_file(converter, path, str(Path(tmp_dir) / "out.json"), None, QUOTE_RULES)
+        return 0
+    return run
+
+
+STAGES: Dict[str, Callable] = {
+    "read": _stage_read,
+    "parse": _make_parse_stage(lambda converter: converter.parser),
+    "parse_regex": _make_parse_stage(
+        lambda converter: SpeakerParser(DEFAULT_SPEAKER_PATTERN, converter.parser.max_name_length)),
+    "quotes": _stage_quotes,
+    "convert": _stage_convert,
+    "convert_bulk": _stage_convert_bulk,
+    "convert_auto_2": _make_formats_stage(2, "auto"),
+    "convert_auto_3": _make_formats_stage(3, "auto"),
+    "convert_all_2": _make_formats_stage(2, "all"),
+    "convert_all_3": _make_formats_stage(3, "all"),
+    "convert_directives": _make_directives_stage(dense=False),
+    "convert_directives_dense": _make_directives_stage(dense=True),
+    "serialize": _make_serialize_stage(pretty=True),
+    "serialize_compact": _make_serialize_stage(pretty=False),
+    "write": _stage_write,
+    "end_to_end": _make_end_to_end_stage(bulk=False),
+    "end_to_end_bulk": _make_end_to_end_stage(bulk=True),
+}
+
+
+def _run_case(case: Tuple[str, str, str, int]) -> Dict:
+    """在子进程中运行单个阶段"""
+    stage, path, config_path, repeat = case
+    converter = TextConverter(ConfigManager(config_path))
+    run = STAGES[stage](converter, path)
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = run()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        line_count = sum(1 for _ in f)
+    return {
+        "seconds": seconds,
+        "items": items,
+        "lines_per_sec": line_count / seconds if seconds else None,
+        "mb_per_sec": size / 1024 / 1024 / seconds if seconds else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def verify_parsers(path: Path, config_path: str) -> bool:
+    """差分校验：快速解析器与默认正则解析器、批量引擎与逐行转换、多格式自动检测与单一格式在语料上的结果必须完全一致"""
+    config_manager = ConfigManager(config_path)
+    fast = TextConverter(config_manager)
+    max_name_length = fast.parser.max_name_length
+    fast_parser = FastSpeakerParser(max_name_length, fast.character_mapping)
+    regex_parser = SpeakerParser(DEFAULT_SPEAKER_PATTERN, max_name_length)
+    lines = _read_lines(str(path))
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if stripped and fast_parser.parse(stripped) != regex_parser.parse(stripped):
+            print(f"解析结果不一致 {path.name}:{number}: {line!r}", file=sys.stderr)
+            return False
+    regex_converter = TextConverter(config_manager)
+    regex_converter.parser = regex_parser
+    fast.parser = fast_parser
+    buffers = []
+    for converter in (fast, regex_converter):
+        buffer = io.StringIO()
+        write_json_stream(converter.iter_actions(lines, None, QUOTE_RULES), buffer)
+        buffers.append(buffer.getvalue())
+    if buffers[0] != buffers[1]:
+        print(f"转换结果不一致: {path.name}", file=sys.stderr)
+        return False
+    buffer = io.StringIO()
+    write_json_stream(fast.iter_actions_bulk(("\n".join(lines),), None, QUOTE_RULES), buffer)
+    if buffer.getvalue() != buffers[0]:
+        print(f"批量引擎转换结果不一致: {path.name}", file=sys.stderr)
+        return False
+    # 语料是默认格式，追加其他格式后自动检测应选中默认格式，结果不变
+    multi = TextConverter(config_manager)
+    multi.patterns = dict(multi.patterns, speaker_formats=dict(EXTRA_SPEAKER_FORMATS))
+    multi.parsing_config = dict(multi.parsing_config, speaker_format="auto")
+    multi._init_parsers()
+    buffer = io.StringIO()
+    speaker_format = multi.detect_speaker_format(lines)
+    write_json_stream(multi.iter_actions(lines, None, QUOTE_RULES, speaker_format=speaker_format), buffer)
+    if buffer.getvalue() != buffers[0]:
+        print(f"多种说话人格式自动检测的转换结果不一致: {path.name}", file=sys.stderr)
+        return False
+    return True
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """与基线比较吞吐量，返回超过阈值的退化项"""
+    regressions = []
+    print(f"\n{'用例':<40}{'基线 MB/s':>12}{'当前 MB/s':>12}{'变化':>10}")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("mb_per_sec") or not result.get("mb_per_sec"):
+            continue
+        change = result["mb_per_sec"] / base["mb_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  <-- 退化"
+            regressions.append(key)
+        print(f"{key:<40}{base['mb_per_sec']:>12.2f}{result['mb_per_sec']:>12.2f}{change * 100:>9.1f}%{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="TextConverter 转换流程基准")
+    parser.add_argument("--sizes", default="1K,100K,1M", help="逗号分隔的语料大小，最大可到 100M")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="语料形态，可重复指定（默认全部）")
+    parser.add_argument("--stage", action="append", choices=list(STAGES), help="只运行指定阶段，可重复指定")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数，取最快一次")
+    parser.add_argument("--config", default=str(REPO_ROOT / "config.yaml"), help="配置文件路径")
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="合成语料缓存目录")
+    parser.add_argument("--save", metavar="PATH", help="把结果保存为 JSON 基线")
+    parser.add_argument("--compare", metavar="PATH", help="与之前保存的基线比较")
+    parser.add_argument("--threshold", type=float, default=0.1, help="吞吐量下降超过该比例视为退化（默认 0.1）")
+    parser.add_argument("--no-verify", action="store_true", help="跳过解析器差分校验")
+    args = parser.parse_args(argv)
+
+    character_mapping = ConfigManager(args.config).get_character_mapping()
+    profiles = args.profile or sorted(PROFILES)
+    stages = args.stage or list(STAGES)
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+
+    corpus = []
+    for profile in profiles:
+        for size in sizes:
+            path = ensure_corpus_file(Path(args.corpus_dir), character_mapping, size, profile)
+            corpus.append((f"{profile}/{format_size(size)}", path, size))
+            if not args.no_verify and not verify_parsers(path, args.config):
+                return 1
+
+    results: Dict[str, Dict] = {}
+    print(f"{'用例':<40}{'耗时(s)':>10}{'行/秒':>14}{'MB/s':>10}{'峰值RSS(MB)':>14}")
+    # spawn 启动且每个子进程只运行一个用例，峰值 RSS 不受父进程和其他用例影响
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        for name, path, size in corpus:
+            # 大文件只运行一次，避免基准耗时过长
+            repeat = args.repeat if size < 10 * 1024 * 1024 else 1
+            for stage in stages:
+                key = f"{name}/{stage}"
+                result = pool.apply(_run_case, ((stage, str(path), args.config, repeat),))
+                results[key] = result
+                rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+                print(f"{key:<40}{result['seconds']:>10.4f}{result['lines_per_sec'] or 0:>14.0f}"
+                      f"{result['mb_per_sec'] or 0:>10.2f}{rss:>14}")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 个用例吞吐量下降超过 {args.threshold * 100:.0f}%", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
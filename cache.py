@@ -0,0 +1,204 @@
+# 转换缓存：以输入内容哈希和配置指纹为键保存转换结果，未修改的文件直接复用缓存，跳过解析。
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from converter import QuotePairs, QuoteRules, TextConverter, convert_file
+from script_reader import MemoryScript, ScriptSource
+from sinks import OutputSink
+
+logger = logging.getLogger(__name__)
+
+# 输出格式变化时递增，使旧缓存全部失效
+CACHE_FORMAT_VERSION = 2
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: ScriptSource) -> str:
+    """计算文件内容哈希"""
+    if isinstance(path, MemoryScript):
+        return hashlib.blake2b(path.data, digest_size=20).hexdigest()
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint(converter: TextConverter, narrator_name: str = None,
+                       selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True) -> str:
+    """计算影响转换结果的配置指纹：角色映射和别名、说话人正则、名字长度上限、旁白名称、引号规则、指令查找表和输出格式"""
+    if narrator_name is None:
+        narrator_name = converter.parsing_config.get("default_narrator_name", " ")
+    quote_rules = QuoteRules.coerce(selected_quote_pairs)
+    relevant = {
+        "version": CACHE_FORMAT_VERSION,
+        "character_mapping": converter.character_mapping,
+        "character_aliases": converter.speaker_index.character_aliases,
+        "speaker_pattern": converter.parser.pattern.pattern,
+        "max_speaker_name_length": converter.parser.max_name_length,
+        "narrator_name": narrator_name,
+        "quote_pairs": quote_rules.as_dict(),
+        "pretty": pretty,
+    }
+    # 只在启用时才加入指纹，未使用这些选项的缓存条目保持有效
+    if quote_rules.nested:
+        relevant["nested_quotes"] = True
+    if quote_rules.strip_lines:
+        relevant["strip_quotes_per_line"] = True
+    if len(converter.speaker_formats) > 1:
+        relevant["speaker_formats"] = {name: parser.pattern.pattern for name, parser in converter.speaker_formats.items()}
+        relevant["speaker_format"] = converter.parsing_config.get("speaker_format", "auto")
+        relevant["format_sample_lines"] = converter.format_sample_lines
+    if converter.directives is not None:
+        relevant["directives"] = converter.directives.fingerprint()
+    encoded = json.dumps(relevant, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+
+class ConversionCache:
+    """基于文件系统的持久化转换缓存。
+
+    每个缓存条目是缓存目录下的一个 JSON 文件，文件名由内容哈希和配置指纹决定，
+    文件的修改时间记录最近一次使用时间，用于按时间和总大小淘汰。多个进程可以共享同一个缓存目录。
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, content_hash: str, fingerprint: str) -> Path:
+        key = hashlib.blake2b(f"{fingerprint}:{content_hash}".encode('ascii'), digest_size=20).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def convert_file(self, converter: TextConverter, input_path: ScriptSource, output_path: str, narrator_name: str = None,
+                     selected_quote_pairs: Optional[QuotePairs] = None, fingerprint: Optional[str] = None,
+                     pretty: bool = True, convert_fn: Callable = convert_file,
+                     sink: Optional[OutputSink] = None) -> bool:
+        """转换单个文件，命中缓存时直接复制缓存结果。返回是否命中缓存
+
+        未命中时调用 convert_fn 进行转换，其签名与 converter.convert_file 相同。
+        指定 sink 时输出交给 sink 写出：未命中时先转换到缓存条目，再从缓存条目写出。
+        转换期间转换器重新加载了配置时，结果与指纹对应的配置不一致，只写出不存入缓存。
+        """
+        if fingerprint is None:
+            # 先应用已经发生的配置修改，使指纹与本次转换使用的配置一致
+            converter.reload_config_if_changed()
+            fingerprint = config_fingerprint(converter, narrator_name, selected_quote_pairs, pretty)
+        generation = converter.config_generation
+        entry = self._entry_path(hash_file(input_path), fingerprint)
+        if entry.exists():
+            if sink is not None:
+                sink.write_file(output_path, str(entry))
+            else:
+                shutil.copyfile(entry, output_path)
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        if sink is not None:
+            if not self._convert_into(entry, generation, converter, input_path, output_path, narrator_name,
+                                      selected_quote_pairs, pretty, convert_fn, sink):
+                convert_fn(converter, input_path, output_path, narrator_name, selected_quote_pairs, pretty, sink=sink)
+            return False
+
+        convert_fn(converter, input_path, output_path, narrator_name, selected_quote_pairs, pretty)
+        if converter.config_generation == generation:
+            self._store(entry, output_path)
+        return False
+
+    def _convert_into(self, entry: Path, generation: int, converter: TextConverter, input_path: ScriptSource,
+                      output_path: str, narrator_name: Optional[str], selected_quote_pairs: Optional[QuotePairs],
+                      pretty: bool, convert_fn: Callable, sink: OutputSink) -> bool:
+        """先转换到缓存目录下的临时文件，配置未变化时替换为缓存条目，再写入 sink。
+        缓存目录不可写时返回 False，由调用方改为不经缓存转换
+        """
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry.parent, suffix=".tmp")
+            os.close(fd)
+        except OSError as e:
+            logger.warning(f"写入缓存失败: {e}")
+            return False
+        try:
+            convert_fn(converter, input_path, tmp_path, narrator_name, selected_quote_pairs, pretty)
+            if converter.config_generation == generation:
+                os.replace(tmp_path, entry)
+                sink.write_file(output_path, str(entry))
+            else:
+                sink.write_file(output_path, tmp_path)
+        finally:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        return True
+
+    def _store(self, entry: Path, output_path: str):
+        # 先写临时文件再原子替换，避免并发进程读到写了一半的缓存
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry.parent, suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(output_path, tmp_path)
+            os.replace(tmp_path, entry)
+        except OSError as e:
+            logger.warning(f"写入缓存失败: {e}")
+
+    def evict(self) -> Tuple[int, int]:
+        """按最长保留时间和总大小淘汰缓存条目，优先删除最久未使用的。返回 (删除条目数, 释放字节数)"""
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        now = time.time()
+        total_size = sum(size for _, size, _ in entries)
+        removed_count = 0
+        freed_bytes = 0
+        for mtime, size, path in entries:
+            expired = self.max_age_seconds is not None and now - mtime > self.max_age_seconds
+            oversized = self.max_size_bytes is not None and total_size > self.max_size_bytes
+            if not expired and not oversized:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total_size -= size
+            removed_count += 1
+            freed_bytes += size
+        return removed_count, freed_bytes
+
+
+def cache_from_config(cache_config: Dict, cache_dir: Optional[str] = None) -> ConversionCache:
+    """根据配置文件中的 cache 部分创建缓存"""
+    max_size_mb = cache_config.get("max_size_mb")
+    max_age_days = cache_config.get("max_age_days")
+    return ConversionCache(
+        cache_dir or cache_config.get("directory", ".bestdori_cache"),
+        max_size_bytes=int(max_size_mb * 1024 * 1024) if max_size_mb else None,
+        max_age_seconds=max_age_days * 86400 if max_age_days else None,
+    )
@@ -0,0 +1,670 @@
+# 命令行入口：无需图形界面，使用多进程批量转换、把 JSON 转回文本并校验往返转换、监视文件夹自动转换，
+# 或启动本地 HTTP 转换服务。
+
+import argparse
+import logging
+import os
+import sys
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from archives import ArchiveError, archive_stem, is_archive, iter_archive_members
+from cache import ConversionCache, cache_from_config, config_fingerprint, hash_file
+from converter import ConfigManager, QuoteRules, TextConverter, build_quote_rules, convert_file, parse_quote_pairs
+from lint import LintOptions, lint_batch
+from parallel import PARALLEL_MIN_SIZE, convert_file_parallel, map_ordered
+from reverse import ReverseOptions, default_quote_style, reverse_batch
+from manifest import DEFAULT_MAX_ATTEMPTS, JobManifest, hash_text
+from script_reader import ScriptSource, script_size
+from sinks import BUNDLE_KINDS, SINK_KINDS, MemorySink, OutputSink, create_sink, is_shared
+from instrumentation import (
+    FileProfiler, Instrumentation, cache_hit_stats, latency_summary, start_profiler, stop_profiler,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BatchOptions:
+    """一次批处理中所有文件共用的参数，在工作进程启动时传入一次"""
+    config_path: str
+    narrator_name: str
+    quote_rules: QuoteRules
+    pretty: bool = True
+    cache_dir: Optional[str] = None
+    fingerprint: Optional[str] = None
+    instrument: bool = False
+    # 大于 split_min_size 字节的文件在空行处切分，由 split_jobs 个进程并行转换（仅在只有一个文件时启用）
+    split_jobs: int = 1
+    split_min_size: int = PARALLEL_MIN_SIZE
+    # 输出方式（见 sinks.py）。不能在工作进程中直接写出的方式由工作进程交回结果，主进程统一写出
+    sink: str = "plain"
+    # 计算输入和输出的哈希，供任务清单记录
+    record_hashes: bool = False
+
+
+# 每个工作进程各自持有一个转换器，避免为每个文件重复加载配置和编译正则
+_worker_converter: Optional[TextConverter] = None
+_worker_cache: Optional[ConversionCache] = None
+_worker_options: Optional[BatchOptions] = None
+_worker_sink: Optional[OutputSink] = None
+
+
+def _init_worker(options: BatchOptions):
+    global _worker_converter, _worker_cache, _worker_options, _worker_sink
+    _worker_options = options
+    if options.sink == "plain":
+        _worker_sink = None
+    else:
+        _worker_sink = create_sink(options.sink) if is_shared(options.sink) else MemorySink()
+    # 一次批处理只使用一份配置：工作进程不热重载配置，缓存指纹按工作进程实际加载的配置计算，
+    # 批处理期间修改配置文件不会把新配置的结果存到旧配置的指纹下
+    _worker_converter = TextConverter(ConfigManager(options.config_path), hot_reload=False)
+    if options.fingerprint is not None:
+        fingerprint = config_fingerprint(_worker_converter, options.narrator_name, options.quote_rules, options.pretty)
+        if fingerprint != options.fingerprint:
+            logger.warning("批处理开始后配置文件已被修改，本进程按修改后的配置转换")
+            _worker_options = replace(options, fingerprint=fingerprint)
+    # 工作进程只读写缓存条目，淘汰由主进程在批处理结束后统一执行
+    _worker_cache = ConversionCache(options.cache_dir) if options.cache_dir else None
+
+
+def _convert_task(task: Tuple[ScriptSource, str]) -> Tuple[str, bool, str, bool, Optional[Dict], Optional[Dict[str, str]],
+                                                           Dict[str, Any]]:
+    """转换单个文件或压缩包成员。输出交给主进程写出时，倒数第二项是 {输出路径: JSON 文本}；
+    最后一项是耗时、输入字节数，以及 record_hashes 时的输入输出哈希
+    """
+    input_path, output_path = task
+    options = _worker_options
+    profiler = FileProfiler() if options.instrument else None
+    if profiler:
+        convert_fn = profiler.convert_file
+    elif options.split_jobs > 1:
+        convert_fn = partial(convert_file_parallel, jobs=options.split_jobs, min_size=options.split_min_size)
+    else:
+        convert_fn = convert_file
+    start = time.perf_counter()
+    try:
+        if options.sink not in BUNDLE_KINDS:
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        if _worker_cache is not None:
+            hit = _worker_cache.convert_file(_worker_converter, input_path, output_path, options.narrator_name,
+                                             options.quote_rules, fingerprint=options.fingerprint,
+                                             pretty=options.pretty, convert_fn=convert_fn, sink=_worker_sink)
+        else:
+            convert_fn(_worker_converter, input_path, output_path, options.narrator_name, options.quote_rules,
+                       options.pretty, sink=_worker_sink)
+            hit = False
+        documents = _worker_sink.take() if isinstance(_worker_sink, MemorySink) else None
+        seconds = time.perf_counter() - start
+        stats = None
+        if profiler:
+            if hit:
+                bytes_out = sum(len(text.encode('utf-8')) for text in documents.values()) if documents else None
+                stats = cache_hit_stats(input_path, output_path, seconds, bytes_out)
+            else:
+                stats = profiler.stats
+        result = {"seconds": seconds, "bytes_in": script_size(input_path)}
+        if options.record_hashes:
+            result["input_hash"] = hash_file(input_path)
+            result["output_hash"] = hash_text(documents[output_path]) if documents else hash_file(output_path)
+        return str(input_path), True, "Success", hit, stats, documents, result
+    except Exception as e:
+        if isinstance(_worker_sink, MemorySink):
+            _worker_sink.take()
+        return str(input_path), False, str(e), False, None, None, {"seconds": time.perf_counter() - start}
+
+
+def _publish(results, sink: Optional[OutputSink]):
+    """在主进程中把工作进程交回的结果写入 sink，写出失败的文件记为失败"""
+    for input_path, success, message, hit, stats, documents, result in results:
+        if documents and sink is not None:
+            try:
+                for output_path, text in documents.items():
+                    sink.write(output_path, text)
+            except (OSError, ValueError) as e:
+                success, message, stats = False, f"写出失败: {e}", None
+        yield input_path, success, message, hit, stats, result
+
+
+def collect_input_files(input_path: Path, pattern: str = "*.txt", recursive: bool = False) -> List[Path]:
+    """收集待转换的文件，按路径排序"""
+    if input_path.is_file():
+        return [input_path]
+    files = input_path.rglob(pattern) if recursive else input_path.glob(pattern)
+    return sorted(p for p in files if p.is_file())
+
+
+def _resolve_conversion_options(config_manager: ConfigManager,
+                                args: argparse.Namespace) -> Tuple[str, QuoteRules]:
+    """根据命令行参数确定旁白名称和引号规则"""
+    quote_rules = build_quote_rules(config_manager, args.quote, args.no_quotes, args.nested_quotes,
+                                    args.per_line_quotes)
+    narrator_name = args.narrator
+    if narrator_name is None:
+        narrator_name = config_manager.get_parsing_config().get("default_narrator_name", " ")
+    return narrator_name, quote_rules
+
+
+def _output_path_for(input_file: Path, input_root: Path, output_dir: Path, suffix: str = ".json") -> Path:
+    if input_root.is_file():
+        return output_dir / f"{input_file.stem}{suffix}"
+    return (output_dir / input_file.relative_to(input_root)).with_suffix(suffix)
+
+
+def _open_manifest(path: str, job: Dict[str, Any], tasks: List[Tuple[str, str]], resume: bool,
+                   max_attempts: int) -> Tuple[JobManifest, List[Tuple[str, str]]]:
+    """新建任务清单，或在 resume 时读取已有清单，返回 (清单, 本次要处理的任务)"""
+    if not resume or not os.path.exists(path):
+        return JobManifest.create(path, job, tasks), tasks
+    manifest = JobManifest.load(path)
+    if manifest.job != job:
+        manifest.close()
+        raise ValueError(f"{path} 记录的任务参数或配置与本次不同，请去掉 --resume 重新开始或指定其他清单")
+    remaining, skipped, exhausted = manifest.remaining(max_attempts)
+    # 上次运行后新增的文件不在清单中，本次不处理
+    added = len({input_path for input_path, _ in tasks} - manifest.entries.keys())
+    logger.info(f"继续任务清单 {path}: 跳过已完成 {skipped} 个，待处理 {len(remaining)} 个"
+                f"{f'，{exhausted} 个失败已达 {max_attempts} 次不再重试' if exhausted else ''}"
+                f"{f'，忽略新增的 {added} 个文件' if added else ''}")
+    return manifest, remaining
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    input_root = Path(args.input)
+    from_archive = is_archive(input_root)
+    if args.output:
+        output_dir = Path(args.output)
+    elif from_archive:
+        # 压缩包默认输出到旁边的同名文件夹，保留成员的目录结构
+        output_dir = input_root.parent / archive_stem(input_root)
+    else:
+        output_dir = input_root.parent if input_root.is_file() else input_root
+    if not input_root.exists():
+        logger.error(f"输入路径不存在: {input_root}")
+        return 2
+    if args.manifest and (from_archive or args.sink in BUNDLE_KINDS):
+        # 清单按输出文件的哈希判断是否已完成，压缩包成员和打包输出无法单独校验
+        logger.error("任务清单不支持压缩包输入和 jsonl/zip 输出")
+        return 2
+    if args.resume and not args.manifest:
+        logger.error("--resume 需要同时指定 --manifest")
+        return 2
+
+    config_manager = ConfigManager(args.config)
+    try:
+        narrator_name, quote_rules = _resolve_conversion_options(config_manager, args)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+    if from_archive:
+        txt_files = []
+    else:
+        txt_files = collect_input_files(input_root, args.pattern, args.recursive)
+        if not txt_files:
+            logger.warning(f"未在 {input_root} 中找到匹配 {args.pattern} 的文件。")
+            return 0
+
+    # 打包和批量刷盘的写出方式只能在主进程中使用
+    sink = None
+    if not is_shared(args.sink):
+        stem = archive_stem(input_root) if from_archive else input_root.stem
+        bundle_path = args.bundle or str(output_dir / f"{stem or 'output'}.{args.sink}")
+        try:
+            Path(bundle_path).parent.mkdir(parents=True, exist_ok=True)
+            sink = create_sink(args.sink, bundle_path, root=str(output_dir))
+        except (OSError, ValueError) as e:
+            logger.error(f"无法创建输出: {e}")
+            return 2
+    pretty = not args.compact
+    if pretty and sink is not None and sink.requires_compact:
+        logger.info(f"{args.sink} 输出使用紧凑格式的 JSON")
+        pretty = False
+
+    cache = None
+    fingerprint = None
+    if not args.no_cache or args.manifest:
+        # 清单用指纹判断继续运行时的配置是否与上次相同，禁用缓存时也要计算
+        fingerprint = config_fingerprint(TextConverter(config_manager), narrator_name, quote_rules, pretty)
+    if not args.no_cache:
+        cache_config = dict(config_manager.get_cache_config())
+        if args.cache_max_size is not None:
+            cache_config["max_size_mb"] = args.cache_max_size
+        if args.cache_max_age is not None:
+            cache_config["max_age_days"] = args.cache_max_age
+        cache = cache_from_config(cache_config, args.cache_dir)
+    options = BatchOptions(
+        config_path=args.config,
+        narrator_name=narrator_name,
+        quote_rules=quote_rules,
+        pretty=pretty,
+        cache_dir=str(cache.cache_dir) if cache else None,
+        fingerprint=fingerprint if cache else None,
+        instrument=bool(args.stats),
+        sink=args.sink,
+        record_hashes=bool(args.manifest),
+    )
+
+    jobs = max(1, args.jobs or os.cpu_count() or 1)
+    if args.profile_out and jobs > 1:
+        logger.warning("cProfile 分析只能在单进程下进行，已改为 --jobs 1")
+        jobs = 1
+    manifest = None
+    if from_archive:
+        # 成员在主进程中按顺序逐个读出，随取随分发给工作进程，不解压到磁盘
+        tasks = ((member, str(output_dir / relative.with_suffix(".json")))
+                 for relative, member in iter_archive_members(input_root, args.pattern))
+        logger.info(f"开始批量处理: 压缩包 {input_root}, {jobs} 个进程")
+    else:
+        tasks = [(str(f), str(_output_path_for(f, input_root, output_dir))) for f in txt_files]
+        if args.manifest:
+            job = {"input": str(input_root.resolve()), "output": str(output_dir.resolve()), "pattern": args.pattern,
+                   "recursive": args.recursive, "fingerprint": fingerprint, "sink": args.sink}
+            try:
+                manifest, tasks = _open_manifest(args.manifest, job, tasks, args.resume, args.max_attempts)
+            except (OSError, ValueError) as e:
+                logger.error(f"无法使用任务清单: {e}")
+                return 2
+            if not tasks:
+                counts = manifest.counts()
+                manifest.close()
+                print(f"任务清单中没有待处理的文件: {counts}")
+                return 1 if counts["failed"] else 0
+        if len(tasks) == 1 and jobs > 1 and not args.stats:
+            # 只有一个文件时进程池无事可做，改为把文件切分后并行转换
+            options = replace(options, split_jobs=jobs,
+                              split_min_size=int(args.split_threshold * 1024 * 1024))
+            jobs = 1
+        logger.info(f"开始批量处理: {len(tasks)} 个文件, {max(jobs, options.split_jobs)} 个进程")
+
+    instrumentation = Instrumentation() if args.stats else None
+    start = time.perf_counter()
+    try:
+        with sink if sink is not None else nullcontext(), manifest if manifest is not None else nullcontext():
+            if jobs == 1:
+                _init_worker(options)
+                profiler = start_profiler() if args.profile_out else None
+                summary = _collect_results(_publish(map(_convert_task, tasks), sink), args.verbose, instrumentation,
+                                           manifest)
+                if profiler:
+                    stop_profiler(profiler, args.profile_out)
+            else:
+                with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                         initargs=(options,)) as executor:
+                    if from_archive:
+                        # 限制同时在途的成员数，内存占用不随压缩包大小增长
+                        results = map_ordered(executor, _convert_task, tasks, jobs * 4)
+                    else:
+                        chunksize = max(1, min(64, len(tasks) // (jobs * 4)))
+                        results = executor.map(_convert_task, tasks, chunksize=chunksize)
+                    summary = _collect_results(_publish(results, sink), args.verbose, instrumentation, manifest)
+    except ArchiveError as e:
+        logger.error(str(e))
+        return 2
+    elapsed = time.perf_counter() - start
+    success_count, failures, hit_count, latencies, bytes_in = summary
+    if from_archive and not success_count and not failures:
+        logger.warning(f"未在 {input_root} 中找到匹配 {args.pattern} 的成员。")
+
+    print(f"批量处理完成！成功: {success_count}, 失败: {len(failures)}, 用时: {elapsed:.2f}s")
+    if success_count and elapsed > 0:
+        latency = latency_summary(latencies)
+        print(f"吞吐: {success_count / elapsed:.1f} 文件/s, {bytes_in / 1024 / 1024 / elapsed:.2f} MB/s; "
+              f"单文件耗时 p50 {latency['p50']:.1f} ms, p90 {latency['p90']:.1f} ms, "
+              f"p99 {latency['p99']:.1f} ms, 最长 {latency['max']:.1f} ms")
+    if manifest is not None:
+        print(f"任务清单已保存到: {args.manifest} {manifest.counts()}")
+    if sink is not None and args.sink in BUNDLE_KINDS:
+        print(f"结果已打包到: {sink.bundle_path}")
+    if cache is not None:
+        removed_count, freed_bytes = cache.evict()
+        print(f"缓存命中: {hit_count}, 未命中: {success_count - hit_count}"
+              f"{f', 淘汰 {removed_count} 个条目 ({freed_bytes / 1024 / 1024:.1f} MB)' if removed_count else ''}")
+    for input_path, message in failures:
+        print(f"  失败: {input_path}: {message}", file=sys.stderr)
+    if instrumentation is not None:
+        instrumentation.write_report(args.stats)
+        print(f"性能统计已保存到: {args.stats}")
+    if args.profile_out:
+        print(f"cProfile 数据已保存到: {args.profile_out}（可用 python -m pstats 查看）")
+    return 1 if failures else 0
+
+
+def run_reverse(args: argparse.Namespace) -> int:
+    input_root = Path(args.input)
+    if not input_root.exists():
+        logger.error(f"输入路径不存在: {input_root}")
+        return 2
+
+    config_manager = ConfigManager(args.config)
+    try:
+        if args.no_quote_style:
+            quote_style = None
+        elif args.quote_style:
+            quote_style = next(iter(parse_quote_pairs([args.quote_style]).items()))
+        else:
+            quote_style = default_quote_style(config_manager)
+        verify_rules = None
+        if args.verify:
+            verify_rules = build_quote_rules(config_manager, args.quote, args.no_quotes, args.nested_quotes,
+                                             args.per_line_quotes)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+    json_files = collect_input_files(input_root, args.pattern, args.recursive)
+    if not json_files:
+        logger.warning(f"未在 {input_root} 中找到匹配 {args.pattern} 的文件。")
+        return 0
+
+    # 只做校验且未指定输出文件夹时不写出文本
+    if args.verify and not args.output:
+        tasks = [(str(f), None) for f in json_files]
+    else:
+        output_dir = Path(args.output) if args.output else (input_root.parent if input_root.is_file() else input_root)
+        tasks = []
+        for f in json_files:
+            output_path = _output_path_for(f, input_root, output_dir, ".txt")
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            tasks.append((str(f), str(output_path)))
+    options = ReverseOptions(
+        config_path=args.config,
+        narrator_name=args.narrator,
+        quote_style=quote_style,
+        separator=args.separator,
+        verify_rules=verify_rules,
+    )
+    jobs = max(1, args.jobs or os.cpu_count() or 1)
+    logger.info(f"开始反向转换: {len(tasks)} 个文件, {jobs} 个进程")
+
+    start = time.perf_counter()
+    success_count = 0
+    failures = []
+    action_count = 0
+    lossy_files = []
+    for input_path, success, message, report in reverse_batch(tasks, options, jobs):
+        if not success:
+            failures.append((input_path, message))
+            logger.error(f"处理文件 {input_path} 失败: {message}")
+            continue
+        success_count += 1
+        if report is not None:
+            action_count += report.actions
+            if report.lossy:
+                lossy_files.append(report)
+        if args.verbose:
+            logger.info(f"完成: {input_path}")
+    elapsed = time.perf_counter() - start
+
+    print(f"反向转换完成！成功: {success_count}, 失败: {len(failures)}, 用时: {elapsed:.2f}s")
+    if args.verify:
+        lossy_count = sum(report.lossy for report in lossy_files)
+        print(f"往返校验: {action_count} 个动作, {lossy_count} 处无法还原, 涉及 {len(lossy_files)} 个文件")
+        for report in lossy_files:
+            print(f"  {report.path}: {report.lossy} 处")
+            for difference in report.differences:
+                print(f"    {difference}")
+            if report.lossy > len(report.differences):
+                print(f"    ……另有 {report.lossy - len(report.differences)} 处")
+    for input_path, message in failures:
+        print(f"  失败: {input_path}: {message}", file=sys.stderr)
+    return 1 if failures or lossy_files else 0
+
+
+def run_lint(args: argparse.Namespace) -> int:
+    input_root = Path(args.input)
+    if not input_root.exists():
+        logger.error(f"输入路径不存在: {input_root}")
+        return 2
+
+    config_manager = ConfigManager(args.config)
+    try:
+        narrator_name, quote_rules = _resolve_conversion_options(config_manager, args)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+    txt_files = collect_input_files(input_root, args.pattern, args.recursive)
+    if not txt_files:
+        logger.warning(f"未在 {input_root} 中找到匹配 {args.pattern} 的文件。")
+        return 0
+
+    options = LintOptions(config_path=args.config, narrator_name=narrator_name, quote_rules=quote_rules)
+    jobs = max(1, args.jobs or os.cpu_count() or 1)
+    logger.info(f"开始检查: {len(txt_files)} 个文件, {jobs} 个进程")
+
+    start = time.perf_counter()
+    failures = []
+    action_count = 0
+    diagnostic_count = 0
+    flagged_files = 0
+    for input_path, success, message, count, diagnostics in lint_batch([str(f) for f in txt_files], options, jobs):
+        if not success:
+            failures.append((input_path, message))
+            logger.error(f"处理文件 {input_path} 失败: {message}")
+            continue
+        action_count += count
+        if diagnostics:
+            flagged_files += 1
+            diagnostic_count += len(diagnostics)
+            for diagnostic in diagnostics:
+                print(diagnostic.format(input_path))
+        elif args.verbose:
+            logger.info(f"无问题: {input_path}")
+    elapsed = time.perf_counter() - start
+
+    print(f"检查完成！{len(txt_files)} 个文件, {action_count} 个动作, {diagnostic_count} 个问题, "
+          f"涉及 {flagged_files} 个文件, 失败: {len(failures)}, 用时: {elapsed:.2f}s")
+    for input_path, message in failures:
+        print(f"  失败: {input_path}: {message}", file=sys.stderr)
+    return 1 if failures or diagnostic_count else 0
+
+
+def run_watch(args: argparse.Namespace) -> int:
+    # watchdog 导入较慢，只在监视文件夹时导入
+    from watcher import WATCHDOG_ENABLED, FolderWatcher
+
+    input_dir = Path(args.input)
+    if not input_dir.is_dir():
+        logger.error(f"输入文件夹不存在: {input_dir}")
+        return 2
+
+    config_manager = ConfigManager(args.config)
+    try:
+        narrator_name, quote_rules = _resolve_conversion_options(config_manager, args)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+    if not args.polling and not WATCHDOG_ENABLED:
+        logger.info("未安装 watchdog，使用轮询方式监视文件夹")
+
+    watcher = FolderWatcher(TextConverter(config_manager), str(input_dir), args.output or str(input_dir),
+                            narrator_name, quote_rules, pretty=not args.compact, pattern=args.pattern,
+                            recursive=args.recursive, debounce=args.debounce, poll_interval=args.poll_interval,
+                            use_polling=args.polling)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    print(f"已停止监视。转换: {watcher.converted_count}, 失败: {watcher.failed_count}")
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    # asyncio 导入较慢，只在启动服务时导入，其他子命令启动不受影响
+    import asyncio
+    from server import serve
+
+    options = {"workers": args.workers or None, "max_concurrency": args.max_concurrency or None}
+    if args.max_body is not None:
+        options["max_body_bytes"] = int(args.max_body * 1024 * 1024)
+    if args.max_batch is not None:
+        options["max_batch_items"] = args.max_batch
+    if args.max_pending is not None:
+        options["max_pending"] = args.max_pending
+    try:
+        asyncio.run(serve(args.config, args.host, args.port, **options))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        logger.error(f"无法启动服务: {e}")
+        return 1
+    print("转换服务已停止")
+    return 0
+
+
+def _collect_results(results, verbose: bool, instrumentation: Optional[Instrumentation] = None,
+                     manifest: Optional[JobManifest] = None) -> Tuple[int, List[Tuple[str, str]], int, List[float], int]:
+    """汇总结果，返回 (成功数, 失败列表, 缓存命中数, 成功文件的耗时列表, 成功文件的输入字节数)"""
+    success_count = 0
+    hit_count = 0
+    failures = []
+    latencies = []
+    bytes_in = 0
+    for input_path, success, message, hit, stats, result in results:
+        if manifest is not None:
+            manifest.record(input_path, success, message, result)
+        if instrumentation is not None:
+            if stats is not None:
+                instrumentation.add_file(stats)
+            elif not success:
+                instrumentation.add_failure()
+        if success:
+            success_count += 1
+            hit_count += hit
+            latencies.append(result["seconds"])
+            bytes_in += result["bytes_in"]
+            if verbose:
+                logger.info(f"成功{'（缓存）' if hit else ''}: {input_path}")
+        else:
+            failures.append((input_path, message))
+            logger.error(f"处理文件 {input_path} 失败: {message}")
+    return success_count, failures, hit_count, latencies, bytes_in
+
+
+def _add_quote_rule_arguments(parser: argparse.ArgumentParser):
+    """引号规则的选项，未指定时取配置文件中的 nested_quotes 和 strip_quotes_per_line"""
+    parser.add_argument("--nested-quotes", action=argparse.BooleanOptionalAction, default=None,
+                        help="反复去除嵌套或重复的引号（如 「『……』」），只去除首尾互相配对的引号")
+    parser.add_argument("--per-line-quotes", action=argparse.BooleanOptionalAction, default=None,
+                        help="多行台词中被引号包裹的每一行也分别去除引号")
+
+
+def _add_conversion_arguments(parser: argparse.ArgumentParser):
+    """convert 与 watch 共用的转换参数"""
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子文件夹")
+    parser.add_argument("--pattern", default="*.txt", help="文件匹配模式（默认 *.txt）")
+    parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    parser.add_argument("--narrator", default=None, help="旁白名称（默认取配置文件）")
+    parser.add_argument("--quote", action="append", metavar="PAIR",
+                        help="要去除的引号对，如 「」，可重复指定（默认启用全部预设引号）")
+    parser.add_argument("--no-quotes", action="store_true", help="不去除任何引号")
+    _add_quote_rule_arguments(parser)
+    parser.add_argument("--compact", action="store_true", help="输出不带缩进的紧凑 JSON，适合程序读取")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Bestdori 剧情 TXT 转 JSON 命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="批量转换文件或文件夹")
+    convert_parser.add_argument("input", help="输入的 .txt 文件或文件夹")
+    convert_parser.add_argument("-o", "--output", help="输出文件夹（默认与输入相同）")
+    convert_parser.add_argument("-j", "--jobs", type=int, default=0, help="并行进程数（默认为 CPU 核心数）")
+    convert_parser.add_argument("--split-threshold", type=float, default=PARALLEL_MIN_SIZE / 1024 / 1024,
+                                metavar="MB", help="只转换一个文件时，超过该大小就切分后并行转换（默认 4 MB）")
+    _add_conversion_arguments(convert_parser)
+    convert_parser.add_argument("--sink", choices=SINK_KINDS, default="plain",
+                                help="输出方式：plain 直接写文件，atomic 每个文件 fsync 后原子替换，buffered 原子替换并分组 fsync，"
+                                     "jsonl/zip 把整批结果打包为一个文件（默认 plain）")
+    convert_parser.add_argument("--bundle", metavar="PATH",
+                                help="jsonl/zip 打包文件的路径（默认为输出文件夹下的 <输入名>.jsonl 或 .zip）")
+    convert_parser.add_argument("--no-cache", action="store_true", help="禁用转换缓存，总是重新转换")
+    convert_parser.add_argument("--cache-dir", default=None, help="缓存目录（默认取配置文件）")
+    convert_parser.add_argument("--cache-max-size", type=float, default=None, metavar="MB", help="缓存总大小上限")
+    convert_parser.add_argument("--cache-max-age", type=float, default=None, metavar="DAYS", help="缓存条目最长保留天数")
+    convert_parser.add_argument("--manifest", metavar="PATH",
+                                help="把每个文件的状态、输入输出哈希和耗时记录到任务清单，中断后可用 --resume 继续")
+    convert_parser.add_argument("--resume", action="store_true",
+                                help="按 --manifest 指定的清单继续：跳过已完成的文件，重试失败的文件")
+    convert_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, metavar="N",
+                                help=f"继续运行时每个文件最多尝试的次数（默认 {DEFAULT_MAX_ATTEMPTS}）")
+    convert_parser.add_argument("--stats", metavar="PATH", help="收集各阶段耗时并保存为 JSON 报告")
+    convert_parser.add_argument("--profile-out", metavar="PATH", help="使用 cProfile 分析并保存 pstats 文件（单进程）")
+    convert_parser.add_argument("-v", "--verbose", action="store_true", help="输出每个文件的处理结果")
+    convert_parser.set_defaults(func=run_batch)
+
+    reverse_parser = subparsers.add_parser("reverse", help="把 Bestdori JSON 转回剧本文本，可校验往返转换")
+    reverse_parser.add_argument("input", help="输入的 .json 文件或文件夹")
+    reverse_parser.add_argument("-o", "--output", help="输出文件夹（默认与输入相同；--verify 时不指定则不写出文本）")
+    reverse_parser.add_argument("-j", "--jobs", type=int, default=0, help="并行进程数（默认为 CPU 核心数）")
+    reverse_parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子文件夹")
+    reverse_parser.add_argument("--pattern", default="*.json", help="文件匹配模式（默认 *.json）")
+    reverse_parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    reverse_parser.add_argument("--narrator", default=None, help="旁白名称（默认取配置文件）")
+    reverse_parser.add_argument("--quote-style", metavar="PAIR", help="包裹台词的引号，如 「」（默认取配置中的 reverse.quote_style）")
+    reverse_parser.add_argument("--no-quote-style", action="store_true", help="台词不加引号")
+    reverse_parser.add_argument("--separator", default="：", help="名字与台词之间的分隔符（默认全角冒号）")
+    reverse_parser.add_argument("--verify", action="store_true",
+                                help="把生成的文本再转换回 JSON，报告无法还原的动作，有差异时返回非零退出码")
+    reverse_parser.add_argument("--quote", action="append", metavar="PAIR",
+                                help="校验时正向转换去除的引号对，与 convert 的同名参数一致")
+    reverse_parser.add_argument("--no-quotes", action="store_true", help="校验时正向转换不去除任何引号")
+    _add_quote_rule_arguments(reverse_parser)
+    reverse_parser.add_argument("-v", "--verbose", action="store_true", help="输出每个文件的处理结果")
+    reverse_parser.set_defaults(func=run_reverse)
+
+    lint_parser = subparsers.add_parser("lint", help="只检查剧本，不写出 JSON：未知说话人、名字过长被当作旁白、引号不成对")
+    lint_parser.add_argument("input", help="输入的 .txt 文件或文件夹")
+    lint_parser.add_argument("-j", "--jobs", type=int, default=0, help="并行进程数（默认为 CPU 核心数）")
+    lint_parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子文件夹")
+    lint_parser.add_argument("--pattern", default="*.txt", help="文件匹配模式（默认 *.txt）")
+    lint_parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    lint_parser.add_argument("--narrator", default=None, help="旁白名称（默认取配置文件）")
+    lint_parser.add_argument("--quote", action="append", metavar="PAIR",
+                             help="转换时去除的引号对，与 convert 的同名参数一致；引号是否成对总是按全部预设引号检查")
+    lint_parser.add_argument("--no-quotes", action="store_true", help="转换时不去除任何引号")
+    _add_quote_rule_arguments(lint_parser)
+    lint_parser.add_argument("-v", "--verbose", action="store_true", help="同时列出没有问题的文件")
+    lint_parser.set_defaults(func=run_lint)
+
+    watch_parser = subparsers.add_parser("watch", help="监视文件夹，文件保存后自动转换")
+    watch_parser.add_argument("input", help="要监视的文件夹")
+    watch_parser.add_argument("-o", "--output", help="输出文件夹（默认与输入相同）")
+    _add_conversion_arguments(watch_parser)
+    watch_parser.add_argument("--debounce", type=float, default=0.2, metavar="SECONDS",
+                              help="文件最后一次变化后等待多久再转换（默认 0.2 秒）")
+    watch_parser.add_argument("--polling", action="store_true", help="强制使用轮询（网络文件夹等不支持文件事件时）")
+    watch_parser.add_argument("--poll-interval", type=float, default=0.5, metavar="SECONDS",
+                              help="轮询和检查配置文件的间隔（默认 0.5 秒）")
+    watch_parser.set_defaults(func=run_watch)
+
+    serve_parser = subparsers.add_parser("serve", help="启动本地 HTTP 转换服务")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）")
+    serve_parser.add_argument("--port", type=int, default=8765, help="监听端口（默认 8765）")
+    serve_parser.add_argument("--config", default="config.yaml", help="配置文件路径")
+    serve_parser.add_argument("-w", "--workers", type=int, default=0, help="转换进程数（默认为 CPU 核心数）")
+    serve_parser.add_argument("--max-body", type=float, default=None, metavar="MB", help="请求体大小上限（默认 8 MB）")
+    serve_parser.add_argument("--max-batch", type=int, default=None, help="批量请求的最大项数（默认 256）")
+    serve_parser.add_argument("--max-concurrency", type=int, default=0,
+                              help="同时进行的转换数（默认为进程数的两倍）")
+    serve_parser.add_argument("--max-pending", type=int, default=None,
+                              help="同时处理的请求数上限，超过时返回 503（默认 256）")
+    serve_parser.set_defaults(func=run_serve)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
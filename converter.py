@@ -0,0 +1,963 @@
+# 转换核心：数据类、配置管理与文本解析。不依赖 tkinter，可在无图形界面的环境中使用。
+
+import hashlib
+import json
+import os
+import re
+import logging
+import threading
+import time
+from itertools import chain, islice
+from pathlib import Path
+from typing import TYPE_CHECKING, ContextManager, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Any, Union
+from dataclasses import dataclass, field
+from abc import ABC, abstractmethod
+
+from directives import DIRECTIVE_TABLES, Directive, DirectiveIndex
+from encoder import dumps_result, write_json_stream
+from script_reader import ScriptReader, ScriptSource, with_encoding_fallback
+from sinks import OutputSink, atomic_open
+from speakers import SpeakerIndex
+
+if TYPE_CHECKING:
+    from lint import Linter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEAKER_PATTERN = r'^([\w\s]+)\s*[：:]\s*(.*)$'
+# 默认配置或配置迁移逻辑变化时递增，使旧的配置快照失效
+CONFIG_SNAPSHOT_VERSION = 1
+# 长期运行的进程中，转换前最多每隔这么多秒检查一次配置文件是否被修改
+CONFIG_CHECK_INTERVAL = 1.0
+# 批量引擎每次转换最多缓存这么多个冒号前缀的解析结果
+_PREFIX_CACHE_SIZE = 4096
+# 不检查剧本时，无法识别的指令每种只记录一次警告；记录过的条目超过该数量时清空
+_REPORTED_DIRECTIVES_SIZE = 1024
+
+
+# 空字段共享同一个不可变元组，避免为每个动作分配新的空列表
+_EMPTY: Tuple = ()
+
+
+@dataclass(init=False)
+class ActionItem:
+    """对话动作数据类（使用 __slots__，列表字段为共享的不可变元组）"""
+    __slots__ = ("type", "delay", "wait", "characters", "name", "body", "motions", "voices", "close")
+    type: str
+    delay: int
+    wait: bool
+    characters: Tuple[int, ...]
+    name: str
+    body: str
+    motions: Tuple[str, ...]
+    voices: Tuple[str, ...]
+    close: bool
+
+    def __init__(self, type: str = "talk", delay: int = 0, wait: bool = True, characters: Tuple[int, ...] = _EMPTY,
+                 name: str = "", body: str = "", motions: Tuple[str, ...] = _EMPTY, voices: Tuple[str, ...] = _EMPTY,
+                 close: bool = False):
+        self.type = type
+        self.delay = delay
+        self.wait = wait
+        self.characters = _EMPTY if characters is None else characters
+        self.name = name
+        self.body = body
+        self.motions = _EMPTY if motions is None else motions
+        self.voices = _EMPTY if voices is None else voices
+        self.close = close
+
+
+@dataclass
+class ConversionResult:
+    """转换结果数据类"""
+    server: int = 0
+    voice: str = ""
+    background: Optional[str] = None
+    bgm: Optional[str] = None
+    actions: List[ActionItem] = None
+    
+    def __post_init__(self):
+        if self.actions is None:
+            self.actions = []
+
+
+class ConfigManager:
+    """配置管理器
+
+    解析后的配置会保存为 YAML 旁边的 JSON 快照（.config.yaml.snapshot.json），以 YAML 的修改时间、大小和内容哈希为键。
+    YAML 未修改时直接读取快照，不导入也不解析 YAML，命令行、GUI 和各工作进程启动更快。
+
+    每次重新加载或保存配置时 generation 加一，TextConverter 据此判断是否需要重建说话人索引。
+    """
+    
+    def __init__(self, config_path: str = "config.yaml", use_snapshot: bool = True):
+        self.config_path = Path(config_path)
+        self.snapshot_path = self.config_path.with_name(f".{self.config_path.name}.snapshot.json")
+        self.use_snapshot = use_snapshot
+        self.generation = 0
+        self._reload_lock = threading.Lock()
+        # 在读取之前记录文件状态，读取期间文件被修改时下一次检查会再次加载
+        self._signature = self._file_signature()
+        self.config = self._load_config()
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.config_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self) -> bool:
+        """配置文件在外部被修改时重新加载。新配置无法解析时保留当前配置。返回是否重新加载"""
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+        with self._reload_lock:
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                config = self._load_config(strict=True)
+            except Exception as e:
+                logger.warning(f"配置文件重新加载失败，继续使用当前配置: {e}")
+                return False
+            self.config = config
+            self.generation += 1
+        logger.info(f"配置文件已重新加载: {self.config_path}")
+        return True
+    
+    def _load_config(self, strict: bool = False) -> Dict[str, Any]:
+        """加载配置文件。strict 为 True 时解析失败直接抛出异常，否则退回默认配置"""
+        default_config = {
+            "character_mapping": {
+                # Poppin'Party
+                "户山香澄": [1], "花园多惠": [2], "牛込里美": [3], "山吹沙绫": [4], "市谷有咲": [5],
+                # Afterglow
+                "美竹兰": [6], "青叶摩卡": [7], "上原绯玛丽": [8], "宇田川巴": [9], "羽泽鸫": [10],
+                # Hello, Happy World!
+                "弦卷心": [11], "濑田薰": [12], "北泽育美": [13], "松原花音": [14], "奥泽美咲": [15],
+                # Pastel*Palettes
+                "丸山彩": [16], "冰川日菜": [17], "白鹭千圣": [18], "大和麻弥": [19], "若宫伊芙": [20],
+                # Roselia
+                "凑友希那": [21], "冰川纱夜": [22], "今井莉莎": [23], "宇田川亚子": [24], "白金燐子": [25],
+                # Morfonica
+                "仓田真白": [26], "桐谷透子": [27], "广町七深": [28], "二叶筑紫": [29], "八潮瑠唯": [30],
+                # RAISE A SUILEN
+                "LAYER": [31], "LOCK": [32], "MASKING": [33], "PAREO": [34], "CHU²": [35],
+                # mujica
+                "丰川祥子": [1], "若叶睦": [2], "三角初华": [3], "八幡海铃": [4], "祐天寺若麦": [5],
+                # MyGo
+                "高松灯": [36], "千早爱音": [37], "要乐奈": [38], "长崎素世": [39], "椎名立希": [40]
+            },
+            "character_aliases": {},
+            "cache": {
+                "directory": ".bestdori_cache",
+                "max_size_mb": 512,
+                "max_age_days": 30
+            },
+            "parsing": {
+                "max_speaker_name_length": 50,
+                "default_narrator_name": " ",
+                "speaker_parser": "auto",
+                "speaker_format": "auto",
+                "format_sample_lines": 50,
+                "engine": "line"
+            },
+            "patterns": {
+                "speaker_pattern": DEFAULT_SPEAKER_PATTERN,
+                "speaker_formats": {}
+            },
+            "quotes": {
+                "quote_pairs": {
+                    '"': '"', '“': '”', "'": "'", '‘': '’', "「": "」", "『": "』"
+                },
+                "quote_categories": {
+                    "中文引号 “...”": ["“", "”"],
+                    "中文单引号 ‘...’": ["‘", "’"],
+                    "日文引号 「...」": ["「", "」"],
+                    "日文书名号 『...』": ["『", "』"],
+                    "英文双引号 \"...\"": ['"', '"'],
+                    "英文单引号 '...'": ["'", "'"]
+                },
+                "nested_quotes": False,
+                "strip_quotes_per_line": False
+            },
+            "directives": {
+                "enabled": False,
+                "motions": {},
+                "voices": {},
+                "backgrounds": {},
+                "bgms": {},
+                "passthrough": []
+            },
+            "reverse": {
+                # JSON 转回文本时包裹台词的引号，空字符串表示不加引号
+                "quote_style": "「」"
+            }
+        }
+        
+        if not self.config_path.exists():
+            self._save_config(default_config)
+            return default_config
+
+        snapshot_config = self._load_snapshot()
+        if snapshot_config is not None:
+            return snapshot_config
+
+        try:
+            # 先记录修改时间再读取，读取期间文件被修改时快照会因修改时间不符而失效
+            stat = self.config_path.stat()
+            data = self.config_path.read_bytes()
+            # PyYAML 导入较慢，只在快照失效需要解析时导入；有 libyaml 时使用 C 实现的解析器
+            import yaml
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            loaded_config = yaml.load(data.decode('utf-8'), Loader=loader) or default_config
+            if "quote_categories" not in loaded_config.get("quotes", {}):
+                logger.warning("旧的配置文件缺少'quote_categories'，将从默认配置中添加。")
+                loaded_config["quotes"]["quote_categories"] = default_config["quotes"]["quote_categories"]
+                # 迁移后文件已改写，下次启动再生成快照
+                self._save_config(loaded_config)
+            else:
+                self._save_snapshot(loaded_config, stat, data)
+            return loaded_config
+        except Exception as e:
+            if strict:
+                raise
+            logger.warning(f"配置文件加载失败，使用默认配置: {e}")
+            return default_config
+    
+    def _save_config(self, config: Dict[str, Any]):
+        try:
+            import yaml
+            with open(self.config_path, 'w', encoding='utf-8') as f:
+                yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+        except Exception as e:
+            logger.error(f"配置文件保存失败: {e}")
+            return
+        self._signature = self._file_signature()
+        self.generation += 1
+
+    def _load_snapshot(self) -> Optional[Dict[str, Any]]:
+        """读取配置快照，YAML 未修改时返回其中的配置，否则返回 None"""
+        if not self.use_snapshot:
+            return None
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            stat = self.config_path.stat()
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("version") != CONFIG_SNAPSHOT_VERSION:
+            return None
+        if snapshot.get("mtime_ns") != stat.st_mtime_ns or snapshot.get("size") != stat.st_size:
+            # 修改时间变了但内容可能没变（如 touch、git checkout），再比较内容哈希
+            try:
+                data = self.config_path.read_bytes()
+            except OSError:
+                return None
+            if snapshot.get("hash") != hashlib.blake2b(data, digest_size=20).hexdigest():
+                return None
+            self._save_snapshot(snapshot["config"], stat, data)
+        return snapshot.get("config")
+
+    def _save_snapshot(self, config: Dict[str, Any], stat: os.stat_result, data: bytes):
+        if not self.use_snapshot:
+            return
+        # 只保存能原样往返 JSON 的配置，YAML 中的日期等类型无法用 JSON 表示
+        try:
+            encoded = json.dumps(config, ensure_ascii=False)
+            if json.loads(encoded) != config:
+                return
+        except (TypeError, ValueError):
+            return
+        snapshot = {
+            "version": CONFIG_SNAPSHOT_VERSION,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": hashlib.blake2b(data, digest_size=20).hexdigest(),
+            "config": config,
+        }
+        try:
+            with atomic_open(str(self.snapshot_path)) as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+        except OSError as e:
+            # 配置目录只读时不使用快照
+            logger.debug(f"配置快照保存失败: {e}")
+    
+    def get_character_mapping(self) -> Dict[str, List[int]]:
+        return self.config.get("character_mapping", {})
+
+    def get_character_aliases(self) -> Dict[str, List[str]]:
+        return self.config.get("character_aliases") or {}
+    
+    def get_parsing_config(self) -> Dict[str, Any]:
+        return self.config.get("parsing", {})
+    
+    def get_patterns(self) -> Dict[str, str]:
+        return self.config.get("patterns", {})
+    
+    def get_quotes_config(self) -> Dict[str, Any]:
+        return self.config.get("quotes", {})
+    
+    def get_cache_config(self) -> Dict[str, Any]:
+        return self.config.get("cache", {})
+
+    def get_directives_config(self) -> Dict[str, Any]:
+        return self.config.get("directives", {})
+
+    def get_reverse_config(self) -> Dict[str, Any]:
+        return self.config.get("reverse", {})
+
+
+class DialogueParser(ABC):
+    @abstractmethod
+    def parse(self, line: str) -> Optional[Tuple[str, str]]: pass
+
+
+class SpeakerParser(DialogueParser):
+    def __init__(self, pattern: str, max_name_length: int):
+        self.pattern = re.compile(pattern, re.UNICODE)
+        self.max_name_length = max_name_length
+    def parse(self, line: str) -> Optional[Tuple[str, str]]:
+        match = self.pattern.match(line.strip())
+        if match:
+            try:
+                speaker_name = match.group(1).strip()
+                if len(speaker_name) < self.max_name_length:
+                    return speaker_name, match.group(2).strip()
+            except IndexError:
+                logger.error(f"正则表达式 '{self.pattern.pattern}' 中缺少捕获组。")
+                return None
+        return None
+
+    def with_max_name_length(self, max_name_length: int) -> "SpeakerParser":
+        """同样格式、不同名字长度上限的解析器"""
+        return SpeakerParser(self.pattern.pattern, max_name_length)
+
+
+class FastSpeakerParser(SpeakerParser):
+    """默认说话人格式的快速解析器，结果与默认正则完全一致。
+
+    默认正则匹配的条件是：行首至第一个冒号（: 或 ：）之间是非空的字母数字/下划线/空白字符。
+    因此先查找冒号，没有冒号的旁白行直接返回；已知角色名直接查表，其余情况只校验冒号前的短前缀。
+    要求传入的行已经去除首尾空白（TextConverter 会先 strip）。
+    """
+    _NAME_CHARS = re.compile(r'[\w\s]+')
+
+    def __init__(self, max_name_length: int, known_names: Iterable[str] = ()):
+        super().__init__(DEFAULT_SPEAKER_PATTERN, max_name_length)
+        self.update_known_names(known_names)
+
+    def update_known_names(self, names: Iterable[str]):
+        # 只收录本身就能被默认正则完整匹配、且长度合规的名字，保证查表结果与正则一致
+        self.known_names = frozenset(
+            name for name in names
+            if name == name.strip() and len(name) < self.max_name_length and self._NAME_CHARS.fullmatch(name)
+        )
+
+    def parse(self, line: str) -> Optional[Tuple[str, str]]:
+        # 先用 in 预检分隔符：不含冒号的旁白行无需任何解析
+        if '：' in line:
+            colon = line.find('：')
+            if ':' in line:
+                ascii_colon = line.find(':')
+                if ascii_colon < colon:
+                    colon = ascii_colon
+        elif ':' in line:
+            colon = line.find(':')
+        else:
+            return None
+        if colon == 0:
+            return None
+        if '\n' in line:
+            # 含换行时正则的 $ 语义特殊，交给正则处理
+            return super().parse(line)
+        prefix = line[:colon]
+        if prefix in self.known_names:
+            return prefix, line[colon + 1:].strip()
+        if prefix.isalnum():
+            # 纯字母数字的名字无需再去空白
+            if colon >= self.max_name_length:
+                return None
+            return prefix, line[colon + 1:].strip()
+        speaker_name = prefix.strip()
+        if len(speaker_name) >= self.max_name_length or not self._NAME_CHARS.fullmatch(prefix):
+            return None
+        return speaker_name, line[colon + 1:].strip()
+
+    def with_max_name_length(self, max_name_length: int) -> "FastSpeakerParser":
+        return FastSpeakerParser(max_name_length, self.known_names)
+
+
+class MultiSpeakerParser(SpeakerParser):
+    """同时识别多种说话人格式。各格式的正则分别包在一个命名分组中，用 | 合并为一个正则，每行只匹配一次。
+
+    formats 为 格式名 → 正则，按声明顺序尝试，先匹配的格式决定结果（名字过长时整行不是说话人行，不再尝试后面的格式）。
+    每个正则的第 1、2 个捕获组分别是名字和台词；合并后不能使用按编号的反向引用。
+    """
+
+    def __init__(self, formats: Dict[str, str], max_name_length: int):
+        self.formats = dict(formats)
+        alternatives = []
+        for index, (format_name, pattern) in enumerate(self.formats.items()):
+            if re.compile(pattern, re.UNICODE).groups < 2:
+                raise ValueError(f"说话人格式 '{format_name}' 的正则 '{pattern}' 需要名字和台词两个捕获组")
+            alternatives.append(f"(?P<_format{index}>{pattern})")
+        super().__init__("|".join(alternatives), max_name_length)
+        # 命中的格式分组 → (名字分组, 台词分组)：格式内的捕获组编号紧跟在包裹它的分组之后
+        group_numbers = self.pattern.groupindex
+        self._groups = {f"_format{index}": (group_numbers[f"_format{index}"] + 1, group_numbers[f"_format{index}"] + 2)
+                        for index in range(len(self.formats))}
+
+    def parse(self, line: str) -> Optional[Tuple[str, str]]:
+        match = self.pattern.match(line.strip())
+        if match:
+            # 包裹格式的分组最后闭合，lastgroup 就是命中的格式
+            name_group, body_group = self._groups[match.lastgroup]
+            speaker_name = match.group(name_group).strip()
+            if len(speaker_name) < self.max_name_length:
+                return speaker_name, match.group(body_group).strip()
+        return None
+
+    def with_max_name_length(self, max_name_length: int) -> "MultiSpeakerParser":
+        return MultiSpeakerParser(self.formats, max_name_length)
+    
+    
+@dataclass(frozen=True)
+class QuoteRules:
+    """编译好的引号规则：不可变、可 pickle，每次运行构建一次后传给各个转换线程和进程。
+
+    默认只去除包裹整段正文的一层引号（不检查配对，与以往的行为一致）。
+    nested 为 True 时反复去除嵌套或重复的引号（如 「『……』」），并且只在首尾引号互相配对时才去除，
+    「甲」「乙」这样的正文保持不变；strip_lines 为 True 时多行正文中被引号包裹的每一行也分别去除引号。
+    """
+    pairs: Tuple[Tuple[str, str], ...] = ()
+    nested: bool = False
+    strip_lines: bool = False
+    # 以下为编译结果：起始引号 → 结束引号的查找表，以及是否只需去除一层引号（默认规则的快速路径）
+    table: Dict[str, str] = field(init=False, repr=False, compare=False)
+    single_layer: bool = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "pairs", tuple((str(o), str(c)) for o, c in self.pairs))
+        self._compile()
+
+    def _compile(self):
+        object.__setattr__(self, "table", dict(self.pairs))
+        object.__setattr__(self, "single_layer", not (self.nested or self.strip_lines))
+
+    def __getstate__(self):
+        return {"pairs": self.pairs, "nested": self.nested, "strip_lines": self.strip_lines}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        self._compile()
+
+    @classmethod
+    def coerce(cls, quote_pairs: Union["QuoteRules", Dict[str, str], None]) -> "QuoteRules":
+        """接受已编译的规则或 {起始引号: 结束引号} 字典"""
+        if isinstance(quote_pairs, QuoteRules):
+            return quote_pairs
+        return cls(tuple(quote_pairs.items()) if quote_pairs else ())
+
+    def as_dict(self) -> Dict[str, str]:
+        return dict(self.pairs)
+
+    def _encloses(self, text: str, opening: str, closing: str) -> bool:
+        """text 的首尾引号是否互相配对（中间的同种引号成对出现，且没有提前闭合）"""
+        inner = text[1:-1]
+        if opening == closing:
+            return opening not in inner
+        depth = 0
+        for char in inner:
+            if char == opening:
+                depth += 1
+            elif char == closing:
+                depth -= 1
+                if depth < 0:
+                    return False
+        return depth == 0
+
+    def _strip_text(self, text: str) -> str:
+        table = self.table
+        if not self.nested:
+            if len(text) < 2: return text
+            closing = table.get(text[0])
+            if closing and text[-1] == closing:
+                return text[1:-1].strip()
+            return text
+        while len(text) >= 2:
+            closing = table.get(text[0])
+            if not closing or text[-1] != closing or not self._encloses(text, text[0], closing):
+                break
+            text = text[1:-1].strip()
+        return text
+
+    def apply(self, body: str) -> str:
+        """去除正文的引号。body 须已去除首尾空白（转换器组装的正文总是如此），不会再次整体去空白"""
+        if not self.table:
+            return body
+        if self.strip_lines and "\n" in body:
+            body = "\n".join(self._strip_text(line) for line in body.split("\n"))
+        return self._strip_text(body)
+
+
+# 转换接口接受编译好的 QuoteRules，也接受 {起始引号: 结束引号} 字典
+QuotePairs = Union[QuoteRules, Dict[str, str]]
+
+
+class QuoteHandler:
+    def remove_quotes(self, text: str, active_quote_pairs: QuotePairs) -> str:
+        """去除任意文本首尾的引号；没有可去除的引号时原样返回 text"""
+        stripped = text.strip()
+        result = self.strip_body(stripped, QuoteRules.coerce(active_quote_pairs))
+        return text if result == stripped else result
+
+    def strip_body(self, body: str, rules: QuoteRules) -> str:
+        """去除已去掉首尾空白的正文的引号。每个动作都会调用，默认规则在这里直接查表，省去一层调用"""
+        if rules.single_layer:
+            if len(body) >= 2 and rules.table.get(body[0]) == body[-1]:
+                return body[1:-1].strip()
+            return body
+        return rules.apply(body)
+
+
+def parse_quote_pairs(pairs: Iterable[str]) -> Dict[str, str]:
+    """把 "「」" 这样由起始和结束字符组成的字符串解析为引号对"""
+    selected_pairs = {}
+    for pair in pairs:
+        if len(pair) != 2:
+            raise ValueError(f"引号对 '{pair}' 必须恰好由起始和结束两个字符组成")
+        selected_pairs[pair[0]] = pair[1]
+    return selected_pairs
+
+
+def build_quote_pairs(config_manager: ConfigManager, pairs: Optional[List[str]] = None,
+                      no_quotes: bool = False) -> Dict[str, str]:
+    """根据用户指定的引号生成引号对；未指定时与 GUI 默认一致，启用全部预设引号"""
+    if no_quotes:
+        return {}
+    if pairs:
+        return parse_quote_pairs(pairs)
+    selected_pairs = {}
+    quote_categories = config_manager.get_quotes_config().get("quote_categories", {})
+    for quote_chars in quote_categories.values():
+        if quote_chars and len(quote_chars) == 2:
+            selected_pairs[quote_chars[0]] = quote_chars[1]
+    return selected_pairs
+
+
+def build_quote_rules(config_manager: ConfigManager, pairs: Optional[List[str]] = None, no_quotes: bool = False,
+                      nested: Optional[bool] = None, strip_lines: Optional[bool] = None) -> QuoteRules:
+    """生成本次运行使用的引号规则；nested 和 strip_lines 未指定时读取配置中的 nested_quotes 和 strip_quotes_per_line"""
+    quotes_config = config_manager.get_quotes_config()
+    if nested is None: nested = bool(quotes_config.get("nested_quotes", False))
+    if strip_lines is None: strip_lines = bool(quotes_config.get("strip_quotes_per_line", False))
+    selected_pairs = build_quote_pairs(config_manager, pairs, no_quotes)
+    return QuoteRules(tuple(selected_pairs.items()), nested, strip_lines)
+
+
+class TextConverter:
+    def __init__(self, config_manager: ConfigManager, hot_reload: bool = True):
+        """hot_reload 为 False 时不检查配置文件的修改，整个生命周期使用创建时的配置（批处理的工作进程）"""
+        self.config_manager = config_manager
+        self.hot_reload = hot_reload
+        self._config_generation = config_manager.generation
+        self._next_config_check = time.monotonic() + CONFIG_CHECK_INTERVAL
+        self._set_speaker_index(SpeakerIndex(config_manager.get_character_mapping(),
+                                             config_manager.get_character_aliases()))
+        self.parsing_config = config_manager.get_parsing_config()
+        self.patterns = config_manager.get_patterns()
+        self._init_parsers()
+        # 行内指令默认关闭；开启后查找表在第一次用到时才加载
+        directives_config = config_manager.get_directives_config()
+        self.directives = (DirectiveIndex(directives_config, config_manager.config_path.parent)
+                           if directives_config.get("enabled") else None)
+        self._reported_directives: set = set()
+    
+    @property
+    def character_mapping(self) -> Dict[str, List[int]]:
+        return self.speaker_index.character_mapping
+
+    @character_mapping.setter
+    def character_mapping(self, mapping: Dict[str, List[int]]):
+        self._set_speaker_index(SpeakerIndex(mapping, self.speaker_index.character_aliases))
+
+    def _set_speaker_index(self, speaker_index: SpeakerIndex):
+        # 新索引完整构建后再替换引用，正在转换的其他线程不会看到构建了一半的索引
+        self.speaker_index = speaker_index
+        self._lookup_characters = speaker_index.lookup
+        for parser in getattr(self, "speaker_formats", {}).values():
+            if isinstance(parser, FastSpeakerParser):
+                parser.update_known_names(speaker_index.names)
+
+    @property
+    def config_generation(self) -> int:
+        """当前使用的配置的 generation，配置重新加载后改变。转换缓存据此判断转换期间配置是否变化"""
+        return self._config_generation
+
+    def reload_config_if_changed(self) -> bool:
+        """配置文件被修改或通过 ConfigManager 保存后，重建说话人索引。返回是否重建
+
+        检查文件状态的间隔为 CONFIG_CHECK_INTERVAL，长期运行的监视文件夹、HTTP 服务和 GUI 无需重启即可生效。
+        """
+        if not self.hot_reload:
+            return False
+        now = time.monotonic()
+        if now >= self._next_config_check:
+            self._next_config_check = now + CONFIG_CHECK_INTERVAL
+            self.config_manager.reload_if_changed()
+        generation = self.config_manager.generation
+        if generation == self._config_generation:
+            return False
+        self._config_generation = generation
+        self._set_speaker_index(SpeakerIndex(self.config_manager.get_character_mapping(),
+                                             self.config_manager.get_character_aliases()))
+        return True
+
+    def _init_parsers(self):
+        max_name_length = self.parsing_config.get("max_speaker_name_length", 50)
+        parser_mode = self.parsing_config.get("speaker_parser", "auto")
+        # speaker_pattern 是名为 default 的第一种格式，speaker_formats 按声明顺序追加其他格式
+        formats = {"default": self.patterns.get("speaker_pattern", DEFAULT_SPEAKER_PATTERN)}
+        for format_name, pattern in (self.patterns.get("speaker_formats") or {}).items():
+            formats.setdefault(str(format_name), pattern)
+        self.speaker_formats: Dict[str, SpeakerParser] = {}
+        for format_name, pattern in formats.items():
+            if parser_mode == "auto" and pattern == DEFAULT_SPEAKER_PATTERN:
+                self.speaker_formats[format_name] = FastSpeakerParser(max_name_length, self.speaker_index.names)
+            else:
+                # 自定义正则或显式指定 regex 时使用通用的正则解析器
+                self.speaker_formats[format_name] = SpeakerParser(pattern, max_name_length)
+
+        # 只有一种格式时直接使用它；多种格式时默认（auto）按文件开头检测，all 表示每行同时尝试全部格式
+        format_mode = self.parsing_config.get("speaker_format", "auto")
+        self.format_sample_lines = 0
+        if len(formats) == 1:
+            self.parser = self.speaker_formats["default"]
+        elif format_mode in self.speaker_formats:
+            self.parser = self.speaker_formats[format_mode]
+        else:
+            if format_mode not in ("auto", "all"):
+                logger.warning(f"未知的说话人格式 '{format_mode}'，改为自动检测")
+                format_mode = "auto"
+            self.parser = MultiSpeakerParser(formats, max_name_length)
+            if format_mode == "auto":
+                self.format_sample_lines = max(1, int(self.parsing_config.get("format_sample_lines", 50)))
+        # 批量引擎只支持默认说话人格式，其他格式仍逐行转换
+        self.use_bulk_engine = (self.parsing_config.get("engine", "line") == "bulk"
+                                and any(isinstance(parser, FastSpeakerParser)
+                                        for parser in self.speaker_formats.values()))
+        self.quote_handler = QuoteHandler()
+
+    def detect_speaker_format(self, source: Union[str, Iterable[str]]) -> Optional[str]:
+        """按剧本开头的 format_sample_lines 行检测说话人格式，返回格式名。source 为整个文本或行迭代器（只读取开头部分）。
+
+        统计每种格式能解析的行数，取最多的一种，数量相同时取先声明的；未启用自动检测时返回 None，即使用 self.parser。
+        """
+        sample_lines = self.format_sample_lines
+        if not sample_lines:
+            return None
+        if isinstance(source, str):
+            # 只切分开头的若干行，不复制整个文本
+            end = -1
+            for _ in range(sample_lines):
+                end = source.find('\n', end + 1)
+                if end < 0:
+                    break
+            source = source[:end].split('\n') if end >= 0 else source.split('\n')
+        counts = dict.fromkeys(self.speaker_formats, 0)
+        for line in islice(source, sample_lines):
+            stripped_line = line.strip()
+            if stripped_line:
+                for format_name, parser in self.speaker_formats.items():
+                    if parser.parse(stripped_line):
+                        counts[format_name] += 1
+        return max(counts, key=counts.get)
+
+    def parser_for(self, speaker_format: Optional[str]) -> SpeakerParser:
+        """detect_speaker_format 返回的格式对应的解析器"""
+        return self.parser if speaker_format is None else self.speaker_formats[speaker_format]
+
+    def bulk_supported(self, speaker_format: Optional[str]) -> bool:
+        """批量引擎能否处理该格式：只支持默认说话人格式（FastSpeakerParser），且未启用行内指令"""
+        return isinstance(self.parser_for(speaker_format), FastSpeakerParser) and self.directives is None
+
+    def _report_directive(self, linter: Optional["Linter"], code: str, message: str):
+        if linter is not None:
+            linter.report_directive(code, message)
+        elif message not in self._reported_directives:
+            if len(self._reported_directives) >= _REPORTED_DIRECTIVES_SIZE:
+                self._reported_directives = set()
+            self._reported_directives.add(message)
+            logger.warning(message)
+
+    def _collect_directives(self, found: List[Directive], assets: List[Directive], header: Optional[ConversionResult],
+                            emitted: bool, linter: Optional["Linter"]):
+        """处理一行中的指令：动作和语音加入 assets，第一个动作产出之前的背景和 BGM 写入 header，无法识别的报告"""
+        for directive in found:
+            kind, name, asset = directive
+            if asset is None:
+                if kind in DIRECTIVE_TABLES:
+                    self._report_directive(linter, "unknown-directive", f"指令 [{kind}:{name}] 的名字不在查找表中，已忽略")
+                else:
+                    self._report_directive(linter, "unknown-directive", f"未知的指令类型 [{kind}:{name}]，保留在正文中")
+            elif kind == "motion" or kind == "voice":
+                assets.append(directive)
+            elif emitted:
+                self._report_directive(linter, "misplaced-directive",
+                                       f"指令 [{kind}:{name}] 在第一个动作之后，背景和 BGM 只能在文档开头设置，已忽略")
+            elif header is not None:
+                # 同一种指令以第一次出现的为准
+                if kind == "bg":
+                    if header.background is None: header.background = asset
+                elif header.bgm is None:
+                    header.bgm = asset
+
+    def _build_action(self, name: str, body_lines: List[str], quote_rules: QuoteRules,
+                      linter: Optional["Linter"] = None, assets: Optional[List[Directive]] = None) -> Optional[ActionItem]:
+        if assets:
+            # 指令得到的动作和语音随本动作一起结束，没有台词可以附加时报告后丢弃
+            action = self._build_action(name, body_lines, quote_rules, linter)
+            if action is None:
+                names = "".join(f"[{kind}:{directive_name}]" for kind, directive_name, _ in assets)
+                self._report_directive(linter, "unused-directive", f"指令 {names} 没有可以附加的台词，已忽略")
+            else:
+                action.motions = tuple(asset for kind, _, asset in assets if kind == "motion")
+                action.voices = tuple(asset for kind, _, asset in assets if kind == "voice")
+            assets.clear()
+            return action
+        if not body_lines:
+            return None
+        body = "\n".join(body_lines).strip()
+        finalized_body = self.quote_handler.strip_body(body, quote_rules)
+        if not finalized_body:
+            return None
+        action = ActionItem(
+            characters=self._lookup_characters(name),
+            name=name,
+            body=finalized_body
+        )
+        if linter is not None: linter.check_action(action)
+        return action
+
+    def iter_actions(self, lines: Iterable[str], narrator_name: str = None, selected_quote_pairs: Optional[QuotePairs] = None,
+                     linter: Optional["Linter"] = None, speaker_format: Optional[str] = None,
+                     header: Optional[ConversionResult] = None) -> Iterator[ActionItem]:
+        """逐行读取输入（任意行迭代器或文本文件对象），每完成一个对话块即产出对应的 ActionItem。
+
+        指定 linter（见 lint.py）时在同一次扫描中检查剧本，不影响转换结果。
+        speaker_format 为 detect_speaker_format 对整个剧本检测出的格式，None 时使用 self.parser。
+        启用行内指令时，[motion:…]、[voice:…] 填入所在动作，第一个动作产出之前的 [bg:…]、[bgm:…] 写入 header。
+        """
+        self.reload_config_if_changed()
+        if narrator_name is None: narrator_name = self.parsing_config.get("default_narrator_name", " ")
+        quote_rules = QuoteRules.coerce(selected_quote_pairs)
+        parse = self.parser_for(speaker_format).parse
+        if linter is not None: lines = linter.track(lines, narrator_name, self.parser_for(speaker_format))
+
+        directives = self.directives
+        current_action_name = narrator_name
+        current_action_body_lines = []
+        # 当前动作的指令，以及还没有遇到台词行的指令（遇到台词行或段落结束时并入当前动作）
+        assets: List[Directive] = []
+        pending_assets: List[Directive] = []
+        emitted = False
+
+        for line in lines:
+            stripped_line = line.strip()
+            if not stripped_line:
+                if pending_assets:
+                    assets += pending_assets
+                    pending_assets.clear()
+                action = self._build_action(current_action_name, current_action_body_lines, quote_rules, linter, assets)
+                if action:
+                    emitted = True
+                    yield action
+                current_action_name = narrator_name
+                current_action_body_lines = []
+                continue
+
+            if directives is not None and '[' in stripped_line:
+                stripped_line, found = directives.extract(stripped_line)
+                if found:
+                    self._collect_directives(found, pending_assets, header, emitted, linter)
+                # 只有指令的行既不是台词也不结束当前动作
+                if not stripped_line:
+                    continue
+
+            parse_result = parse(stripped_line)
+            if parse_result:
+                speaker, content = parse_result
+                if speaker != current_action_name and current_action_body_lines:
+                    action = self._build_action(current_action_name, current_action_body_lines, quote_rules, linter,
+                                                assets)
+                    if action:
+                        emitted = True
+                        yield action
+                    current_action_body_lines = []
+                current_action_name = speaker
+                current_action_body_lines.append(content)
+            else:
+                current_action_body_lines.append(stripped_line)
+                if linter is not None: linter.check_line(stripped_line)
+            if linter is not None and len(current_action_body_lines) == 1: linter.start_action()
+            if pending_assets:
+                assets += pending_assets
+                pending_assets.clear()
+
+        if pending_assets:
+            assets += pending_assets
+        action = self._build_action(current_action_name, current_action_body_lines, quote_rules, linter, assets)
+        if action: yield action
+
+    def iter_actions_bulk(self, text_blocks: Iterable[str], narrator_name: str = None,
+                          selected_quote_pairs: Optional[QuotePairs] = None, speaker_format: Optional[str] = None,
+                          header: Optional[ConversionResult] = None) -> Iterator[ActionItem]:
+        """批量引擎：按段处理文本（每段由完整的行组成，如整个输入或 ScriptReader.iter_text_blocks() 的输出），
+        结果与 iter_actions 完全一致。
+
+        每段整体切分一次，并先判断段中出现了哪种冒号（: 或 ：），没有出现的冒号不再逐行查找；说话人判断内联在循环中，
+        冒号前缀的解析结果在本次转换内缓存，动作直接组装，省去逐行的解析器调用和逐动作的方法调用。
+        不是默认说话人格式（FastSpeakerParser）或启用了行内指令时退回 iter_actions。
+        """
+        if not self.bulk_supported(speaker_format):
+            lines = chain.from_iterable(block.split('\n') for block in text_blocks)
+            yield from self.iter_actions(lines, narrator_name, selected_quote_pairs, speaker_format=speaker_format,
+                                         header=header)
+            return
+        self.reload_config_if_changed()
+        parser = self.parser_for(speaker_format)
+        if narrator_name is None: narrator_name = self.parsing_config.get("default_narrator_name", " ")
+        quote_rules = QuoteRules.coerce(selected_quote_pairs)
+        single_layer = quote_rules.single_layer
+        quote_table_get = quote_rules.table.get
+        apply_quotes = quote_rules.apply
+        lookup_characters = self._lookup_characters
+        known_names = parser.known_names
+        max_name_length = parser.max_name_length
+        valid_name = parser._NAME_CHARS.fullmatch
+        # 冒号前缀 → 说话人名，不是合法说话人时为空字符串
+        speakers: Dict[str, str] = {}
+
+        def build(name: str, body_lines: List[str]) -> Optional[ActionItem]:
+            # 与 _build_action 相同；每一行都已去除首尾空白，只有一行时无需拼接
+            body = body_lines[0] if len(body_lines) == 1 else "\n".join(body_lines).strip()
+            if single_layer:
+                if len(body) >= 2 and quote_table_get(body[0]) == body[-1]:
+                    body = body[1:-1].strip()
+            else:
+                body = apply_quotes(body)
+            if body:
+                return ActionItem("talk", 0, True, lookup_characters(name), name, body)
+            return None
+
+        current_action_name = narrator_name
+        current_action_body_lines = []
+        for block in text_blocks:
+            has_wide_colon = '：' in block
+            has_ascii_colon = ':' in block
+            for line in block.split('\n'):
+                stripped_line = line.strip()
+                if not stripped_line:
+                    if current_action_body_lines:
+                        action = build(current_action_name, current_action_body_lines)
+                        if action: yield action
+                        current_action_body_lines = []
+                    current_action_name = narrator_name
+                    continue
+                # 与 FastSpeakerParser.parse 相同，取最靠前的冒号，行首的冒号不构成说话人
+                if has_wide_colon and '：' in stripped_line:
+                    colon = stripped_line.find('：')
+                    if has_ascii_colon and ':' in stripped_line:
+                        ascii_colon = stripped_line.find(':')
+                        if ascii_colon < colon:
+                            colon = ascii_colon
+                elif has_ascii_colon and ':' in stripped_line:
+                    colon = stripped_line.find(':')
+                else:
+                    current_action_body_lines.append(stripped_line)
+                    continue
+                if colon == 0:
+                    current_action_body_lines.append(stripped_line)
+                    continue
+                prefix = stripped_line[:colon]
+                speaker = speakers.get(prefix)
+                if speaker is None:
+                    if prefix in known_names:
+                        speaker = prefix
+                    else:
+                        speaker = prefix.strip()
+                        if len(speaker) >= max_name_length or not valid_name(prefix):
+                            speaker = ""
+                    if len(speakers) >= _PREFIX_CACHE_SIZE:
+                        speakers = {}
+                    speakers[prefix] = speaker
+                if not speaker:
+                    current_action_body_lines.append(stripped_line)
+                    continue
+                if speaker != current_action_name and current_action_body_lines:
+                    action = build(current_action_name, current_action_body_lines)
+                    if action: yield action
+                    current_action_body_lines = []
+                current_action_name = speaker
+                current_action_body_lines.append(stripped_line[colon + 1:].strip())
+
+        if current_action_body_lines:
+            action = build(current_action_name, current_action_body_lines)
+            if action: yield action
+
+    def convert_text_to_json_format(self, input_text: str, narrator_name: str = None, selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True,
+                                    linter: Optional["Linter"] = None) -> str:
+        speaker_format = self.detect_speaker_format(input_text)
+        result = ConversionResult()
+        if self.use_bulk_engine and linter is None:
+            result.actions = list(self.iter_actions_bulk((input_text,), narrator_name, selected_quote_pairs,
+                                                         speaker_format, result))
+        else:
+            result.actions = list(self.iter_actions(input_text.split('\n'), narrator_name, selected_quote_pairs, linter,
+                                                    speaker_format, result))
+        return dumps_result(result, pretty)
+
+
+def convert_stream(converter: TextConverter, input_fp: TextIO, output_fp: TextIO, narrator_name: str = None,
+                   selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True) -> int:
+    """从文本流逐行读取并直接写出 JSON，返回动作数"""
+    # 流无法重读，检测格式读取的开头几行再接回去
+    lines = iter(input_fp)
+    head = list(islice(lines, converter.format_sample_lines))
+    header = ConversionResult()
+    actions = converter.iter_actions(chain(head, lines), narrator_name, selected_quote_pairs,
+                                     speaker_format=converter.detect_speaker_format(head), header=header)
+    return write_json_stream(actions, output_fp, pretty=pretty, header=header)
+
+
+def open_output(output_path: str, atomic: bool = False, sink: Optional[OutputSink] = None) -> ContextManager[TextIO]:
+    """打开输出文档：指定了 sink 时由其写出，否则直接写文件（atomic 为 True 时通过临时文件原子替换）"""
+    if sink is not None:
+        return sink.open(output_path)
+    return atomic_open(output_path) if atomic else open(output_path, 'w', encoding='utf-8')
+
+
+def convert_file(converter: TextConverter, input_path: ScriptSource, output_path: str, narrator_name: str = None,
+                 selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True, atomic: bool = False,
+                 sink: Optional[OutputSink] = None):
+    """读取单个文本文件或内存中的剧本（自动检测编码），转换后写入 JSON 文件。
+
+    atomic 为 True 时通过临时文件原子替换输出；指定 sink 时输出交给 sink 写出（见 sinks.py）。
+    """
+    def convert(reader: ScriptReader):
+        speaker_format = converter.detect_speaker_format(reader.iter_lines())
+        header = ConversionResult()
+        with open_output(output_path, atomic, sink) as output_fp:
+            if converter.use_bulk_engine:
+                actions = converter.iter_actions_bulk(reader.iter_text_blocks(), narrator_name, selected_quote_pairs,
+                                                      speaker_format, header)
+            else:
+                actions = converter.iter_actions(reader.iter_lines(), narrator_name, selected_quote_pairs,
+                                                 speaker_format=speaker_format, header=header)
+            write_json_stream(actions, output_fp, pretty=pretty, header=header)
+
+    with ScriptReader(input_path) as reader:
+        with_encoding_fallback(reader, convert)
@@ -0,0 +1,108 @@
+# 行内指令：剧本中的 [motion:名字]、[voice:名字]、[bg:名字]、[bgm:名字] 在转换的同一次扫描中识别，
+# 名字经配置中的查找表映射为资源 ID，分别填入动作的 motions、voices 和文档的 background、bgm。
+#
+# 查找表可以直接写在 config.yaml 中，也可以指向单独的 JSON/YAML 文件（可能有数千个动作和语音资源），
+# 每张表在第一次用到时才读取并构建索引，之后的查找都是一次字典查询。
+
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 指令类型 → 配置中的查找表
+DIRECTIVE_TABLES = {"motion": "motions", "voice": "voices", "bg": "backgrounds", "bgm": "bgms"}
+# 形如 [类型:名字] 的指令；类型不认识的指令保留在正文中
+_DIRECTIVE = re.compile(r'\[([A-Za-z_]+):([^\[\]\n]*)\]')
+
+# (类型, 名字, 资源 ID)，资源 ID 为 None 表示无法识别
+Directive = Tuple[str, str, Optional[str]]
+
+
+class DirectiveIndex:
+    """指令名 → 资源 ID 的查找表，各表在第一次查找时才构建。
+
+    表是 名字 → 资源 ID 的映射，或相对配置文件所在目录的 JSON/YAML 文件路径。先按原样查找，再忽略大小写查找；
+    表中找不到的名字无法识别，只有列在配置的 passthrough 中的类型才把找不到的名字本身作为资源 ID。
+    构建后的索引不再修改，多个线程可以同时查找。
+    """
+
+    def __init__(self, config: Dict[str, Any], base_dir: Path):
+        self.config = config
+        self.base_dir = base_dir
+        passthrough = config.get("passthrough") or ()
+        if isinstance(passthrough, str):
+            passthrough = (passthrough,)
+        self.passthrough = frozenset(str(kind).lower() for kind in passthrough)
+        for kind in self.passthrough - DIRECTIVE_TABLES.keys():
+            logger.warning(f"directives.passthrough 中的指令类型 '{kind}' 不存在")
+        # 类型 → (原样的名字索引, 忽略大小写的名字索引, 是否把名字直接作为资源 ID)
+        self._indexes: Dict[str, Tuple[Dict[str, str], Dict[str, str], bool]] = {}
+
+    def _load_table(self, kind: str) -> Optional[Dict[Any, Any]]:
+        """读取查找表，文件无法读取时返回 None"""
+        source = self.config.get(DIRECTIVE_TABLES[kind])
+        if not isinstance(source, str):
+            return source or {}
+        path = self.base_dir / source
+        try:
+            data = path.read_bytes()
+            if path.suffix.lower() == ".json":
+                table = json.loads(data)
+            else:
+                import yaml
+                table = yaml.load(data.decode('utf-8'), Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        except Exception as e:
+            logger.warning(f"指令查找表 {path} 加载失败，{kind} 指令将无法识别: {e}")
+            return None
+        if not isinstance(table, dict):
+            logger.warning(f"指令查找表 {path} 不是 名字 → 资源 ID 的映射，{kind} 指令将无法识别")
+            return None
+        return table
+
+    def _index(self, kind: str) -> Tuple[Dict[str, str], Dict[str, str], bool]:
+        index = self._indexes.get(kind)
+        if index is None:
+            table = self._load_table(kind)
+            exact = {str(name): str(asset) for name, asset in (table or {}).items()}
+            folded: Dict[str, str] = {}
+            for name, asset in exact.items():
+                folded.setdefault(name.casefold(), asset)
+            index = self._indexes[kind] = (exact, folded, kind in self.passthrough)
+        return index
+
+    def lookup(self, kind: str, name: str) -> Optional[str]:
+        """返回指令名对应的资源 ID，找不到时返回 None"""
+        exact, folded, passthrough = self._index(kind)
+        asset = exact.get(name)
+        if asset is None:
+            asset = folded.get(name.casefold())
+        if asset is None and passthrough:
+            return name or None
+        return asset
+
+    def extract(self, line: str) -> Tuple[str, List[Directive]]:
+        """从一行中取出指令，返回 (去掉指令并去除首尾空白后的文本, 指令列表)。类型不认识的指令保留在文本中"""
+        directives: List[Directive] = []
+
+        def replace(match: "re.Match[str]") -> str:
+            kind = match.group(1).lower()
+            name = match.group(2).strip()
+            if kind not in DIRECTIVE_TABLES:
+                directives.append((kind, name, None))
+                return match.group(0)
+            directives.append((kind, name, self.lookup(kind, name)))
+            return ""
+
+        text = _DIRECTIVE.sub(replace, line)
+        return (text.strip() if directives else line), directives
+
+    def fingerprint(self) -> str:
+        """全部查找表内容的哈希，用于转换缓存的配置指纹（会加载全部查找表）"""
+        tables = {kind: (exact, passthrough) for kind in DIRECTIVE_TABLES
+                  for exact, _, passthrough in (self._index(kind),)}
+        encoded = json.dumps(tables, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=20).hexdigest()
@@ -0,0 +1,174 @@
+# JSON 编码：直接按字段拼接 ActionItem，不经过 dataclasses.asdict 构造中间字典树。
+
+import io
+import json
+from itertools import chain
+from json.encoder import encode_basestring
+from typing import Any, Iterable, Optional, TextIO, Tuple
+
+# 安全地导入 orjson，如果已安装则用作加速器
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    orjson = None
+    ORJSON_ENABLED = False
+
+# 动作在文档中位于 "actions" 数组内，缩进固定
+_FIELD_INDENT = "\n      "
+_ITEM_INDENT = "\n        "
+_PRETTY_SEPARATOR = ",\n    "
+
+
+def _encode_scalar(value: Any) -> str:
+    # 与 json.dumps(ensure_ascii=False) 的标量编码保持一致
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return "null"
+    if type(value) is int:
+        return int.__repr__(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _encode_list_pretty(values) -> str:
+    if not values:
+        return "[]"
+    return "[" + _ITEM_INDENT + ("," + _ITEM_INDENT).join(map(_encode_scalar, values)) + _FIELD_INDENT + "]"
+
+
+def _encode_list_compact(values) -> str:
+    if not values:
+        return "[]"
+    return "[" + ",".join(map(_encode_scalar, values)) + "]"
+
+
+def encode_action(action, pretty: bool = True) -> str:
+    """编码单个 ActionItem。美化模式下的缩进与其在完整文档中的位置一致"""
+    if pretty:
+        sep = "," + _FIELD_INDENT
+        return (
+            "{" + _FIELD_INDENT
+            + '"type": ' + _encode_scalar(action.type) + sep
+            + '"delay": ' + _encode_scalar(action.delay) + sep
+            + '"wait": ' + _encode_scalar(action.wait) + sep
+            + '"characters": ' + _encode_list_pretty(action.characters) + sep
+            + '"name": ' + _encode_scalar(action.name) + sep
+            + '"body": ' + _encode_scalar(action.body) + sep
+            + '"motions": ' + _encode_list_pretty(action.motions) + sep
+            + '"voices": ' + _encode_list_pretty(action.voices) + sep
+            + '"close": ' + _encode_scalar(action.close)
+            + "\n    }"
+        )
+    return (
+        '{"type":' + _encode_scalar(action.type)
+        + ',"delay":' + _encode_scalar(action.delay)
+        + ',"wait":' + _encode_scalar(action.wait)
+        + ',"characters":' + _encode_list_compact(action.characters)
+        + ',"name":' + _encode_scalar(action.name)
+        + ',"body":' + _encode_scalar(action.body)
+        + ',"motions":' + _encode_list_compact(action.motions)
+        + ',"voices":' + _encode_list_compact(action.voices)
+        + ',"close":' + _encode_scalar(action.close)
+        + "}"
+    )
+
+
+def _encode_action_fast(action, pretty: bool) -> str:
+    if ORJSON_ENABLED:
+        try:
+            if pretty:
+                # orjson 的缩进从零开始，需要补上动作在文档中的缩进
+                return orjson.dumps(action, option=orjson.OPT_INDENT_2).decode("utf-8").replace("\n", "\n    ")
+            return orjson.dumps(action).decode("utf-8")
+        except TypeError:
+            # 超出 64 位的整数、孤立代理字符等情况 orjson 不支持，退回纯 Python 编码
+            pass
+    return encode_action(action, pretty)
+
+
+def _document_frame(pretty: bool, server: int, voice: str, background: Optional[str],
+                    bgm: Optional[str]) -> Tuple[str, str, str, str, str]:
+    """返回 (文件头, 第一个动作前的分隔符, 动作之间的分隔符, 没有动作时的结尾, 结尾)"""
+    header = (("server", server), ("voice", voice), ("background", background), ("bgm", bgm))
+    if pretty:
+        head = "{\n" + "".join(f'  "{key}": {_encode_scalar(value)},\n' for key, value in header) + '  "actions": ['
+        return head, "\n    ", _PRETTY_SEPARATOR, "]\n}", "\n  ]\n}"
+    head = "{" + "".join(f'"{key}":{_encode_scalar(value)},' for key, value in header) + '"actions":['
+    return head, "", ",", "]}", "]}"
+
+
+def write_json_stream(actions: Iterable, fp: TextIO, server: int = 0, voice: str = "",
+                      background: Optional[str] = None, bgm: Optional[str] = None, pretty: bool = True,
+                      header: Any = None) -> int:
+    """增量写出 JSON：先写文件头，再逐个写入动作，内存占用与输入长度无关。
+
+    美化模式与 json.dumps(asdict(ConversionResult(...)), ensure_ascii=False, indent=2) 逐字节一致；
+    紧凑模式与 separators=(',', ':') 的输出一致。返回写入的动作数。
+
+    指定 header（ConversionResult）时文件头取自它的字段，并且在取得第一个动作（或动作为空）之后才读取，
+    转换过程中由文档开头的指令设置的背景和 BGM 也能写入文件头。
+    """
+    if header is not None:
+        actions = iter(actions)
+        first = next(actions, None)
+        if first is not None:
+            actions = chain((first,), actions)
+        server, voice, background, bgm = header.server, header.voice, header.background, header.bgm
+    head, first_sep, sep, empty_end, end = _document_frame(pretty, server, voice, background, bgm)
+    fp.write(head)
+    count = 0
+    for action in actions:
+        fp.write(sep if count else first_sep)
+        fp.write(_encode_action_fast(action, pretty))
+        count += 1
+    fp.write(end if count else empty_end)
+    return count
+
+
+def encode_actions(actions: Iterable, pretty: bool = True) -> str:
+    """编码一组连续的动作，动作之间带有文档中的分隔符，可用 dumps_encoded 直接拼接成完整文档"""
+    return (_PRETTY_SEPARATOR if pretty else ",").join(_encode_action_fast(action, pretty) for action in actions)
+
+
+def dumps_encoded(fragments: Iterable[str], pretty: bool = True, server: int = 0, voice: str = "",
+                  background: Optional[str] = None, bgm: Optional[str] = None) -> str:
+    """把 encode_actions 编码好的片段按顺序拼接成完整文档，空片段会被跳过。输出与 write_json_stream 一致"""
+    head, first_sep, sep, empty_end, end = _document_frame(pretty, server, voice, background, bgm)
+    parts = [fragment for fragment in fragments if fragment]
+    if not parts:
+        return head + empty_end
+    # 文件头和结尾并入首尾两个片段，整个文档只需一次拼接，避免反复复制很长的字符串
+    parts[0] = head + first_sep + parts[0]
+    parts[-1] += end
+    return sep.join(parts)
+
+
+def write_encoded_stream(fragments: Iterable[str], fp: TextIO, pretty: bool = True, server: int = 0, voice: str = "",
+                         background: Optional[str] = None, bgm: Optional[str] = None):
+    """把 encode_actions 编码好的片段按顺序写出为完整文档，空片段会被跳过。输出与 write_json_stream 一致"""
+    head, first_sep, sep, empty_end, end = _document_frame(pretty, server, voice, background, bgm)
+    fp.write(head)
+    written = False
+    for fragment in fragments:
+        if fragment:
+            fp.write(sep if written else first_sep)
+            fp.write(fragment)
+            written = True
+    fp.write(end if written else empty_end)
+
+
+def dumps_result(result, pretty: bool = True) -> str:
+    """编码完整的 ConversionResult"""
+    if ORJSON_ENABLED:
+        try:
+            return orjson.dumps(result, option=orjson.OPT_INDENT_2 if pretty else 0).decode("utf-8")
+        except TypeError:
+            pass
+    buffer = io.StringIO()
+    write_json_stream(result.actions, buffer, result.server, result.voice, result.background, result.bgm, pretty)
+    return buffer.getvalue()
@@ -0,0 +1,111 @@
+# 增量转换：按空行把剧本切分为互相独立的块，缓存每个块的解析和编码结果，
+# 文本修改后只重新解析内容发生变化的块。适合编辑器中边改边预览的场景。
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from converter import ActionItem, ConversionResult, QuotePairs, QuoteRules, TextConverter
+from encoder import dumps_encoded, encode_actions
+
+# 块之间的分隔：一个或多个空行（只含空白字符的行）。\s 与 str.strip() 使用相同的空白字符定义。
+# 文本开头或结尾的空行不会被切掉，它们不产生任何动作，不影响结果
+_BLOCK_SEPARATOR = re.compile(r'\n(?:[^\S\n]*\n)+')
+
+
+class _Block:
+    """一个块的转换结果（动作和块中指令设置的背景、BGM），编码后的 JSON 片段按需生成并缓存"""
+
+    __slots__ = ("actions", "header", "_pretty", "_compact")
+
+    def __init__(self, actions: List[ActionItem], header: ConversionResult):
+        self.actions = actions
+        self.header = header
+        self._pretty: Optional[str] = None
+        self._compact: Optional[str] = None
+
+    def encoded(self, pretty: bool) -> str:
+        if pretty:
+            if self._pretty is None:
+                self._pretty = encode_actions(self.actions, True)
+            return self._pretty
+        if self._compact is None:
+            self._compact = encode_actions(self.actions, False)
+        return self._compact
+
+
+class IncrementalConverter:
+    """以块为粒度缓存转换结果的转换器。
+
+    空行会结束当前动作并把说话人重置为旁白，所以以空行分隔的块互相独立，块的转换结果只取决于块本身的文本。
+    每次转换按块的文本查找缓存，只解析新出现或被修改的块；缓存只保留本次文本中仍然存在的块。
+    旁白名、引号设置或配置（说话人索引、解析器）变化时缓存整体失效。输出与 TextConverter 完全一致。
+    """
+
+    def __init__(self, converter: TextConverter):
+        self.converter = converter
+        self._blocks: Dict[str, _Block] = {}
+        self._state: Optional[Tuple] = None
+        # 最近一次转换的块总数和重新解析的块数
+        self.total_blocks = 0
+        self.reparsed_blocks = 0
+
+    def clear(self):
+        """丢弃全部缓存"""
+        self._blocks = {}
+        self._state = None
+
+    def _update(self, input_text: str, narrator_name: Optional[str],
+                selected_quote_pairs: Optional[QuotePairs]) -> List[_Block]:
+        converter = self.converter
+        converter.reload_config_if_changed()
+        if narrator_name is None: narrator_name = converter.parsing_config.get("default_narrator_name", " ")
+        quote_rules = QuoteRules.coerce(selected_quote_pairs)
+
+        # 说话人格式按整个文本检测，各块使用同一种格式，格式改变时全部重新解析
+        speaker_format = converter.detect_speaker_format(input_text)
+        # 说话人索引和解析器在配置变化时整体替换，按对象身份比较即可；引号规则按值比较
+        state = (narrator_name, quote_rules, converter.speaker_index, converter.parser_for(speaker_format))
+        cached = self._blocks if state == self._state else {}
+        self._state = state
+
+        blocks: List[_Block] = []
+        current: Dict[str, _Block] = {}
+        reparsed = 0
+        for text in _BLOCK_SEPARATOR.split(input_text):
+            if not text:
+                continue
+            block = current.get(text) or cached.get(text)
+            if block is None:
+                header = ConversionResult()
+                actions = list(converter.iter_actions(text.split('\n'), narrator_name, quote_rules,
+                                                      speaker_format=speaker_format, header=header))
+                block = _Block(actions, header)
+                reparsed += 1
+            current[text] = block
+            blocks.append(block)
+
+        self._blocks = current
+        self.total_blocks = len(blocks)
+        self.reparsed_blocks = reparsed
+        return blocks
+
+    def convert(self, input_text: str, narrator_name: Optional[str] = None,
+                selected_quote_pairs: Optional[QuotePairs] = None) -> List[ActionItem]:
+        """转换文本，返回动作列表。列表中的 ActionItem 与缓存共享，调用方不应修改"""
+        actions: List[ActionItem] = []
+        for block in self._update(input_text, narrator_name, selected_quote_pairs):
+            actions.extend(block.actions)
+        return actions
+
+    def convert_to_json(self, input_text: str, narrator_name: Optional[str] = None,
+                        selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True) -> str:
+        """转换文本并返回 JSON 字符串，与 TextConverter.convert_text_to_json_format 的输出逐字节一致"""
+        blocks = self._update(input_text, narrator_name, selected_quote_pairs)
+        # 背景和 BGM 指令只在第一个动作之前有效：取第一个含有动作的块及其之前各块中最先设置的值
+        background = bgm = None
+        for block in blocks:
+            if background is None: background = block.header.background
+            if bgm is None: bgm = block.header.bgm
+            if block.actions:
+                break
+        return dumps_encoded((block.encoded(pretty) for block in blocks), pretty, background=background, bgm=bgm)
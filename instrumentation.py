@@ -0,0 +1,274 @@
+# 可选的性能分析：统计转换各阶段耗时、调用次数、输入输出字节数和最慢的文件。
+#
+# 未启用时不会替换任何对象，转换路径上没有额外开销；启用时在转换器的浅拷贝上换用计时包装的
+# 解析器和引号处理器（共享的转换器不受影响），并包装输入迭代器和输出流。
+
+import copy
+import cProfile
+import heapq
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from converter import ConversionResult, QuotePairs, QuoteRules, TextConverter, open_output
+from encoder import write_json_stream
+from script_reader import ScriptReader, ScriptSource, script_size, with_encoding_fallback
+from sinks import OutputSink
+
+# 报告中的阶段顺序。各阶段为互不重叠的独占时间
+STAGES = ("read", "parse", "quotes", "build", "serialize", "write", "cache")
+
+
+class _StageCounter:
+    __slots__ = ("seconds", "calls")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+
+
+class _TimedParser:
+    """计时包装的说话人解析器，其余属性透传给原解析器"""
+
+    def __init__(self, parser, counter: _StageCounter):
+        self._parser = parser
+        self._counter = counter
+
+    def parse(self, line: str):
+        start = time.perf_counter()
+        result = self._parser.parse(line)
+        self._counter.seconds += time.perf_counter() - start
+        self._counter.calls += 1
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._parser, name)
+
+
+class _TimedQuoteHandler:
+    """计时包装的引号处理器"""
+
+    def __init__(self, quote_handler, counter: _StageCounter):
+        self._quote_handler = quote_handler
+        self._counter = counter
+
+    def remove_quotes(self, text: str, active_quote_pairs: QuotePairs) -> str:
+        start = time.perf_counter()
+        result = self._quote_handler.remove_quotes(text, active_quote_pairs)
+        self._counter.seconds += time.perf_counter() - start
+        self._counter.calls += 1
+        return result
+
+    def strip_body(self, body: str, rules: QuoteRules) -> str:
+        start = time.perf_counter()
+        result = self._quote_handler.strip_body(body, rules)
+        self._counter.seconds += time.perf_counter() - start
+        self._counter.calls += 1
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._quote_handler, name)
+
+
+class _TimedWriter:
+    """计时包装的输出流，同时统计写出的字节数（不计入耗时）"""
+
+    def __init__(self, fp: TextIO, counter: _StageCounter):
+        self._fp = fp
+        self._counter = counter
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        start = time.perf_counter()
+        result = self._fp.write(text)
+        self._counter.seconds += time.perf_counter() - start
+        self._counter.calls += 1
+        self.bytes += len(text.encode('utf-8'))
+        return result
+
+
+def _timed_iter(iterable: Iterable, counter: _StageCounter) -> Iterator:
+    iterator = iter(iterable)
+    perf_counter = time.perf_counter
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            counter.seconds += perf_counter() - start
+            return
+        counter.seconds += perf_counter() - start
+        counter.calls += 1
+        yield item
+
+
+class FileProfiler:
+    """统计单个文件的转换耗时。convert_file 的签名与 converter.convert_file 一致，可直接替换使用。
+
+    分析与实际转换相同的代码路径：配置了批量引擎时分析 iter_actions_bulk，说话人解析和引号处理内联在其循环中，
+    这两个阶段的耗时计入 build。
+    """
+
+    def __init__(self):
+        self.stats: Optional[Dict[str, Any]] = None
+
+    def convert_file(self, converter: TextConverter, input_path: ScriptSource, output_path: str, narrator_name: str = None,
+                     selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True,
+                     sink: Optional[OutputSink] = None):
+        def convert(reader: ScriptReader):
+            # 编码回退时会重新转换，每次都从零开始计数
+            counters.update({name: _StageCounter() for name in ("read", "parse", "quotes", "actions", "write")})
+            speaker_format = converter.detect_speaker_format(reader.iter_lines())
+            with open_output(output_path, sink=sink) as output_fp:
+                writer = _TimedWriter(output_fp, counters["write"])
+                writers.append(writer)
+                header = ConversionResult()
+                if converter.use_bulk_engine and converter.bulk_supported(speaker_format):
+                    blocks = _timed_iter(reader.iter_text_blocks(), counters["read"])
+                    actions = converter.iter_actions_bulk(blocks, narrator_name, selected_quote_pairs, speaker_format,
+                                                          header)
+                else:
+                    # 计时包装只装在本次转换使用的浅拷贝上，其他线程可能正在使用同一个转换器。
+                    # 浅拷贝与原转换器共用说话人索引和各格式的解析器，拷贝上不再热重载配置，
+                    # 以免重建索引时经拷贝修改原转换器的解析器；配置的修改已在拷贝之前应用到原转换器
+                    converter.reload_config_if_changed()
+                    profiled = copy.copy(converter)
+                    profiled.hot_reload = False
+                    profiled.parser = _TimedParser(converter.parser_for(speaker_format), counters["parse"])
+                    profiled.quote_handler = _TimedQuoteHandler(converter.quote_handler, counters["quotes"])
+                    lines = _timed_iter(reader.iter_lines(), counters["read"])
+                    actions = profiled.iter_actions(lines, narrator_name, selected_quote_pairs, header=header)
+                write_json_stream(_timed_iter(actions, counters["actions"]), writer, pretty=pretty, header=header)
+
+        counters: Dict[str, _StageCounter] = {}
+        writers: List[_TimedWriter] = []
+        start = time.perf_counter()
+        with ScriptReader(input_path) as reader:
+            with_encoding_fallback(reader, convert)
+        total = time.perf_counter() - start
+
+        read, parse, quotes = counters["read"], counters["parse"], counters["quotes"]
+        actions_counter, write = counters["actions"], counters["write"]
+        # 动作迭代器的时间包含读取、解析和引号处理，剩余部分是组装动作的开销；
+        # 其余时间扣除写出即为序列化
+        build_seconds = max(0.0, actions_counter.seconds - read.seconds - parse.seconds - quotes.seconds)
+        serialize_seconds = max(0.0, total - actions_counter.seconds - write.seconds)
+        self.stats = {
+            "path": str(input_path),
+            "seconds": total,
+            "bytes_in": script_size(input_path),
+            "bytes_out": writers[-1].bytes,
+            "stages": {
+                "read": [read.seconds, read.calls],
+                "parse": [parse.seconds, parse.calls],
+                "quotes": [quotes.seconds, quotes.calls],
+                "build": [build_seconds, actions_counter.calls],
+                "serialize": [serialize_seconds, actions_counter.calls],
+                "write": [write.seconds, write.calls],
+            },
+        }
+
+
+def cache_hit_stats(input_path: ScriptSource, output_path: str, seconds: float,
+                    bytes_out: Optional[int] = None) -> Dict[str, Any]:
+    """命中缓存的文件只记录复制缓存的耗时。输出不是单独的文件时由调用方给出 bytes_out"""
+    return {
+        "path": str(input_path),
+        "seconds": seconds,
+        "bytes_in": script_size(input_path),
+        "bytes_out": os.path.getsize(output_path) if bytes_out is None else bytes_out,
+        "stages": {"cache": [seconds, 1]},
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """已排序数据的分位数（取最接近的样本）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(seconds: Iterable[float]) -> Dict[str, float]:
+    """单文件耗时的分位数，单位为毫秒"""
+    values = sorted(seconds)
+    return {
+        "p50": percentile(values, 0.5) * 1000,
+        "p90": percentile(values, 0.9) * 1000,
+        "p99": percentile(values, 0.99) * 1000,
+        "max": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+class Instrumentation:
+    """汇总多个文件（可能来自多个工作进程）的统计结果，生成 JSON 报告"""
+
+    def __init__(self, slowest_count: int = 10):
+        self.slowest_count = slowest_count
+        self.stages = {name: [0.0, 0] for name in STAGES}
+        self.files = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._slowest: List = []
+        self._started = time.perf_counter()
+
+    def add_file(self, stats: Dict[str, Any]):
+        self.files += 1
+        self.seconds += stats["seconds"]
+        self.bytes_in += stats["bytes_in"]
+        self.bytes_out += stats["bytes_out"]
+        for name, (seconds, calls) in stats["stages"].items():
+            stage = self.stages.setdefault(name, [0.0, 0])
+            stage[0] += seconds
+            stage[1] += calls
+        entry = (stats["seconds"], stats["path"], stats["bytes_in"])
+        if len(self._slowest) < self.slowest_count:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    def add_failure(self):
+        self.failures += 1
+
+    def report(self) -> Dict[str, Any]:
+        wall_seconds = time.perf_counter() - self._started
+        return {
+            "files": self.files,
+            "failures": self.failures,
+            "wall_seconds": wall_seconds,
+            "file_seconds": self.seconds,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "mb_per_sec": self.bytes_in / 1024 / 1024 / wall_seconds if wall_seconds else None,
+            "stages": {
+                name: {
+                    "seconds": seconds,
+                    "calls": calls,
+                    "share": seconds / self.seconds if self.seconds else 0.0,
+                }
+                for name, (seconds, calls) in self.stages.items() if calls
+            },
+            "slowest_files": [
+                {"path": path, "seconds": seconds, "bytes_in": bytes_in}
+                for seconds, path, bytes_in in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+    def write_report(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+def start_profiler() -> cProfile.Profile:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler: cProfile.Profile, path: str):
+    """停止 cProfile 并保存为 pstats 文件，可用 python -m pstats 查看"""
+    profiler.disable()
+    profiler.dump_stats(path)
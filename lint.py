@@ -0,0 +1,167 @@
+# 剧本检查：在转换的同一次逐行扫描中发现上传到 Bestdori 后才会暴露的问题，并报告所在行号。
+#
+# - unknown-speaker：说话人不在角色映射中，characters 为空
+# - long-speaker-name：形如“名字：台词”的行因名字超过 max_speaker_name_length 被当作旁白
+# - unbalanced-quotes：去除引号后的正文中引号不成对
+# - unknown-directive / misplaced-directive / unused-directive：启用行内指令时，无法识别的指令、
+#   第一个动作之后的背景或 BGM 指令、没有台词可以附加的动作或语音指令
+#
+# 检查器通过 TextConverter.iter_actions(..., linter=) 接入，不改变转换结果；只检查时不编码、不写出 JSON。
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from converter import (
+    ActionItem, ConfigManager, QuoteRules, SpeakerParser, TextConverter, build_quote_pairs,
+)
+from script_reader import ScriptReader, with_encoding_fallback
+
+# 名字长度超出上限不多于该字符数时，认为是写错的说话人行而不是普通旁白
+LONG_NAME_SLACK = 10
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    """一条检查结果，line 从 1 开始"""
+    line: int
+    code: str
+    message: str
+
+    def format(self, path: str) -> str:
+        return f"{path}:{self.line}: [{self.code}] {self.message}"
+
+
+class Linter:
+    """随转换逐行检查剧本。每次扫描使用一个新实例，结果保存在 diagnostics 中。
+
+    quote_pairs 是检查是否成对的引号，默认为配置中的全部预设引号，与去除引号的设置无关。
+    """
+
+    def __init__(self, converter: TextConverter, quote_pairs: Optional[Dict[str, str]] = None,
+                 long_name_slack: int = LONG_NAME_SLACK):
+        self.converter = converter
+        self.diagnostics: List[Diagnostic] = []
+        self.lineno = 0
+        # 当前动作第一行台词的行号
+        self.action_line = 0
+        self.narrator_name = ""
+        if quote_pairs is None:
+            quote_pairs = build_quote_pairs(converter.config_manager)
+        self._paired = [(opening, closing) for opening, closing in quote_pairs.items() if opening != closing]
+        self._symmetric = [opening for opening, closing in quote_pairs.items() if opening == closing]
+        self.long_name_slack = long_name_slack
+        self.max_name_length = 0
+        self._relaxed_parser: Optional[SpeakerParser] = None
+
+    def _report(self, line: int, code: str, message: str):
+        self.diagnostics.append(Diagnostic(line, code, message))
+
+    def track(self, lines: Iterable[str], narrator_name: str, parser: SpeakerParser) -> Iterator[str]:
+        """包装转换器读取的行，记录当前行号。结束后行号停在最后一行之后。parser 是本次转换使用的说话人解析器"""
+        self.narrator_name = narrator_name
+        # 放宽名字长度上限的解析器：它能解析而转换器的解析器不能解析的行，就是名字略长的说话人行
+        self.max_name_length = parser.max_name_length
+        self._relaxed_parser = parser.with_max_name_length(parser.max_name_length + self.long_name_slack)
+        lineno = 0
+        for lineno, line in enumerate(lines, 1):
+            self.lineno = lineno
+            yield line
+        self.lineno = lineno + 1
+
+    def report_directive(self, code: str, message: str):
+        """报告当前行的指令问题"""
+        self._report(self.lineno, code, message)
+
+    def check_line(self, line: str):
+        """检查没有被解析为说话人的行（已去除首尾空白）"""
+        parse_result = self._relaxed_parser.parse(line)
+        if parse_result:
+            name = parse_result[0]
+            self._report(self.lineno, "long-speaker-name",
+                         f"说话人 '{name}' 长 {len(name)} 个字符，达到上限 {self.max_name_length}，"
+                         f"整行被当作旁白或上一句台词的正文")
+
+    def start_action(self):
+        """当前行是一个动作的第一行台词。动作中可能夹有只含指令的行，结束时的行号减去台词行数不一定是起始行"""
+        self.action_line = self.lineno
+
+    def check_action(self, action: ActionItem):
+        """检查刚组装好的动作，问题报告在动作的第一行"""
+        line = self.action_line
+        if not action.characters and action.name != self.narrator_name and action.name.strip():
+            self._report(line, "unknown-speaker", f"说话人 '{action.name}' 不在角色映射中")
+        body = action.body
+        for opening, closing in self._paired:
+            opened = body.count(opening)
+            closed = body.count(closing)
+            if opened != closed:
+                self._report(line, "unbalanced-quotes",
+                             f"引号 {opening}{closing} 不成对（{opened} 个 {opening}，{closed} 个 {closing}）")
+        for quote in self._symmetric:
+            if (body[0] == quote) != (body[-1] == quote):
+                self._report(line, "unbalanced-quotes", f"引号 {quote} 只出现在正文的一端")
+
+
+def lint_lines(converter: TextConverter, lines: Iterable[str], narrator_name: Optional[str] = None,
+               quote_rules: Optional[QuoteRules] = None, lint_pairs: Optional[Dict[str, str]] = None,
+               speaker_format: Optional[str] = None) -> Tuple[int, List[Diagnostic]]:
+    """只检查不输出，返回 (动作数, 检查结果)。speaker_format 见 TextConverter.iter_actions"""
+    linter = Linter(converter, lint_pairs)
+    count = 0
+    for _ in converter.iter_actions(lines, narrator_name, quote_rules, linter=linter, speaker_format=speaker_format):
+        count += 1
+    return count, linter.diagnostics
+
+
+def lint_file(converter: TextConverter, input_path: str, narrator_name: Optional[str] = None,
+              quote_rules: Optional[QuoteRules] = None,
+              lint_pairs: Optional[Dict[str, str]] = None) -> Tuple[int, List[Diagnostic]]:
+    """读取单个文本文件（自动检测编码）并检查，返回 (动作数, 检查结果)"""
+    def lint(reader: ScriptReader) -> Tuple[int, List[Diagnostic]]:
+        speaker_format = converter.detect_speaker_format(reader.iter_lines())
+        return lint_lines(converter, reader.iter_lines(), narrator_name, quote_rules, lint_pairs, speaker_format)
+
+    with ScriptReader(input_path) as reader:
+        return with_encoding_fallback(reader, lint)
+
+
+@dataclass(frozen=True)
+class LintOptions:
+    """一次检查中所有文件共用的参数，在工作进程启动时传入一次"""
+    config_path: str
+    narrator_name: Optional[str] = None
+    quote_rules: QuoteRules = field(default_factory=QuoteRules)
+    lint_pairs: Optional[Dict[str, str]] = None
+
+
+_worker_converter: Optional[TextConverter] = None
+_worker_options: Optional[LintOptions] = None
+
+
+def _init_worker(options: LintOptions):
+    global _worker_converter, _worker_options
+    _worker_options = options
+    _worker_converter = TextConverter(ConfigManager(options.config_path))
+
+
+def _lint_task(input_path: str) -> Tuple[str, bool, str, int, List[Diagnostic]]:
+    options = _worker_options
+    try:
+        count, diagnostics = lint_file(_worker_converter, input_path, options.narrator_name, options.quote_rules,
+                                       options.lint_pairs)
+        return input_path, True, "Success", count, diagnostics
+    except (OSError, ValueError) as e:
+        return input_path, False, str(e), 0, []
+
+
+def lint_batch(paths: List[str], options: LintOptions,
+               jobs: int = 1) -> Iterator[Tuple[str, bool, str, int, List[Diagnostic]]]:
+    """批量检查，按输入顺序产出 (路径, 是否成功, 信息, 动作数, 检查结果)"""
+    if jobs <= 1:
+        _init_worker(options)
+        yield from map(_lint_task, paths)
+        return
+    chunksize = max(1, min(64, len(paths) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(options,)) as executor:
+        yield from executor.map(_lint_task, paths, chunksize=chunksize)
@@ -0,0 +1,176 @@
+# 批处理任务清单：记录排好序的输入列表以及每个文件的状态、输入输出哈希和耗时，中断后可以从清单继续。
+#
+# 清单是一个 JSON Lines 文件：第一行是任务头（任务参数和全部 [输入, 输出] 对），之后每处理完一个文件追加一行记录，
+# 同一输入以最后一行为准。只追加、定期 fsync，崩溃时最多丢失最近一段记录，末尾写了一半的行在读取时忽略。
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cache import hash_file
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+# 每隔这么多秒或这么多条记录把清单刷到磁盘
+FLUSH_INTERVAL = 2.0
+FLUSH_EVERY = 256
+# 每个文件最多尝试的次数（含第一次），失败次数达到上限后继续运行时不再重试
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def hash_text(text: str) -> str:
+    """输出文档的哈希，与文本模式写出后的文件用 hash_file 计算的结果一致"""
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=20).hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    input: str
+    output: str
+    status: str = "pending"
+    attempts: int = 0
+    seconds: Optional[float] = None
+    input_hash: Optional[str] = None
+    output_hash: Optional[str] = None
+    error: Optional[str] = None
+
+
+class JobManifest:
+    """一次批处理的任务清单。用 create() 新建或 load() 读取已有清单，处理结果通过 record() 追加"""
+
+    def __init__(self, path: str, job: Dict[str, Any], entries: Dict[str, ManifestEntry], valid_size: int):
+        self.path = path
+        self.job = job
+        self.entries = entries
+        self._file = open(path, 'r+', encoding='utf-8', newline='\n')
+        # 丢弃末尾写了一半的记录，之后的记录从完整的行之后追加
+        self._file.truncate(valid_size)
+        self._file.seek(valid_size)
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def create(cls, path: str, job: Dict[str, Any], tasks: Iterable[Tuple[str, str]]) -> "JobManifest":
+        """新建清单，覆盖同名文件。tasks 应已按输入路径排序，清单按该顺序记录"""
+        entries = {input_path: ManifestEntry(input_path, output_path) for input_path, output_path in tasks}
+        header = {"version": MANIFEST_VERSION, "job": job,
+                  "inputs": [[entry.input, entry.output] for entry in entries.values()]}
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(path, job, entries, os.path.getsize(path))
+
+    @classmethod
+    def load(cls, path: str) -> "JobManifest":
+        """读取已有清单，按记录恢复每个文件的状态"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        # 只解析到最后一个换行为止，之后是崩溃时写了一半的记录
+        valid_size = data.rfind(b"\n") + 1
+        lines = data[:valid_size].decode('utf-8').splitlines()
+        if not lines:
+            raise ValueError(f"任务清单 {path} 为空")
+        try:
+            header = json.loads(lines[0])
+            if header.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"不支持的任务清单版本: {header.get('version')}")
+            entries = {input_path: ManifestEntry(input_path, output_path)
+                       for input_path, output_path in header["inputs"]}
+            for number, line in enumerate(lines[1:], 2):
+                record = json.loads(line)
+                entry = entries.get(record.get("input"))
+                if entry is None:
+                    raise ValueError(f"第 {number} 行记录的文件不在清单中")
+                for name in ("status", "attempts", "seconds", "input_hash", "output_hash", "error"):
+                    setattr(entry, name, record.get(name))
+        except (KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"任务清单 {path} 格式错误: {e}") from None
+        return cls(path, header.get("job", {}), entries, valid_size)
+
+    def __enter__(self) -> "JobManifest":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def remaining(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Tuple[List[Tuple[str, str]], int, int]:
+        """返回 (待处理的 [输入, 输出] 列表, 跳过的已完成数, 放弃的失败数)，保持清单中的顺序。
+
+        已完成但输出文件缺失或内容与记录的哈希不符（如崩溃前还未落盘）的文件重新处理，
+        输入文件缺失或在上次运行后被修改的文件同样重新处理；失败的文件在尝试次数未达到 max_attempts 时重试。
+        """
+        tasks = []
+        skipped = 0
+        exhausted = 0
+        changed = 0
+        for entry in self.entries.values():
+            if entry.status == "done" and not self._input_intact(entry):
+                changed += 1
+                tasks.append((entry.input, entry.output))
+            elif entry.status == "done" and self._output_intact(entry):
+                skipped += 1
+            elif entry.status == "failed" and entry.attempts >= max_attempts:
+                exhausted += 1
+            else:
+                tasks.append((entry.input, entry.output))
+        if changed:
+            logger.warning(f"{changed} 个已完成的文件在上次运行后被修改或删除，将重新处理")
+        return tasks, skipped, exhausted
+
+    @staticmethod
+    def _input_intact(entry: ManifestEntry) -> bool:
+        try:
+            return hash_file(entry.input) == entry.input_hash
+        except OSError:
+            return False
+
+    @staticmethod
+    def _output_intact(entry: ManifestEntry) -> bool:
+        try:
+            return hash_file(entry.output) == entry.output_hash
+        except OSError:
+            return False
+
+    def record(self, input_path: str, success: bool, message: str, result: Optional[Dict[str, Any]]):
+        """记录一个文件的处理结果。result 为工作进程返回的耗时和哈希"""
+        entry = self.entries[input_path]
+        result = result or {}
+        entry.status = "done" if success else "failed"
+        entry.attempts += 1
+        entry.seconds = result.get("seconds")
+        entry.input_hash = result.get("input_hash")
+        entry.output_hash = result.get("output_hash") if success else None
+        entry.error = None if success else message
+        record = {"input": entry.input, "status": entry.status, "attempts": entry.attempts,
+                  "seconds": entry.seconds, "input_hash": entry.input_hash, "output_hash": entry.output_hash,
+                  "error": entry.error}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._unflushed += 1
+        if self._unflushed >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的文件数"""
+        counts = {"done": 0, "failed": 0, "pending": 0}
+        for entry in self.entries.values():
+            counts[entry.status] = counts.get(entry.status, 0) + 1
+        return counts
@@ -0,0 +1,153 @@
+# 单个大文件的并行转换：在空行处把输入切分为若干文本块，由进程池分别解析和编码，再按原顺序拼接输出。
+#
+# 空行会结束当前对话并把说话人重置为旁白，所以在空行处切开的文本块互相独立，并行结果与顺序转换逐字节一致。
+
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import chain
+import os
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from converter import ConfigManager, ConversionResult, QuotePairs, QuoteRules, TextConverter, convert_file, open_output
+from encoder import dumps_encoded, encode_actions, write_encoded_stream
+from script_reader import ScriptReader, ScriptSource, script_size, with_encoding_fallback
+from sinks import OutputSink
+
+# 小于该大小（字节）的输入文件不值得启动进程池，仍按顺序转换
+PARALLEL_MIN_SIZE = 4 * 1024 * 1024
+# 内存中文本的对应阈值（字符数）：剧本以中日文为主，UTF-8 下每个字符约 3 字节
+PARALLEL_MIN_CHARS = PARALLEL_MIN_SIZE // 3
+# 每个任务的大致字符数，实际在达到该大小后的第一个空行处切开
+CHUNK_CHARS = 1 << 20
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 工作进程各自持有转换器和本次转换的参数，任务只传输文本块
+_worker_converter: Optional[TextConverter] = None
+_worker_args: Tuple = ()
+
+
+def _init_worker(config_path: str, narrator_name: str, quote_rules: QuoteRules, pretty: bool,
+                 speaker_format: Optional[str]):
+    global _worker_converter, _worker_args
+    # 同一个文件的各文本块使用同一份配置
+    _worker_converter = TextConverter(ConfigManager(config_path), hot_reload=False)
+    _worker_args = (narrator_name, quote_rules, pretty, speaker_format)
+
+
+def _convert_chunk(text: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """返回 (编码后的动作, 块中指令设置的背景, BGM)"""
+    narrator_name, quote_rules, pretty, speaker_format = _worker_args
+    header = ConversionResult()
+    if _worker_converter.use_bulk_engine:
+        actions = _worker_converter.iter_actions_bulk((text,), narrator_name, quote_rules, speaker_format, header)
+    else:
+        actions = _worker_converter.iter_actions(text.split('\n'), narrator_name, quote_rules,
+                                                 speaker_format=speaker_format, header=header)
+    encoded = encode_actions(actions, pretty)
+    return encoded, header.background, header.bgm
+
+
+def _merge_header(results: Iterator[Tuple[str, Optional[str], Optional[str]]]) -> Tuple[ConversionResult, Iterator[str]]:
+    """读取开头的块直到第一个含有动作的块，合并出文档的背景和 BGM，返回 (文档头, 全部块的编码片段)。
+
+    背景和 BGM 指令只在第一个动作之前有效，之后的块中的指令在顺序转换时也会被忽略。
+    """
+    header = ConversionResult()
+    head = []
+    for encoded, background, bgm in results:
+        if header.background is None: header.background = background
+        if header.bgm is None: header.bgm = bgm
+        head.append(encoded)
+        if encoded:
+            break
+    return header, chain(head, (encoded for encoded, _, _ in results))
+
+
+def iter_chunks(lines: Iterable[str], chunk_chars: int = CHUNK_CHARS) -> Iterator[str]:
+    """把行序列在空行处切分为约 chunk_chars 个字符的文本块。切分处的空行本身不包含在任何块中"""
+    chunk = []
+    size = 0
+    for line in lines:
+        if size >= chunk_chars and not line.strip():
+            yield '\n'.join(chunk)
+            chunk = []
+            size = 0
+            continue
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield '\n'.join(chunk)
+
+
+def map_ordered(executor: Executor, fn: Callable[[T], R], items: Iterable[T], max_pending: int) -> Iterator[R]:
+    """按提交顺序产出结果，同时最多有 max_pending 个任务在排队或执行，内存占用不随输入增长"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class _ChunkPool:
+    """本次转换专用的进程池，退出时取消尚未开始的任务。说话人格式由主进程对整个输入检测一次，各文本块共用"""
+
+    def __init__(self, converter: TextConverter, narrator_name: Optional[str],
+                 selected_quote_pairs: Optional[QuotePairs], pretty: bool, jobs: Optional[int],
+                 speaker_format: Optional[str]):
+        if narrator_name is None: narrator_name = converter.parsing_config.get("default_narrator_name", " ")
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.jobs, initializer=_init_worker,
+            initargs=(str(converter.config_manager.config_path), narrator_name,
+                      QuoteRules.coerce(selected_quote_pairs), pretty, speaker_format))
+
+    def __enter__(self) -> "_ChunkPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def map(self, chunks: Iterable[str]) -> Tuple[ConversionResult, Iterator[str]]:
+        """返回 (文档头, 按顺序的编码片段)"""
+        return _merge_header(map_ordered(self.executor, _convert_chunk, chunks, self.jobs * 2))
+
+
+def convert_text_parallel(converter: TextConverter, input_text: str, narrator_name: str = None,
+                          selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True,
+                          jobs: Optional[int] = None, min_chars: int = PARALLEL_MIN_CHARS,
+                          chunk_chars: int = CHUNK_CHARS) -> str:
+    """并行版的 convert_text_to_json_format，输出与之逐字节一致。文本短于 min_chars 个字符时按顺序转换"""
+    if len(input_text) < min_chars or (jobs or os.cpu_count() or 1) <= 1:
+        return converter.convert_text_to_json_format(input_text, narrator_name, selected_quote_pairs, pretty)
+    speaker_format = converter.detect_speaker_format(input_text)
+    with _ChunkPool(converter, narrator_name, selected_quote_pairs, pretty, jobs, speaker_format) as pool:
+        header, fragments = pool.map(iter_chunks(input_text.split('\n'), chunk_chars))
+        return dumps_encoded(fragments, pretty, background=header.background, bgm=header.bgm)
+
+
+def convert_file_parallel(converter: TextConverter, input_path: ScriptSource, output_path: str, narrator_name: str = None,
+                          selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True,
+                          atomic: bool = False, sink: Optional[OutputSink] = None, jobs: Optional[int] = None,
+                          min_size: int = PARALLEL_MIN_SIZE, chunk_chars: int = CHUNK_CHARS):
+    """并行版的 convert_file：主进程读取并切分文件，进程池解析和编码，主进程按顺序写出。
+
+    小于 min_size 字节的文件按顺序转换。工作进程从 converter 的配置文件路径加载配置，
+    因此只在内存中修改过的角色映射不会生效。
+    """
+    if script_size(input_path) < min_size or (jobs or os.cpu_count() or 1) <= 1:
+        return convert_file(converter, input_path, output_path, narrator_name, selected_quote_pairs, pretty, atomic,
+                            sink)
+
+    def convert(reader: ScriptReader):
+        speaker_format = converter.detect_speaker_format(reader.iter_lines())
+        with _ChunkPool(converter, narrator_name, selected_quote_pairs, pretty, jobs, speaker_format) as pool:
+            header, fragments = pool.map(iter_chunks(reader.iter_lines(), chunk_chars))
+            with open_output(output_path, atomic, sink) as output_fp:
+                write_encoded_stream(fragments, output_fp, pretty, background=header.background, bgm=header.bgm)
+
+    with ScriptReader(input_path) as reader:
+        with_encoding_fallback(reader, convert)
@@ -0,0 +1,272 @@
+# 反向转换：把 Bestdori JSON 转回可编辑的剧本文本，并可逐个动作校验“文本 → JSON”能否还原。
+#
+# JSON 文档以流的方式读取，每次只解码 actions 数组中的一个元素，内存占用与文档大小无关。
+
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from converter import ActionItem, ConfigManager, QuotePairs, QuoteRules, TextConverter, open_output, parse_quote_pairs
+
+# 每个文件最多记录的差异条数
+MAX_REPORTED_DIFFERENCES = 5
+# 配置中没有 reverse.quote_style 时包裹台词的引号
+DEFAULT_QUOTE_STYLE = ("「", "」")
+# ConversionResult 中除 actions 外的字段及其默认值，文本格式无法表示其他取值
+_HEADER_DEFAULTS = {"server": 0, "voice": "", "background": None, "bgm": None}
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_START = frozenset("-0123456789")
+_NUMBER_END = re.compile(r'[^-+.eE0-9]')
+_DECODER = json.JSONDecoder()
+
+
+class ActionStreamReader:
+    """从 JSON 文档中逐个读取 actions 数组的元素，不把整个文档读入内存。
+
+    其余顶层字段收集在 header 中；位于 actions 之后的字段要在迭代结束后才能读到。
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int = 1 << 16):
+        self.header: Dict[str, Any] = {}
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """读入更多数据，返回是否读到了内容。每次至少读入与现有缓冲同样多的数据，长元素的重试总开销为线性"""
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        data = self._fp.read(max(self._chunk_size, len(self._buffer)))
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def _peek(self) -> str:
+        """跳过空白，返回下一个字符；文档结束时返回空字符串"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"JSON 格式错误: 期望 {' 或 '.join(chars)}，实际为 {char or '文件结尾'}")
+        self._pos += 1
+        return char
+
+    def _decode(self) -> Any:
+        # 数字可能在缓冲末尾被截断（如 "2." 会被解码为 2），先读到数字后面的分隔字符
+        if self._peek() in _NUMBER_START:
+            while not _NUMBER_END.search(self._buffer, self._pos) and self._fill():
+                pass
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._eof or not self._fill():
+                    raise ValueError(f"JSON 格式错误: {e}") from None
+                continue
+            self._pos = end
+            return value
+
+    def _iter_array(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._decode()
+            if self._expect(",]") == "]":
+                return
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+        else:
+            while True:
+                key = self._decode()
+                if not isinstance(key, str):
+                    raise ValueError("JSON 格式错误: 对象的键必须是字符串")
+                self._expect(":")
+                if key == "actions":
+                    yield from self._iter_array()
+                else:
+                    self.header[key] = self._decode()
+                if self._expect(",}") == "}":
+                    break
+        if self._peek():
+            raise ValueError("JSON 格式错误: 文档结尾有多余内容")
+
+
+def _action_dict(action: ActionItem) -> Dict[str, Any]:
+    return {name: list(value) if isinstance(value, tuple) else value
+            for name in ActionItem.__slots__ for value in (getattr(action, name),)}
+
+
+def default_quote_style(config_manager: ConfigManager) -> Optional[Tuple[str, str]]:
+    """配置中 reverse.quote_style 指定的引号（如 "「」"，空字符串表示不加引号），未配置时为 DEFAULT_QUOTE_STYLE"""
+    quote_style = config_manager.get_reverse_config().get("quote_style")
+    if quote_style is None:
+        return DEFAULT_QUOTE_STYLE
+    if not quote_style:
+        return None
+    return next(iter(parse_quote_pairs([quote_style]).items()))
+
+
+@dataclass
+class RoundTripReport:
+    """单个文件的往返校验结果"""
+    path: str
+    actions: int = 0
+    lossy: int = 0
+    differences: List[str] = field(default_factory=list)
+
+    def add(self, message: str):
+        self.lossy += 1
+        if len(self.differences) < MAX_REPORTED_DIFFERENCES:
+            self.differences.append(message)
+
+
+class ReverseConverter:
+    """把 Bestdori JSON 的动作转回剧本文本。
+
+    说话人取动作的 name，name 为空时按 characters 反查角色名；旁白原样输出，台词写成
+    “名字：「内容」”，引号样式由 quote_style 指定（None 表示不加引号）。动作之间用空行分隔，
+    正向转换时空行会结束当前动作，因此每个动作都能单独还原。
+    """
+
+    def __init__(self, converter: TextConverter, narrator_name: Optional[str] = None,
+                 quote_style: Optional[Tuple[str, str]] = DEFAULT_QUOTE_STYLE, separator: str = "："):
+        self.converter = converter
+        if narrator_name is None: narrator_name = converter.parsing_config.get("default_narrator_name", " ")
+        self.narrator_name = narrator_name
+        self.open_quote, self.close_quote = quote_style or ("", "")
+        self.separator = separator
+
+    def action_to_text(self, action: Dict[str, Any]) -> str:
+        """动作的结构无法识别（如 characters 不是角色 ID 列表）时抛出 ValueError"""
+        body = str(action.get("body") or "")
+        name = action.get("name")
+        if not isinstance(name, str) or not name.strip():
+            characters = action.get("characters") or ()
+            if not isinstance(characters, (list, tuple)) or not all(isinstance(i, int) for i in characters):
+                raise ValueError(f"动作的 characters 不是角色 ID 列表: {characters!r}")
+            name = self.converter.speaker_index.name_for(characters) or self.narrator_name
+        if name == self.narrator_name or not name.strip():
+            return body
+        return f"{name}{self.separator}{self.open_quote}{body}{self.close_quote}"
+
+    def write_text(self, fp: TextIO, output_fp: TextIO) -> int:
+        """从 JSON 文本流读取动作并写出剧本文本，返回写出的动作数。无法表示为文本的非 talk 动作会被跳过"""
+        count = 0
+        for action in ActionStreamReader(fp):
+            if not isinstance(action, dict) or action.get("type", "talk") != "talk":
+                continue
+            output_fp.write("\n\n" if count else "")
+            output_fp.write(self.action_to_text(action))
+            count += 1
+        if count:
+            output_fp.write("\n")
+        return count
+
+    def convert_file(self, input_path: str, output_path: str, atomic: bool = False) -> int:
+        with open(input_path, 'r', encoding='utf-8-sig') as fp:
+            with open_output(output_path, atomic) as output_fp:
+                return self.write_text(fp, output_fp)
+
+    def check_action(self, action: Any, selected_quote_pairs: QuotePairs) -> Optional[str]:
+        """把单个动作转为文本后再转换回来，返回差异说明；能完整还原时返回 None"""
+        if not isinstance(action, dict):
+            return "不是 JSON 对象"
+        if action.get("type", "talk") != "talk":
+            return f"类型为 {action.get('type')!r} 的动作无法表示为文本"
+        try:
+            text = self.action_to_text(action)
+        except ValueError as e:
+            return str(e)
+        results = list(self.converter.iter_actions(text.split('\n'), self.narrator_name, selected_quote_pairs))
+        if not results:
+            return "还原后丢失"
+        if len(results) > 1:
+            return f"还原后拆分为 {len(results)} 个动作"
+        restored = _action_dict(results[0])
+        # 原文档中没有的字段按默认值处理，不算差异
+        differences = [f"{key}: {value!r} → {restored.get(key)!r}"
+                       for key, value in action.items() if restored.get(key) != value]
+        return "; ".join(differences) or None
+
+    def verify_file(self, input_path: str, selected_quote_pairs: QuotePairs) -> RoundTripReport:
+        """逐个动作校验 JSON → 文本 → JSON 的往返转换，报告无法还原的动作"""
+        report = RoundTripReport(input_path)
+        quote_rules = QuoteRules.coerce(selected_quote_pairs)
+        with open(input_path, 'r', encoding='utf-8-sig') as fp:
+            reader = ActionStreamReader(fp)
+            for index, action in enumerate(reader):
+                report.actions += 1
+                problem = self.check_action(action, quote_rules)
+                if problem:
+                    report.add(f"动作 #{index}: {problem}")
+        for key, value in reader.header.items():
+            if _HEADER_DEFAULTS.get(key, object()) != value:
+                report.add(f"顶层字段 {key}: {value!r} 无法保存在文本中")
+        return report
+
+
+@dataclass(frozen=True)
+class ReverseOptions:
+    """一次反向转换中所有文件共用的参数，在工作进程启动时传入一次"""
+    config_path: str
+    narrator_name: Optional[str]
+    quote_style: Optional[Tuple[str, str]]
+    separator: str
+    verify_rules: Optional[QuoteRules] = None
+
+
+_worker_reverse: Optional[ReverseConverter] = None
+_worker_options: Optional[ReverseOptions] = None
+
+
+def _init_worker(options: ReverseOptions):
+    global _worker_reverse, _worker_options
+    _worker_options = options
+    converter = TextConverter(ConfigManager(options.config_path))
+    _worker_reverse = ReverseConverter(converter, options.narrator_name, options.quote_style, options.separator)
+
+
+def _reverse_task(task: Tuple[str, Optional[str]]) -> Tuple[str, bool, str, Optional[RoundTripReport]]:
+    """转换单个文件（output_path 为 None 时不写出），指定了 verify_rules 时同时做往返校验"""
+    input_path, output_path = task
+    try:
+        if output_path is not None:
+            _worker_reverse.convert_file(input_path, output_path, atomic=True)
+        report = None
+        if _worker_options.verify_rules is not None:
+            report = _worker_reverse.verify_file(input_path, _worker_options.verify_rules)
+        return input_path, True, "Success", report
+    except (OSError, ValueError, TypeError, AttributeError, KeyError) as e:
+        # 结构异常的输入只记为该文件失败，不中断整批
+        return input_path, False, str(e) or type(e).__name__, None
+
+
+def reverse_batch(tasks: List[Tuple[str, Optional[str]]], options: ReverseOptions,
+                  jobs: int = 1) -> Iterator[Tuple[str, bool, str, Optional[RoundTripReport]]]:
+    """批量反向转换和校验，按任务顺序产出 (输入路径, 是否成功, 信息, 校验结果)"""
+    if jobs <= 1:
+        _init_worker(options)
+        yield from map(_reverse_task, tasks)
+        return
+    chunksize = max(1, min(64, len(tasks) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(options,)) as executor:
+        yield from executor.map(_reverse_task, tasks, chunksize=chunksize)
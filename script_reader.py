@@ -0,0 +1,205 @@
+# 剧本输入层：检测文件编码，按块增量解码并按行切分，不在内存中构建整个文件的字符串或行列表。
+#
+# 大文件通过 mmap 映射，只有当前正在解码的块会被读入内存。支持带 BOM 的 UTF-8/UTF-16/UTF-32，
+# 没有 BOM 且不是合法 UTF-8 的文件按 GB18030 或 Shift-JIS（CP932）处理。
+
+import codecs
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, TypeVar, Union
+
+# 每次解码的字节数
+CHUNK_SIZE = 1 << 20
+# 不小于该大小的文件使用 mmap，更小的文件直接读入
+MMAP_THRESHOLD = 1 << 20
+# 编码检测只看文件开头这么多字节
+DETECT_SAMPLE_SIZE = 64 * 1024
+
+# UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头，必须先检查
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# Shift-JIS 中的平假名（0x82 0x9F-0xF1）和片假名（0x83 0x40-0x96）。日文文本中很常见，
+# 而 GB18030 中以 0x82、0x83 开头的都是生僻字
+_SJIS_KANA = re.compile(rb'\x82[\x9f-\xf1]|\x83[\x40-\x96]')
+_ASCII_BYTES = bytes(range(0x80))
+_KANA_RATIO_THRESHOLD = 0.1
+
+T = TypeVar("T")
+
+
+def _decodes(data: bytes, encoding: str, complete: bool) -> bool:
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(data, final=complete)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_encoding(data: bytes, complete: bool = True) -> str:
+    """根据文件开头的字节判断编码。complete 为 False 表示 data 只是文件的一部分，末尾可能截断了多字节字符"""
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    if _decodes(data, "utf-8", complete):
+        return "utf-8"
+    # GB18030 和 CP932 都能解码对方的大部分字节序列，用假名出现的比例区分日文和中文
+    high_bytes = len(data.translate(None, _ASCII_BYTES))
+    kana_bytes = 2 * len(_SJIS_KANA.findall(data))
+    if high_bytes and kana_bytes / high_bytes >= _KANA_RATIO_THRESHOLD:
+        candidates = ("cp932", "gb18030")
+    else:
+        candidates = ("gb18030", "cp932")
+    for encoding in candidates:
+        if _decodes(data, encoding, complete):
+            return encoding
+    # 都无法解码时按 UTF-8 处理，由解码时抛出的错误说明具体位置
+    return "utf-8"
+
+
+@dataclass(frozen=True)
+class MemoryScript:
+    """已经在内存中的剧本（如从压缩包中读出的成员），可以代替文件路径传给 ScriptReader 和各个转换函数"""
+    name: str
+    data: bytes
+
+    def __str__(self) -> str:
+        return self.name
+
+
+# 剧本来源：文件路径或内存中的剧本
+ScriptSource = Union[str, MemoryScript]
+
+
+def script_size(source: ScriptSource) -> int:
+    """剧本的字节数"""
+    if isinstance(source, MemoryScript):
+        return len(source.data)
+    return os.path.getsize(source)
+
+
+class ScriptReader:
+    """只读打开剧本文件，逐行产出解码后的文本。encoding 为 None 时根据文件开头自动检测"""
+
+    def __init__(self, path: ScriptSource, encoding: Optional[str] = None):
+        if isinstance(path, MemoryScript):
+            self.path = path.name
+            self._file = None
+            self._data = path.data
+        else:
+            self.path = path
+            self._file = open(path, 'rb')
+            try:
+                size = os.fstat(self._file.fileno()).st_size
+                if size >= MMAP_THRESHOLD:
+                    self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                    if hasattr(mmap, "MADV_SEQUENTIAL"):
+                        self._data.madvise(mmap.MADV_SEQUENTIAL)
+                else:
+                    self._data = self._file.read()
+            except BaseException:
+                self._file.close()
+                raise
+        self.size = len(self._data)
+        self._detected = encoding is None
+        self._error_offset: Optional[int] = None
+        if encoding is None:
+            encoding = detect_encoding(self._data[:DETECT_SAMPLE_SIZE], self.size <= DETECT_SAMPLE_SIZE)
+        self.encoding = encoding
+
+    def __enter__(self) -> "ScriptReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file is not None:
+            self._file.close()
+
+    def iter_lines(self) -> Iterator[str]:
+        """逐行产出文本（不含换行符）。与文本模式读取文件一致，\\r\\n、\\r 和 \\n 都视为换行"""
+        for block in self.iter_text_blocks():
+            yield from block.split("\n")
+
+    def iter_text_blocks(self) -> Iterator[str]:
+        """每解码一块产出一段文本，供批量处理。每段由完整的行组成，行之间以 \\n 分隔，末尾不含换行符"""
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        data = self._data
+        size = self.size
+        # 解码完的块立即从映射中释放，进程的常驻内存不随文件大小增长（页面仍在系统的文件缓存中）
+        release = (isinstance(data, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED")
+                   and CHUNK_SIZE % mmap.PAGESIZE == 0)
+        pending = ""
+        for offset in range(0, size, CHUNK_SIZE):
+            final = offset + CHUNK_SIZE >= size
+            try:
+                text = decoder.decode(data[offset:offset + CHUNK_SIZE], final=final)
+            except UnicodeDecodeError as e:
+                # e.start 相对于解码器缓冲的不完整字符加上本块，与实际位置最多相差几个字节
+                self._error_offset = offset + e.start
+                raise
+            if release:
+                data.madvise(mmap.MADV_DONTNEED, offset, min(CHUNK_SIZE, size - offset))
+            if pending:
+                text = pending + text
+            carry = ""
+            if "\r" in text:
+                # 块末尾的 \r 可能与下一块开头的 \n 组成一个换行，留到下一块再处理
+                if not final and text.endswith("\r"):
+                    text, carry = text[:-1], "\r"
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            end = text.rfind("\n")
+            if end >= 0:
+                yield text[:end]
+            pending = text[end + 1:] + carry
+        if pending:
+            yield pending
+
+    def redetect_encoding(self) -> bool:
+        """开头的采样是合法的 UTF-8、后面却解码失败时，连同出错的位置重新检测编码。返回编码是否改变"""
+        if not self._detected or self._error_offset is None:
+            return False
+        sample = self._data[:self._error_offset + DETECT_SAMPLE_SIZE]
+        encoding = detect_encoding(sample, len(sample) >= self.size)
+        self._error_offset = None
+        if encoding == self.encoding:
+            return False
+        self.encoding = encoding
+        return True
+
+
+def with_encoding_fallback(reader: ScriptReader, convert: Callable[[ScriptReader], T]) -> T:
+    """运行 convert(reader)；自动检测的编码在文件后部解码失败时，重新检测编码并从头再运行一次"""
+    try:
+        return convert(reader)
+    except UnicodeDecodeError:
+        if not reader.redetect_encoding():
+            raise
+        return convert(reader)
+
+
+def read_prefix(path: str, max_chars: int, encoding: Optional[str] = None) -> str:
+    """只读取所需的字节，返回文件开头的 max_chars 个字符（换行统一为 \\n），用于预览"""
+    chunk_size = max(max_chars * 4, 4096)
+    with open(path, 'rb') as f:
+        data = f.read(chunk_size)
+        at_end = len(data) < chunk_size
+        if encoding is None:
+            encoding = detect_encoding(data, at_end)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        text = decoder.decode(data, final=at_end)
+        # \r\n 合并为一个字符后可能不够，继续读取
+        while not at_end and len(text.replace("\r\n", "\n")) <= max_chars:
+            data = f.read(chunk_size)
+            at_end = len(data) < chunk_size
+            text += decoder.decode(data, final=at_end)
+    return text.replace("\r\n", "\n").replace("\r", "\n")[:max_chars]
@@ -0,0 +1,335 @@
+# 本地 HTTP 转换服务：其他工具通过 HTTP 调用转换，无需启动 GUI 或复制 TextConverter。
+#
+# 只依赖标准库 asyncio。事件循环只负责收发请求，转换在预先初始化好转换器的进程池中执行，
+# 事件循环不会被 CPU 密集的转换阻塞。
+#
+#   POST /convert        {"text": "...", "narrator": "旁白", "quote_pairs": {"「": "」"}, "pretty": false}
+#   POST /convert/batch  {"items": [{"text": "..."}, ...], "narrator": ..., "quote_pairs": ..., "pretty": ...}
+#   GET  /health
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+from converter import ConfigManager, QuoteRules, TextConverter, build_quote_rules, parse_quote_pairs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BODY_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_BATCH_ITEMS = 256
+DEFAULT_MAX_PENDING = 256
+# 请求头读取超时和空闲连接超时，防止慢速客户端长期占用连接
+HEADER_TIMEOUT = 10.0
+BODY_TIMEOUT = 30.0
+IDLE_TIMEOUT = 60.0
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout",
+    411: "Length Required", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 501: "Not Implemented", 503: "Service Unavailable",
+}
+_ROUTES = {"/convert": "POST", "/convert/batch": "POST", "/health": "GET"}
+
+
+class RequestError(Exception):
+    """请求不合法，以指定状态码返回给客户端"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# 每个工作进程各自持有一个转换器，启动时初始化一次
+_worker_converter: Optional[TextConverter] = None
+
+
+def _init_worker(config_path: str):
+    global _worker_converter
+    _worker_converter = TextConverter(ConfigManager(config_path))
+
+
+def _warm_up() -> int:
+    # 短暂占用工作进程，确保预热时每个进程都被启动
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _convert_task(text: str, narrator_name: str, quote_rules: QuoteRules, pretty: bool) -> bytes:
+    return _worker_converter.convert_text_to_json_format(text, narrator_name, quote_rules, pretty).encode('utf-8')
+
+
+def _json_bytes(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+class ConversionService:
+    """HTTP 转换服务。start() 后在事件循环中运行，close() 停止并关闭进程池"""
+
+    def __init__(self, config_path: str = "config.yaml", workers: Optional[int] = None,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+                 max_concurrency: Optional[int] = None, max_pending: int = DEFAULT_MAX_PENDING):
+        self.config_path = config_path
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_body_bytes = max_body_bytes
+        self.max_batch_items = max_batch_items
+        # 同时提交给进程池的转换数，略多于进程数以免进程空闲
+        self.max_concurrency = max_concurrency or self.workers * 2
+        # 正在处理（包括排队）的请求数上限，超过后直接返回 503
+        self.max_pending = max_pending
+
+        config_manager = ConfigManager(config_path)
+        self.default_narrator = config_manager.get_parsing_config().get("default_narrator_name", " ")
+        # 请求中指定的引号对沿用配置中的嵌套和逐行去除设置
+        self.default_quote_rules = build_quote_rules(config_manager)
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._pending = 0
+        self.requests = 0
+        self.rejected = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.config_path,))
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> int:
+        """启动进程池并开始监听，返回实际端口（port 为 0 时由系统分配）"""
+        loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._executor = self._new_executor()
+        # 预热：提前启动全部工作进程并加载配置，第一个请求不承担启动开销
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)))
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"转换服务已启动: http://{host}:{port}，{self.workers} 个工作进程")
+        return port
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # 关闭仍然打开的连接，等待进行中的请求处理完再关闭进程池
+            for writer in self._connections.values():
+                writer.close()
+            if self._connections:
+                await asyncio.wait(list(self._connections), timeout=BODY_TIMEOUT)
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _convert(self, text: str, narrator_name: str, quote_rules: QuoteRules, pretty: bool) -> bytes:
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(executor, _convert_task, text, narrator_name, quote_rules, pretty)
+            except BrokenProcessPool:
+                # 工作进程意外退出，重建进程池，后续请求不受影响
+                if self._executor is executor:
+                    logger.error("工作进程异常退出，重建进程池")
+                    self._executor = self._new_executor()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def _parse_options(self, item: Any, defaults: Dict[str, Any]) -> Tuple[str, str, QuoteRules, bool]:
+        if not isinstance(item, dict):
+            raise RequestError(400, "请求必须是 JSON 对象")
+        text = item.get("text")
+        if not isinstance(text, str):
+            raise RequestError(400, "缺少字符串字段 text")
+
+        narrator_name = item.get("narrator", defaults.get("narrator"))
+        if narrator_name is None:
+            narrator_name = self.default_narrator
+        elif not isinstance(narrator_name, str):
+            raise RequestError(400, "narrator 必须是字符串")
+
+        quote_pairs = item.get("quote_pairs", defaults.get("quote_pairs"))
+        if quote_pairs is None:
+            quote_rules = self.default_quote_rules
+        elif isinstance(quote_pairs, list):
+            # 与命令行 --quote 相同，也接受 ["「」", "“”"] 的写法
+            if not all(isinstance(pair, str) for pair in quote_pairs):
+                raise RequestError(400, "quote_pairs 列表中的每一项必须是字符串")
+            try:
+                quote_pairs = parse_quote_pairs(quote_pairs)
+            except ValueError as e:
+                raise RequestError(400, str(e))
+        elif isinstance(quote_pairs, dict):
+            if not all(isinstance(k, str) and isinstance(v, str) and len(k) == 1 and len(v) == 1
+                       for k, v in quote_pairs.items()):
+                raise RequestError(400, "quote_pairs 的键和值必须是单个字符")
+        else:
+            raise RequestError(400, "quote_pairs 必须是对象或字符串列表")
+        if quote_pairs is not None:
+            configured = self.default_quote_rules
+            quote_rules = QuoteRules(tuple(quote_pairs.items()), configured.nested, configured.strip_lines)
+
+        pretty = item.get("pretty", defaults.get("pretty", False))
+        if not isinstance(pretty, bool):
+            raise RequestError(400, "pretty 必须是布尔值")
+        return text, narrator_name, quote_rules, pretty
+
+    async def _handle_convert(self, request: Any) -> bytes:
+        return await self._convert(*self._parse_options(request, {}))
+
+    async def _handle_batch(self, request: Any) -> bytes:
+        if not isinstance(request, dict) or not isinstance(request.get("items"), list):
+            raise RequestError(400, "缺少数组字段 items")
+        items = request["items"]
+        if len(items) > self.max_batch_items:
+            raise RequestError(413, f"单次批量请求最多 {self.max_batch_items} 项")
+
+        async def convert_item(item) -> bytes:
+            # 单项出错只影响该项的结果
+            try:
+                return await self._convert(*self._parse_options(item, request))
+            except RequestError as e:
+                return _json_bytes({"error": str(e)})
+            except BrokenProcessPool:
+                return _json_bytes({"error": "工作进程异常退出"})
+
+        results = await asyncio.gather(*(convert_item(item) for item in items))
+        # 各项已是编码好的 JSON，直接拼接，不再重新解析
+        return b'{"results":[' + b','.join(results) + b']}'
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, bytes]:
+        expected_method = _ROUTES.get(path)
+        if expected_method is None:
+            return 404, _json_bytes({"error": f"未知路径: {path}"})
+        if method != expected_method:
+            return 405, _json_bytes({"error": f"{path} 只支持 {expected_method}"})
+        if path == "/health":
+            return 200, _json_bytes({"status": "ok", "workers": self.workers, "pending": self._pending,
+                                     "requests": self.requests, "rejected": self.rejected})
+
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            return 503, _json_bytes({"error": "服务繁忙，请稍后重试"})
+        self._pending += 1
+        self.requests += 1
+        try:
+            try:
+                request = json.loads(body)
+            except (UnicodeDecodeError, ValueError) as e:
+                raise RequestError(400, f"请求体不是合法的 JSON: {e}")
+            if path == "/convert":
+                return 200, await self._handle_convert(request)
+            return 200, await self._handle_batch(request)
+        except RequestError as e:
+            return e.status, _json_bytes({"error": str(e)})
+        except BrokenProcessPool:
+            return 500, _json_bytes({"error": "工作进程异常退出"})
+        except Exception as e:
+            logger.exception("处理请求失败")
+            return 500, _json_bytes({"error": str(e)})
+        finally:
+            self._pending -= 1
+
+    async def _read_request(self, reader: asyncio.StreamReader, timeout: float) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+        """读取一个请求，连接关闭时返回 None"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise RequestError(431, "请求头过大")
+        request_line, *header_lines = head.decode('latin-1').split("\r\n")
+        parts = request_line.split(" ")
+        if len(parts) != 3:
+            raise RequestError(400, "请求行格式错误")
+        method, target, version = parts
+        headers = {}
+        for line in header_lines:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        if "transfer-encoding" in headers:
+            raise RequestError(501, "不支持分块传输，请提供 Content-Length")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise RequestError(400, "Content-Length 格式错误")
+        if length < 0:
+            raise RequestError(400, "Content-Length 格式错误")
+        if length > self.max_body_bytes:
+            # 不读取超限的请求体，直接拒绝并关闭连接
+            raise RequestError(413, f"请求体超过上限 {self.max_body_bytes} 字节")
+        if method == "POST" and "content-length" not in headers:
+            raise RequestError(411, "POST 请求必须提供 Content-Length")
+        body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b""
+        return method, target.split("?", 1)[0], version, headers, body
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: bytes, keep_alive: bool):
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        timeout = HEADER_TIMEOUT
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader, timeout)
+                except RequestError as e:
+                    await self._send(writer, e.status, _json_bytes({"error": str(e)}), keep_alive=False)
+                    break
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                status, payload = await self._dispatch(method, path, body)
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+                # 复用的连接允许更长的空闲时间
+                timeout = IDLE_TIMEOUT
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._connections.pop(task, None)
+
+
+async def serve(config_path: str = "config.yaml", host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                **service_options):
+    """启动服务并一直运行，直到被取消"""
+    service = ConversionService(config_path, **service_options)
+    loop = asyncio.get_running_loop()
+    serve_task = asyncio.current_task()
+    try:
+        # 收到 SIGTERM 时正常退出并关闭进程池，否则工作进程会成为孤儿进程
+        loop.add_signal_handler(signal.SIGTERM, serve_task.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass
+    try:
+        await service.start(host, port)
+        await service.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await service.close()
@@ -0,0 +1,322 @@
+# 输出层：转换结果的几种写出方式。
+#
+# - plain：直接打开、写入、关闭，与以往的行为一致
+# - atomic：先写同目录下的临时文件并 fsync，再重命名替换目标文件，崩溃后不会留下写了一半的 JSON
+# - buffered：同样经临时文件原子替换，但攒够一组文件后才统一 fsync 和重命名，减少网络文件系统上的往返
+# - jsonl / zip：把整批结果打包为一个 JSON Lines 文件或 zip 压缩包（每个剧本一个条目），避免大量小文件
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import ContextManager, Dict, Iterator, List, Optional, TextIO, Tuple
+
+SINK_KINDS = ("plain", "atomic", "buffered", "jsonl", "zip")
+# 把整批结果写入一个文件的方式，输出路径只用于确定条目名
+BUNDLE_KINDS = ("jsonl", "zip")
+# buffered 每攒够这么多个文件统一 fsync 一次
+FSYNC_GROUP_SIZE = 64
+
+
+def _fsync_directory(directory: str):
+    """重命名后 fsync 所在目录，使目录项也落盘。不支持对目录 fsync 的平台上忽略"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _temp_path_for(path: str) -> Tuple[int, str]:
+    """在目标文件同目录下创建临时文件，权限与目标文件一致（新文件为 0644）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    # mkstemp 创建的文件仅所有者可读
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    os.chmod(tmp_path, mode)
+    return fd, tmp_path
+
+
+def _unlink_quietly(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+@contextmanager
+def atomic_open(path: str, encoding: str = 'utf-8', fsync: bool = False):
+    """原子写入：先写入同目录下的临时文件，完成后再替换目标文件，读者不会看到写了一半的内容。
+
+    fsync 为 True 时在替换前把临时文件刷到磁盘，替换后再 fsync 目录，系统崩溃后也只会看到旧文件或完整的新文件。
+    """
+    fd, tmp_path = _temp_path_for(path)
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if fsync:
+            _fsync_directory(os.path.dirname(os.path.abspath(path)))
+    except BaseException:
+        _unlink_quietly(tmp_path)
+        raise
+
+
+class OutputSink(ABC):
+    """转换结果的写出目标。每个输出文档通过 open(output_path) 写入，整批结束后调用 close()。
+
+    shared 为 True 的写出方式可以在每个工作进程中各自创建实例直接写出；
+    否则只能在主进程中使用，工作进程先把结果写入 MemorySink，再交给主进程写出。
+    """
+
+    shared = True
+    # 为 True 时输出必须是紧凑 JSON（如 JSON Lines 每个文档只能占一行）
+    requires_compact = False
+
+    @abstractmethod
+    def open(self, output_path: str) -> ContextManager[TextIO]:
+        """返回写入一个输出文档的文本流"""
+
+    def write(self, output_path: str, text: str):
+        """写入一个已经编码好的输出文档"""
+        with self.open(output_path) as f:
+            f.write(text)
+
+    def write_file(self, output_path: str, source_path: str):
+        """把已有文件（如缓存条目）的内容作为输出文档写出"""
+        with open(source_path, 'r', encoding='utf-8') as src, self.open(output_path) as dst:
+            shutil.copyfileobj(src, dst)
+
+    def close(self):
+        """完成整批写出"""
+
+    def abort(self):
+        """批处理出错时调用，默认与 close 相同，已经写出的文档保留"""
+        self.close()
+
+    def __enter__(self) -> "OutputSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class FileSink(OutputSink):
+    """直接写入目标文件"""
+
+    def open(self, output_path: str) -> ContextManager[TextIO]:
+        return open(output_path, 'w', encoding='utf-8')
+
+    def write_file(self, output_path: str, source_path: str):
+        shutil.copyfile(source_path, output_path)
+
+
+class AtomicFileSink(OutputSink):
+    """每个文件都经临时文件写入并 fsync 后原子替换"""
+
+    def open(self, output_path: str) -> ContextManager[TextIO]:
+        return atomic_open(output_path, fsync=True)
+
+
+class BufferedFileSink(OutputSink):
+    """原子替换，但 fsync 按组进行：写好的临时文件攒够 group_size 个后统一 fsync、重命名，再对涉及的目录各 fsync 一次。
+
+    读者同样不会看到写了一半的文件；崩溃时最多丢失最近一组还未重命名的文件（只留下以 . 开头的临时文件）。
+    """
+
+    shared = False
+
+    def __init__(self, group_size: int = FSYNC_GROUP_SIZE):
+        self.group_size = max(1, group_size)
+        self._pending: List[Tuple[str, str]] = []
+
+    @contextmanager
+    def open(self, output_path: str) -> Iterator[TextIO]:
+        fd, tmp_path = _temp_path_for(output_path)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                yield f
+        except BaseException:
+            _unlink_quietly(tmp_path)
+            raise
+        self._pending.append((tmp_path, output_path))
+        if len(self._pending) >= self.group_size:
+            self.flush()
+
+    def flush(self):
+        """把当前这一组临时文件刷到磁盘并替换目标文件"""
+        pending, self._pending = self._pending, []
+        for tmp_path, _ in pending:
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        directories = set()
+        for tmp_path, output_path in pending:
+            os.replace(tmp_path, output_path)
+            directories.add(os.path.dirname(os.path.abspath(output_path)))
+        for directory in directories:
+            _fsync_directory(directory)
+
+    def close(self):
+        self.flush()
+
+
+class _BundleSink(OutputSink):
+    """把整批结果写入一个文件。先写临时文件，close() 时原子替换，abort() 时删除"""
+
+    shared = False
+
+    def __init__(self, bundle_path: str, root: Optional[str] = None):
+        self.bundle_path = bundle_path
+        self.root = root
+        self._fd, self._tmp_path = _temp_path_for(bundle_path)
+        self._closed = False
+
+    def entry_name(self, output_path: str) -> str:
+        """条目名：输出路径相对于 root 的路径，统一使用 / 分隔"""
+        name = os.path.relpath(output_path, self.root) if self.root else os.path.basename(output_path)
+        return name.replace(os.sep, "/")
+
+    def _finish(self):
+        """关闭底层文件"""
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._finish()
+        except BaseException:
+            _unlink_quietly(self._tmp_path)
+            raise
+        os.replace(self._tmp_path, self.bundle_path)
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._finish()
+        finally:
+            _unlink_quietly(self._tmp_path)
+
+
+class JsonLinesSink(_BundleSink):
+    """JSON Lines：每行一个对象 {"path": 条目名, "result": 转换结果}"""
+
+    requires_compact = True
+
+    def __init__(self, bundle_path: str, root: Optional[str] = None):
+        super().__init__(bundle_path, root)
+        self._file = os.fdopen(self._fd, 'w', encoding='utf-8', newline='')
+
+    @contextmanager
+    def open(self, output_path: str) -> Iterator[TextIO]:
+        # 先写入内存，文档完整后才追加为一行，出错时不会留下半行
+        buffer = io.StringIO()
+        yield buffer
+        self.write(output_path, buffer.getvalue())
+
+    def write(self, output_path: str, text: str):
+        if "\n" in text:
+            raise ValueError("JSON Lines 输出需要紧凑格式的 JSON")
+        path = json.dumps(self.entry_name(output_path), ensure_ascii=False)
+        self._file.write(f'{{"path":{path},"result":{text}}}\n')
+
+    def write_file(self, output_path: str, source_path: str):
+        with open(source_path, 'r', encoding='utf-8') as f:
+            self.write(output_path, f.read())
+
+    def _finish(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class ZipSink(_BundleSink):
+    """zip 压缩包，每个剧本一个条目"""
+
+    def __init__(self, bundle_path: str, root: Optional[str] = None,
+                 compression: int = zipfile.ZIP_DEFLATED):
+        super().__init__(bundle_path, root)
+        self._file = os.fdopen(self._fd, 'w+b')
+        self._zip = zipfile.ZipFile(self._file, 'w', compression=compression)
+
+    @contextmanager
+    def open(self, output_path: str) -> Iterator[TextIO]:
+        # 与 JsonLinesSink 相同，先写入内存，转换成功后才写入条目：
+        # 出错时不会留下空的或截断的条目，换编码重试也不会产生同名的重复条目
+        buffer = io.StringIO()
+        yield buffer
+        self.write(output_path, buffer.getvalue())
+
+    def write(self, output_path: str, text: str):
+        self._zip.writestr(self.entry_name(output_path), text.encode('utf-8'))
+
+    def _finish(self):
+        self._zip.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class MemorySink(OutputSink):
+    """把输出文档保存在内存中，供工作进程把结果交给主进程写出"""
+
+    def __init__(self):
+        self.documents: Dict[str, str] = {}
+
+    @contextmanager
+    def open(self, output_path: str) -> Iterator[TextIO]:
+        buffer = io.StringIO()
+        yield buffer
+        self.documents[output_path] = buffer.getvalue()
+
+    def write(self, output_path: str, text: str):
+        self.documents[output_path] = text
+
+    def take(self) -> Dict[str, str]:
+        """取出并清空已保存的文档"""
+        documents, self.documents = self.documents, {}
+        return documents
+
+
+def is_shared(kind: str) -> bool:
+    """该写出方式能否在工作进程中直接使用"""
+    return kind in ("plain", "atomic")
+
+
+def create_sink(kind: str, bundle_path: Optional[str] = None, root: Optional[str] = None,
+                group_size: int = FSYNC_GROUP_SIZE) -> OutputSink:
+    """根据名称创建写出方式。jsonl 和 zip 需要 bundle_path，条目名为输出路径相对于 root 的路径"""
+    if kind == "plain":
+        return FileSink()
+    if kind == "atomic":
+        return AtomicFileSink()
+    if kind == "buffered":
+        return BufferedFileSink(group_size)
+    if kind in BUNDLE_KINDS:
+        if not bundle_path:
+            raise ValueError(f"输出方式 {kind} 需要指定打包文件路径")
+        return JsonLinesSink(bundle_path, root) if kind == "jsonl" else ZipSink(bundle_path, root)
+    raise ValueError(f"未知的输出方式: {kind}")
@@ -0,0 +1,86 @@
+# 说话人索引：把剧本中的说话人名字映射为角色 ID，支持别名、Unicode NFKC 规范化和大小写折叠。
+
+import logging
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 未命中精确匹配的名字会缓存规范化查找的结果，超过上限时清空，防止长期运行的进程无限增长
+_RESOLVED_CACHE_SIZE = 4096
+_EMPTY: Tuple = ()
+
+
+def normalize_name(name: str) -> str:
+    """规范化说话人名字：NFKC（全角字母数字转半角）、大小写折叠，并合并首尾和中间的空白"""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+class SpeakerIndex:
+    """预先计算好的说话人索引，查找为 O(1)。
+
+    查找顺序：原样的角色名、原样的别名，最后是规范化后的角色名或别名。
+    映射表构建后不再修改，配置变化时整体重建后替换，其他线程只会看到旧索引或新索引。
+    """
+
+    def __init__(self, character_mapping: Dict[str, List[int]],
+                 character_aliases: Optional[Dict[str, List[str]]] = None):
+        self.character_mapping = character_mapping
+        self.character_aliases = character_aliases or {}
+        # 所有 ID 列表都转为元组，动作之间共享同一个不可变对象，也不会与配置中的列表互相别名
+        exact: Dict[str, Tuple[int, ...]] = {
+            name: tuple(ids) if ids else _EMPTY for name, ids in character_mapping.items()
+        }
+        aliases: Dict[str, Tuple[int, ...]] = {}
+        for canonical, alias_names in self.character_aliases.items():
+            ids = exact.get(canonical)
+            if ids is None:
+                logger.warning(f"别名指向的角色 '{canonical}' 不在角色映射中，已忽略")
+                continue
+            for alias in alias_names or ():
+                alias = str(alias)
+                if alias in exact or aliases.get(alias, ids) != ids:
+                    logger.warning(f"别名 '{alias}' 与其他角色冲突，已忽略")
+                    continue
+                aliases[alias] = ids
+
+        # 规范化后的名字：角色名优先于别名，规范化后撞名时保留先出现的
+        normalized: Dict[str, Tuple[int, ...]] = {}
+        for names in (exact, aliases):
+            for name, ids in names.items():
+                normalized.setdefault(normalize_name(name), ids)
+
+        self._exact = {**aliases, **exact}
+        self._normalized = normalized
+        self._resolved: Dict[str, Tuple[int, ...]] = {}
+        # 角色 ID 到角色名的反向索引，只在 JSON 转回文本时用到，首次使用时构建
+        self._names_by_ids: Optional[Dict[Tuple[int, ...], str]] = None
+
+    @property
+    def names(self) -> Iterable[str]:
+        """索引中原样收录的全部名字（角色名和别名）"""
+        return self._exact.keys()
+
+    def lookup(self, name: str) -> Tuple[int, ...]:
+        """返回说话人对应的角色 ID 元组，未知的说话人返回空元组"""
+        ids = self._exact.get(name)
+        if ids is not None:
+            return ids
+        ids = self._resolved.get(name)
+        if ids is not None:
+            return ids
+        ids = self._normalized.get(normalize_name(name), _EMPTY)
+        if len(self._resolved) >= _RESOLVED_CACHE_SIZE:
+            self._resolved = {}
+        self._resolved[name] = ids
+        return ids
+
+    def name_for(self, characters: Iterable[int]) -> Optional[str]:
+        """根据角色 ID 反查角色名。多个角色名对应相同的 ID 时取映射中先出现的，找不到时返回 None"""
+        if self._names_by_ids is None:
+            names_by_ids: Dict[Tuple[int, ...], str] = {}
+            for name, ids in self.character_mapping.items():
+                if ids:
+                    names_by_ids.setdefault(tuple(ids), name)
+            self._names_by_ids = names_by_ids
+        return self._names_by_ids.get(tuple(characters))
@@ -0,0 +1,53 @@
+# 差分测试共用的剧本语料和转换器。各条语料覆盖 CRLF、多行引号、连续空行和只含空白的行等切分边界，
+# random_script 再把这些片段随机拼接，参考结果一律取 TextConverter.convert_text_to_json_format 的输出。
+
+import random
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from converter import ConfigManager, TextConverter  # noqa: E402
+
+REPO_CONFIG = Path(__file__).resolve().parent.parent / "config.yaml"
+
+SCRIPTS = {
+    "crlf": "户山香澄：「今天\r\n也一起练习吧」\r\n\r\n旁白\r\n市谷有咲：知道啦\r\n",
+    "multiline_quotes": "美竹兰：「第一行\n第二行\n第三行」\n青叶摩卡：『嵌套「引号」』\n\n“英文\n引号”\n",
+    "blank_runs": "\n\n  \n户山香澄：a\n \t \n\n\n旁白\n　\n\n",
+    "no_trailing_newline": "户山香澄：一\n户山香澄：二\n续行\n\n丸山彩：三",
+    "colons": "LOCK:半角冒号\n冰川日菜：全角冒号\n：开头的冒号\n时间是 12:30\n未知角色：谁\n",
+    "speaker_change": "户山香澄：a\n花园多惠：b\n花园多惠：c\n旁白\n\n\n\n花园多惠：d",
+    "whitespace": "　户山香澄：　台词　\n\t\n  旁白  \n\r\n\r\n",
+    "empty": "",
+}
+
+_PIECES = [
+    "户山香澄：「你好」", "市谷有咲：「多行\n台词」", "旁白", "美竹兰：『引号", "还没闭合』", "LOCK:hi",
+    "未知：谁", "：开头", "  ", "\t", "　", "“", "”", "户山香澄：", "12:30", "凑友希那：「一\n\n二」",
+]
+
+
+def random_script(seed: int, pieces: int = 60) -> str:
+    """随机拼接语料片段，换行随机使用 \\n、\\r\\n 和连续空行"""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(pieces):
+        parts.append(rng.choice(_PIECES))
+        parts.append(rng.choice(["\n", "\n", "\r\n", "\n\n", "\n \n\n", "\r\n\r\n"]))
+    return "".join(parts)
+
+
+def all_scripts():
+    """固定语料加若干随机语料，(名字, 文本)"""
+    return list(SCRIPTS.items()) + [(f"random{seed}", random_script(seed)) for seed in range(20)]
+
+
+@pytest.fixture
+def converter(tmp_path) -> TextConverter:
+    """使用仓库 config.yaml 副本的转换器，配置快照写在临时目录中"""
+    shutil.copyfile(REPO_CONFIG, tmp_path / "config.yaml")
+    return TextConverter(ConfigManager(str(tmp_path / "config.yaml")))
@@ -0,0 +1,57 @@
+# 批量引擎的差分测试：iter_actions_bulk 与逐行转换（convert_text_to_json_format）逐字节一致，
+# 包括 ScriptReader 解码块的边界落在 \r\n 中间、多字节字符中间和行中间的情况。
+# 运行：python -m pytest -q tests
+
+import pytest
+
+import script_reader
+from conftest import all_scripts
+from converter import ConversionResult, QuoteRules, build_quote_rules, convert_file
+from encoder import dumps_result
+
+SCRIPTS = all_scripts()
+
+
+def _quote_rules(converter):
+    return {
+        "default": build_quote_rules(converter.config_manager),
+        "nested": build_quote_rules(converter.config_manager, nested=True),
+        "per_line": build_quote_rules(converter.config_manager, nested=True, strip_lines=True),
+        "none": QuoteRules(),
+    }
+
+
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_bulk_matches_line_engine(converter, name, text):
+    assert converter.bulk_supported(None)
+    for rules_name, rules in _quote_rules(converter).items():
+        for narrator in (None, "旁白"):
+            expected = converter.convert_text_to_json_format(text, narrator, rules)
+            result = ConversionResult(actions=list(converter.iter_actions_bulk((text,), narrator, rules)))
+            assert dumps_result(result) == expected, rules_name
+            # 分成多段传入：每段由完整的行组成
+            blocks = text.split('\n')
+            result = ConversionResult(actions=list(converter.iter_actions_bulk(blocks, narrator, rules)))
+            assert dumps_result(result) == expected, rules_name
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 16, 1 << 20])
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_bulk_file_matches_line_engine(converter, monkeypatch, tmp_path, name, text, chunk_size):
+    monkeypatch.setattr(script_reader, "CHUNK_SIZE", chunk_size)
+    path = tmp_path / "in.txt"
+    path.write_bytes(text.encode("utf-8"))
+    expected = converter.convert_text_to_json_format(text)
+    converter.use_bulk_engine = True
+    convert_file(converter, str(path), str(tmp_path / "bulk.json"))
+    converter.use_bulk_engine = False
+    convert_file(converter, str(path), str(tmp_path / "line.json"))
+    assert (tmp_path / "bulk.json").read_text(encoding="utf-8") == expected
+    assert (tmp_path / "line.json").read_text(encoding="utf-8") == expected
+
+
+def test_bulk_engine_in_convert_text(converter):
+    text = "\n\n".join(script for _, script in SCRIPTS)
+    expected = converter.convert_text_to_json_format(text)
+    converter.use_bulk_engine = True
+    assert converter.convert_text_to_json_format(text) == expected
@@ -0,0 +1,30 @@
+# 行内指令查找表：找不到的名字只有在 passthrough 中列出的类型才作为资源 ID。
+# 运行：python -m pytest -q tests
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from directives import DirectiveIndex  # noqa: E402
+
+
+def test_unknown_name_in_empty_table_is_not_resolved():
+    index = DirectiveIndex({"motions": {}, "voices": {}}, Path("."))
+    text, found = index.extract("小明：[motion:smiel]你好[voice:v1]")
+    assert text == "小明：你好"
+    assert found == [("motion", "smiel", None), ("voice", "v1", None)]
+
+
+def test_passthrough_uses_table_first_then_name():
+    index = DirectiveIndex({"motions": {"Smile": "smile01"}, "passthrough": ["motion"]}, Path("."))
+    assert index.lookup("motion", "smile") == "smile01"
+    assert index.lookup("motion", "nod02") == "nod02"
+    assert index.lookup("motion", "") is None
+    assert index.lookup("voice", "v1") is None
+
+
+def test_passthrough_changes_fingerprint():
+    base = {"motions": {}}
+    assert (DirectiveIndex(base, Path(".")).fingerprint()
+            != DirectiveIndex({**base, "passthrough": ["motion"]}, Path(".")).fingerprint())
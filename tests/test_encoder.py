@@ -0,0 +1,66 @@
+# 直接编码器的差分测试：与改动前的 json.dumps(asdict(result)) 逐字节一致，流式写出与 convert_text_to_json_format 一致。
+# 运行：python -m pytest -q tests
+
+import io
+import json
+from dataclasses import asdict
+
+import pytest
+
+import encoder
+from conftest import all_scripts
+from converter import ActionItem, ConversionResult, convert_stream
+from encoder import dumps_result, write_json_stream
+
+SCRIPTS = all_scripts()
+
+
+def _baseline(result: ConversionResult, pretty: bool) -> str:
+    if pretty:
+        return json.dumps(asdict(result), ensure_ascii=False, indent=2)
+    return json.dumps(asdict(result), ensure_ascii=False, separators=(",", ":"))
+
+
+@pytest.fixture(params=[True, False], ids=["orjson-if-installed", "pure-python"])
+def orjson_mode(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(encoder, "ORJSON_ENABLED", False)
+    return request.param
+
+
+@pytest.mark.parametrize("pretty", [True, False], ids=["pretty", "compact"])
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_matches_json_dumps(converter, orjson_mode, name, text, pretty):
+    result = ConversionResult(actions=list(converter.iter_actions(text.split('\n'))))
+    assert dumps_result(result, pretty) == _baseline(result, pretty)
+    assert converter.convert_text_to_json_format(text, pretty=pretty) == _baseline(result, pretty)
+
+
+@pytest.mark.parametrize("pretty", [True, False], ids=["pretty", "compact"])
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_stream_matches_convert_text(converter, name, text, pretty):
+    output = io.StringIO()
+    # 文本模式读取时 \r\n 已转换为 \n
+    convert_stream(converter, io.StringIO(text, newline=None), output, pretty=pretty)
+    assert output.getvalue() == converter.convert_text_to_json_format(text, pretty=pretty)
+
+
+@pytest.mark.parametrize("pretty", [True, False], ids=["pretty", "compact"])
+def test_escaping_and_fields(orjson_mode, pretty):
+    actions = [
+        ActionItem(characters=(1, 2), name='引号"反斜杠\\', body="控制字符\x00\x1f\t\n行分隔 表情\U0001f3b5"),
+        ActionItem(type="talk", delay=3, wait=False, name="", body="", motions=("m",), voices=("v1", "v2"),
+                   close=True),
+        ActionItem(characters=(2 ** 70,), body="超出 64 位的整数"),
+    ]
+    result = ConversionResult(server=1, voice="v", background="bg", bgm="bgm", actions=actions)
+    assert dumps_result(result, pretty) == _baseline(result, pretty)
+    output = io.StringIO()
+    write_json_stream(actions, output, 1, "v", "bg", "bgm", pretty)
+    assert output.getvalue() == _baseline(result, pretty)
+
+
+def test_empty_document(orjson_mode):
+    result = ConversionResult()
+    assert dumps_result(result) == _baseline(result, True)
+    assert dumps_result(result, False) == _baseline(result, False)
@@ -0,0 +1,57 @@
+# 增量转换的差分测试：一系列编辑之后，复用块缓存的结果仍与 convert_text_to_json_format 逐字节一致。
+# 运行：python -m pytest -q tests
+
+import random
+
+import pytest
+
+from conftest import all_scripts
+from converter import build_quote_rules
+from incremental import IncrementalConverter
+
+SCRIPTS = all_scripts()
+
+
+def _edits(text: str, seed: int, count: int = 30):
+    """在随机位置插入、删除或替换一小段文本，依次产出编辑后的文本"""
+    rng = random.Random(seed)
+    snippets = ["\n", "\n\n", "\r\n", " ", "户山香澄：", "「", "」", "旁白", "市谷有咲：改", ":", "　"]
+    for _ in range(count):
+        position = rng.randint(0, len(text))
+        action = rng.random()
+        if action < 0.4:
+            text = text[:position] + rng.choice(snippets) + text[position:]
+        elif action < 0.7:
+            text = text[:position] + text[position + rng.randint(1, 5):]
+        else:
+            text = text[:position] + rng.choice(snippets) + text[position + rng.randint(1, 5):]
+        yield text
+
+
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_edits_match_full_conversion(converter, name, text):
+    incremental = IncrementalConverter(converter)
+    rules = build_quote_rules(converter.config_manager)
+    for edited in [text, *_edits(text, len(name))]:
+        for pretty in (True, False):
+            assert incremental.convert_to_json(edited, None, rules, pretty) == \
+                converter.convert_text_to_json_format(edited, None, rules, pretty)
+
+
+def test_unchanged_blocks_are_not_reparsed(converter):
+    incremental = IncrementalConverter(converter)
+    text = "户山香澄：一\n\n市谷有咲：二\n\n旁白"
+    incremental.convert_to_json(text)
+    incremental.convert_to_json(text.replace("二", "三"))
+    assert (incremental.total_blocks, incremental.reparsed_blocks) == (3, 1)
+
+
+def test_config_change_invalidates_cache(converter):
+    incremental = IncrementalConverter(converter)
+    text = "小明：你好\n\n旁白"
+    incremental.convert_to_json(text)
+    config_manager = converter.config_manager
+    config_manager.config["character_mapping"]["小明"] = [99]
+    config_manager.generation += 1
+    assert incremental.convert_to_json(text) == converter.convert_text_to_json_format(text)
+    assert '"characters": [\n        99\n      ]' in incremental.convert_to_json(text)
@@ -0,0 +1,54 @@
+# 剧本检查的行号：动作中夹有只含指令的行时，问题仍报告在动作的第一行。
+# 运行：python -m pytest -q tests
+
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from converter import ConfigManager, TextConverter  # noqa: E402
+from directives import DirectiveIndex  # noqa: E402
+from lint import lint_lines  # noqa: E402
+
+REPO_CONFIG = Path(__file__).resolve().parent.parent / "config.yaml"
+
+
+def _converter(tmp_path: Path) -> TextConverter:
+    shutil.copyfile(REPO_CONFIG, tmp_path / "config.yaml")
+    converter = TextConverter(ConfigManager(str(tmp_path / "config.yaml")))
+    converter.directives = DirectiveIndex({"motions": {"smile": "smile01"}}, tmp_path)
+    return converter
+
+
+def _lines(diagnostics, code):
+    return [diagnostic.line for diagnostic in diagnostics if diagnostic.code == code]
+
+
+def test_directive_line_inside_multiline_dialogue(tmp_path):
+    script = [
+        "旁白",                # 1
+        "",                    # 2
+        "小明：「第一行",      # 3 未知说话人，引号不成对
+        "[motion:smile]",      # 4 只有指令的行
+        "第二行",              # 5
+        "[motion:smile]",      # 6
+        "第三行",              # 7
+        "",                    # 8
+        "路人：「台词",        # 9
+    ]
+    count, diagnostics = lint_lines(_converter(tmp_path), script)
+    assert count == 3
+    assert _lines(diagnostics, "unknown-speaker") == [3, 9]
+    assert _lines(diagnostics, "unbalanced-quotes") == [3, 9]
+
+
+def test_action_ended_by_speaker_change(tmp_path):
+    script = [
+        "小明：你好",          # 1
+        "[motion:smile]",      # 2
+        "小红：「嗯",          # 3 说话人变化时结束上一个动作
+    ]
+    _, diagnostics = lint_lines(_converter(tmp_path), script)
+    assert _lines(diagnostics, "unknown-speaker") == [1, 3]
+    assert _lines(diagnostics, "unbalanced-quotes") == [3]
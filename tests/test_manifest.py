@@ -0,0 +1,57 @@
+# 任务清单继续运行：输出被破坏或输入被修改的已完成文件要重新处理。
+# 运行：python -m pytest -q tests
+
+import json
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cli  # noqa: E402
+from manifest import JobManifest  # noqa: E402
+
+REPO_CONFIG = Path(__file__).resolve().parent.parent / "config.yaml"
+
+
+def _run(tmp_path: Path, *extra: str) -> int:
+    return cli.main(["convert", str(tmp_path / "in"), "-o", str(tmp_path / "out"), "-j", "1", "--no-cache",
+                     "--config", str(tmp_path / "config.yaml"), "--manifest", str(tmp_path / "job.jsonl"), *extra])
+
+
+def _bodies(path: Path):
+    return [action["body"] for action in json.loads(path.read_text(encoding="utf-8"))["actions"]]
+
+
+def _setup(tmp_path: Path):
+    shutil.copyfile(REPO_CONFIG, tmp_path / "config.yaml")
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "a.txt").write_text("小明：第一版\n", encoding="utf-8")
+    (tmp_path / "in" / "b.txt").write_text("旁白\n", encoding="utf-8")
+    assert _run(tmp_path) == 0
+
+
+def test_resume_reconverts_edited_input(tmp_path):
+    _setup(tmp_path)
+    (tmp_path / "in" / "a.txt").write_text("小明：第二版\n", encoding="utf-8")
+
+    with JobManifest.load(str(tmp_path / "job.jsonl")) as manifest:
+        tasks, skipped, exhausted = manifest.remaining()
+    assert [Path(input_path).name for input_path, _ in tasks] == ["a.txt"]
+    assert (skipped, exhausted) == (1, 0)
+
+    assert _run(tmp_path, "--resume") == 0
+    assert _bodies(tmp_path / "out" / "a.json") == ["第二版"]
+    with JobManifest.load(str(tmp_path / "job.jsonl")) as manifest:
+        assert manifest.remaining()[0] == []
+
+
+def test_resume_reconverts_missing_input_and_damaged_output(tmp_path):
+    _setup(tmp_path)
+    (tmp_path / "out" / "b.json").write_text("{", encoding="utf-8")
+    (tmp_path / "in" / "a.txt").unlink()
+
+    with JobManifest.load(str(tmp_path / "job.jsonl")) as manifest:
+        tasks, skipped, _ = manifest.remaining()
+    assert sorted(Path(input_path).name for input_path, _ in tasks) == ["a.txt", "b.txt"]
+    assert skipped == 0
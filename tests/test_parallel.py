@@ -0,0 +1,66 @@
+# 并行转换的差分测试：在空行处切分、分块转换后拼接的结果与 convert_text_to_json_format 逐字节一致。
+# 大部分用例用线程池代替进程池以覆盖大量切分位置，另有少量用例使用真正的进程池。
+# 运行：python -m pytest -q tests
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import parallel
+from conftest import all_scripts
+from parallel import convert_file_parallel, convert_text_parallel, iter_chunks
+from script_reader import MemoryScript
+
+SCRIPTS = all_scripts()
+
+
+@pytest.fixture
+def in_process(monkeypatch):
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 7, 64])
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_text_matches_sequential(converter, in_process, name, text, chunk_chars):
+    for pretty in (True, False):
+        expected = converter.convert_text_to_json_format(text, pretty=pretty)
+        assert convert_text_parallel(converter, text, pretty=pretty, jobs=3, min_chars=0,
+                                     chunk_chars=chunk_chars) == expected
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 64])
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_file_matches_sequential(converter, in_process, tmp_path, name, text, chunk_chars):
+    # 按字节写出，保留 \r\n，由 ScriptReader 统一换行
+    path = tmp_path / "in.txt"
+    path.write_bytes(text.encode("utf-8"))
+    expected = converter.convert_text_to_json_format(text)
+    convert_file_parallel(converter, str(path), str(tmp_path / "out.json"), jobs=2, min_size=0,
+                          chunk_chars=chunk_chars)
+    assert (tmp_path / "out.json").read_text(encoding="utf-8") == expected
+
+
+def test_memory_script_input(converter, in_process, tmp_path):
+    name, text = SCRIPTS[0]
+    source = MemoryScript("crlf.txt", text.encode("utf-8"))
+    convert_file_parallel(converter, source, str(tmp_path / "out.json"), jobs=2, min_size=0, chunk_chars=1)
+    assert (tmp_path / "out.json").read_text(encoding="utf-8") == converter.convert_text_to_json_format(text)
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 7, 64])
+@pytest.mark.parametrize("name,text", SCRIPTS, ids=[name for name, _ in SCRIPTS])
+def test_chunks_cover_all_lines(name, text, chunk_chars):
+    # 切分处只去掉空行，其余各行按原顺序出现在各块中
+    lines = text.split('\n')
+    chunked = "\n".join(iter_chunks(lines, chunk_chars)).split('\n')
+    assert [line for line in chunked if line.strip()] == [line for line in lines if line.strip()]
+
+
+def test_process_pool(converter, tmp_path):
+    text = "\n\n".join(script for _, script in SCRIPTS)
+    assert convert_text_parallel(converter, text, jobs=2, min_chars=0, chunk_chars=64) == \
+        converter.convert_text_to_json_format(text)
+    path = tmp_path / "in.txt"
+    path.write_bytes(text.encode("utf-8"))
+    convert_file_parallel(converter, str(path), str(tmp_path / "out.json"), jobs=2, min_size=0, chunk_chars=64)
+    assert (tmp_path / "out.json").read_text(encoding="utf-8") == converter.convert_text_to_json_format(text)
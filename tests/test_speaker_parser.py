@@ -0,0 +1,118 @@
+# FastSpeakerParser 与默认正则 SpeakerParser(DEFAULT_SPEAKER_PATTERN) 的差分测试：
+# 固定语料覆盖全角/半角冒号、名字长度边界、只有空白的名字和空台词，再用随机生成的行做模糊比对。
+# 运行：python -m pytest -q tests
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from converter import DEFAULT_SPEAKER_PATTERN, FastSpeakerParser, SpeakerParser  # noqa: E402
+
+MAX_NAME_LENGTH = 8
+KNOWN_NAMES = ["小明", "Alice", "Bob", "老师", "A B", "路人_甲"]
+
+CORPUS = [
+    # 全角与半角冒号
+    "小明：你好",
+    "小明:你好",
+    "Alice: hello",
+    "Alice：hello",
+    "小明：时间是 12:30",
+    "小明:时间是 12：30",
+    "Bob : spaced colon",
+    "Bob　：全角空格",
+    # 名字长度边界：max_name_length - 1 可以，max_name_length 及以上不是说话人行
+    "a" * (MAX_NAME_LENGTH - 1) + "：正好在上限内",
+    "a" * MAX_NAME_LENGTH + "：正好等于上限",
+    "a" * (MAX_NAME_LENGTH + 1) + "：超过上限",
+    "名" * (MAX_NAME_LENGTH - 1) + ":全角名字",
+    "名" * MAX_NAME_LENGTH + ":全角名字",
+    "ab cd ef：带空格的名字",
+    "ab  cd  ef：带空格的名字超过上限",
+    # 只有空白的名字
+    " ：只有空格",
+    "\t:制表符",
+    "　：全角空格",
+    "   :多个空格",
+    # 空台词
+    "小明：",
+    "小明:",
+    "Alice:   ",
+    "A B：",
+    # 不是说话人行
+    "：没有名字",
+    ":没有名字",
+    "旁白没有冒号",
+    "",
+    "小-明：带连字符",
+    "(旁白)：括号",
+    "小明。：句号",
+    "路人_甲：下划线",
+    "１２３：全角数字",
+    "小明：：双冒号",
+    "小明:：混合双冒号",
+    "小明\n：含换行",
+    "小明：第一行\n第二行",
+]
+
+NAME_CHARS = "小明老师Aab B_1２ 　\t-。(" + "名"
+BODY_CHARS = "你好 ：:ab　。\t"
+
+
+def _random_line(rng: random.Random) -> str:
+    name = "".join(rng.choice(NAME_CHARS) for _ in range(rng.randint(0, MAX_NAME_LENGTH + 2)))
+    if rng.random() < 0.2:
+        name = rng.choice(KNOWN_NAMES)
+    body = "".join(rng.choice(BODY_CHARS) for _ in range(rng.randint(0, 6)))
+    return name + rng.choice("：:") + body if rng.random() < 0.9 else name + body
+
+
+def _parsers(known_names):
+    return (SpeakerParser(DEFAULT_SPEAKER_PATTERN, MAX_NAME_LENGTH),
+            FastSpeakerParser(MAX_NAME_LENGTH, known_names))
+
+
+@pytest.mark.parametrize("known_names", [(), KNOWN_NAMES], ids=["no-known-names", "known-names"])
+@pytest.mark.parametrize("line", CORPUS)
+def test_corpus_matches_regex(line, known_names):
+    reference, fast = _parsers(known_names)
+    # TextConverter 先 strip 再交给解析器
+    line = line.strip()
+    assert fast.parse(line) == reference.parse(line)
+
+
+@pytest.mark.parametrize("known_names", [(), KNOWN_NAMES], ids=["no-known-names", "known-names"])
+def test_fuzzed_lines_match_regex(known_names):
+    reference, fast = _parsers(known_names)
+    rng = random.Random(20240601)
+    for _ in range(20000):
+        line = _random_line(rng).strip()
+        assert fast.parse(line) == reference.parse(line), repr(line)
+
+
+def test_name_length_boundary():
+    _, fast = _parsers(())
+    assert fast.parse("a" * (MAX_NAME_LENGTH - 1) + "：x") == ("a" * (MAX_NAME_LENGTH - 1), "x")
+    assert fast.parse("a" * MAX_NAME_LENGTH + "：x") is None
+
+
+def test_known_names_respect_length_limit():
+    long_name = "a" * MAX_NAME_LENGTH
+    reference, fast = _parsers([long_name, " 小明", "小-明"])
+    # 超长、带首尾空白或含非名字字符的名字不进入查表
+    assert fast.known_names == frozenset()
+    for line in (long_name + "：x", "小-明：x"):
+        assert fast.parse(line) == reference.parse(line)
+
+
+def test_with_max_name_length_keeps_results_identical():
+    rng = random.Random(7)
+    reference = SpeakerParser(DEFAULT_SPEAKER_PATTERN, 4)
+    fast = FastSpeakerParser(MAX_NAME_LENGTH, KNOWN_NAMES).with_max_name_length(4)
+    for _ in range(5000):
+        line = _random_line(rng).strip()
+        assert fast.parse(line) == reference.parse(line), repr(line)
@@ -0,0 +1,50 @@
+# 监视文件夹：配置修改后重新转换，轮询模式下已到期的文件不等下一次轮询。
+# 运行：python -m pytest -q tests
+
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from converter import ConfigManager, TextConverter  # noqa: E402
+from watcher import FolderWatcher  # noqa: E402
+
+REPO_CONFIG = Path(__file__).resolve().parent.parent / "config.yaml"
+
+
+def _watcher(tmp_path: Path, **options) -> FolderWatcher:
+    shutil.copyfile(REPO_CONFIG, tmp_path / "config.yaml")
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "a.txt").write_text("小明：你好\n", encoding="utf-8")
+    config_manager = ConfigManager(str(tmp_path / "config.yaml"))
+    return FolderWatcher(TextConverter(config_manager), str(tmp_path / "in"), str(tmp_path / "out"), **options)
+
+
+def test_config_change_triggers_reconversion(tmp_path):
+    watcher = _watcher(tmp_path, use_polling=True)
+    path = str((tmp_path / "in" / "a.txt").resolve())
+    output = tmp_path / "out" / "a.json"
+    assert watcher.convert(path)
+    assert not watcher.convert(path)
+    assert json.loads(output.read_text(encoding="utf-8"))["actions"][0]["characters"] == []
+
+    config_manager = watcher.converter.config_manager
+    config_manager.config["character_mapping"]["小明"] = [99]
+    config_manager.generation += 1
+    watcher._check_config()
+    assert path in watcher._pending
+    assert watcher.convert(path)
+    assert json.loads(output.read_text(encoding="utf-8"))["actions"][0]["characters"] == [99]
+
+
+def test_due_file_is_returned_before_next_poll(tmp_path):
+    watcher = _watcher(tmp_path, use_polling=True, poll_interval=60, debounce=0.05)
+    watcher._next_tick = time.monotonic() + 60
+    path = str((tmp_path / "in" / "a.txt").resolve())
+    watcher.notify(path)
+    start = time.monotonic()
+    assert watcher._next_due() == path
+    assert time.monotonic() - start < 5
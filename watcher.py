@@ -0,0 +1,255 @@
+# 监视文件夹：常驻运行，输入文件夹中的 .txt 保存后自动转换为 JSON。
+#
+# 安装 watchdog 时使用系统文件事件（Linux 下为 inotify），否则退化为定时扫描。
+# 同一文件的连续保存会合并处理（防抖），内容和配置都未变的文件不会重复转换，输出通过临时文件原子替换。
+# 配置文件被修改（热重载）后，已转换过的文件会按新配置重新转换。
+
+import fnmatch
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from cache import config_fingerprint, hash_file
+from converter import QuotePairs, QuoteRules, TextConverter, convert_file
+
+# 安全地导入 watchdog，如果失败则使用轮询
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_ENABLED = True
+except ImportError:
+    FileSystemEventHandler = object
+    WATCHDOG_ENABLED = False
+
+logger = logging.getLogger(__name__)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "FolderWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        if event.event_type == "moved":
+            self.watcher.forget(event.src_path)
+            self.watcher.notify(event.dest_path)
+        elif event.event_type == "deleted":
+            self.watcher.forget(event.src_path)
+        elif event.event_type in ("created", "modified", "closed"):
+            self.watcher.notify(event.src_path)
+
+
+class FolderWatcher:
+    """监视输入文件夹并增量转换发生变化的文件。整个运行期间复用同一个转换器"""
+
+    def __init__(self, converter: TextConverter, input_dir: str, output_dir: str, narrator_name: str = None,
+                 selected_quote_pairs: Optional[QuotePairs] = None, pretty: bool = True,
+                 pattern: str = "*.txt", recursive: bool = False, debounce: float = 0.2,
+                 poll_interval: float = 0.5, use_polling: bool = False):
+        self.converter = converter
+        self.input_dir = Path(input_dir).resolve()
+        self.output_dir = Path(output_dir).resolve()
+        self.narrator_name = narrator_name
+        self.selected_quote_pairs = QuoteRules.coerce(selected_quote_pairs)
+        self.pretty = pretty
+        self.pattern = pattern
+        self.recursive = recursive
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or not WATCHDOG_ENABLED
+        # 文件 -> 上次转换时的 (内容哈希, 配置指纹)；轮询模式下另记录 (mtime, size)
+        self._hashes: Dict[str, Tuple[str, str]] = {}
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+        # 文件 -> 到期时间，到期后才转换，期间的新事件会推迟到期时间
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        # 下一次轮询扫描和检查配置的时间
+        self._next_tick = 0.0
+        # 当前配置的指纹及其对应的配置 generation
+        self._fingerprint: Optional[str] = None
+        self._fingerprint_generation: Optional[int] = None
+        self.converted_count = 0
+        self.failed_count = 0
+
+    def _matches(self, path: Path) -> bool:
+        if not fnmatch.fnmatch(path.name, self.pattern):
+            return False
+        try:
+            relative = path.relative_to(self.input_dir)
+        except ValueError:
+            return False
+        return self.recursive or len(relative.parts) == 1
+
+    def output_path_for(self, input_path: Path) -> Path:
+        return (self.output_dir / input_path.relative_to(self.input_dir)).with_suffix(".json")
+
+    def notify(self, path: str):
+        """记录文件变化，防抖时间后再转换。可在任意线程调用"""
+        path = Path(path).resolve()
+        if not self._matches(path):
+            return
+        with self._lock:
+            self._pending[str(path)] = time.monotonic() + self.debounce
+            self._lock.notify()
+
+    def forget(self, path: str):
+        path = str(Path(path).resolve())
+        with self._lock:
+            self._pending.pop(path, None)
+            self._hashes.pop(path, None)
+            self._signatures.pop(path, None)
+
+    def _config_key(self) -> str:
+        """当前配置的指纹，配置重新加载后才重新计算"""
+        self.converter.reload_config_if_changed()
+        generation = self.converter.config_generation
+        if generation != self._fingerprint_generation:
+            self._fingerprint = config_fingerprint(self.converter, self.narrator_name, self.selected_quote_pairs,
+                                                   self.pretty)
+            self._fingerprint_generation = generation
+        return self._fingerprint
+
+    def _check_config(self):
+        """配置被修改后，把已知的文件都加入待转换队列"""
+        previous = self._fingerprint
+        if self._config_key() == previous:
+            return
+        paths = set(self._hashes) | set(self._signatures)
+        if paths:
+            logger.info(f"配置已更新，重新转换 {len(paths)} 个文件")
+        for path in paths:
+            self.notify(path)
+
+    def _scan(self):
+        """遍历输入文件夹，返回 {路径: (mtime_ns, size)}"""
+        found = {}
+        stack = [self.input_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            stack.append(Path(entry.path))
+                    elif fnmatch.fnmatch(entry.name, self.pattern):
+                        stat = entry.stat()
+                        found[str(Path(entry.path).resolve())] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+        return found
+
+    def _initial_sync(self):
+        """启动时转换输出缺失或早于输入的文件"""
+        signatures = self._scan()
+        self._signatures = signatures
+        config_key = self._config_key()
+        for path in signatures:
+            output_path = self.output_path_for(Path(path))
+            try:
+                up_to_date = output_path.stat().st_mtime_ns >= signatures[path][0]
+            except OSError:
+                up_to_date = False
+            if up_to_date:
+                try:
+                    self._hashes[path] = (hash_file(path), config_key)
+                except OSError:
+                    pass
+            else:
+                self.notify(path)
+
+    def _poll(self):
+        signatures = self._scan()
+        for path, signature in signatures.items():
+            if self._signatures.get(path) != signature:
+                self.notify(path)
+        for path in set(self._signatures) - set(signatures):
+            self.forget(path)
+        self._signatures = signatures
+
+    def convert(self, path: str) -> bool:
+        """转换单个文件，内容和配置都未变化时跳过。返回是否写出了新的 JSON"""
+        try:
+            key = (hash_file(path), self._config_key())
+        except OSError:
+            # 文件在防抖期间被删除或重命名
+            self.forget(path)
+            return False
+        if self._hashes.get(path) == key:
+            return False
+        output_path = self.output_path_for(Path(path))
+        try:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            convert_file(self.converter, path, str(output_path), self.narrator_name, self.selected_quote_pairs,
+                         self.pretty, atomic=True)
+        except Exception as e:
+            # 常见原因是编辑器还没写完文件，下一次保存事件会重新触发转换
+            self.failed_count += 1
+            logger.error(f"处理文件 {path} 失败: {e}")
+            return False
+        self._hashes[path] = key
+        self.converted_count += 1
+        logger.info(f"已更新: {output_path}")
+        return True
+
+    def _next_due(self) -> Optional[str]:
+        """等待下一个到期的文件并返回其路径；每隔 poll_interval 返回一次空字符串，用于轮询扫描和检查配置。
+        停止时返回 None。已经到期的文件优先于轮询返回
+        """
+        with self._lock:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                timeout = self._next_tick - now
+                if self._pending:
+                    path, deadline = min(self._pending.items(), key=lambda item: item[1])
+                    if deadline <= now:
+                        del self._pending[path]
+                        return path
+                    timeout = min(timeout, deadline - now)
+                if timeout <= 0:
+                    self._next_tick = now + self.poll_interval
+                    return ""
+                self._lock.wait(timeout)
+        return None
+
+    def run(self):
+        """阻塞运行，直到调用 stop()"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        observer = None
+        if not self.use_polling:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), str(self.input_dir), recursive=self.recursive)
+            observer.start()
+        mode = "轮询" if self.use_polling else "文件系统事件"
+        logger.info(f"开始监视 {self.input_dir}（{mode}），输出到 {self.output_dir}")
+        self._initial_sync()
+        try:
+            while True:
+                path = self._next_due()
+                if path is None:
+                    break
+                if path == "":
+                    # 轮询间隔到了
+                    self._check_config()
+                    if self.use_polling:
+                        self._poll()
+                    continue
+                self.convert(path)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            self._lock.notify_all()